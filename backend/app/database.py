@@ -1,12 +1,80 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
-from .config import DATABASE_URL
+from .config import (
+    DATABASE_URL,
+    DB_POOL_SIZE,
+    DB_MAX_OVERFLOW,
+    DB_POOL_TIMEOUT,
+    SQLITE_BUSY_TIMEOUT_MS,
+    SQLITE_SYNCHRONOUS,
+    SQLITE_MMAP_SIZE,
+)
 
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+
+def _driver_urls(url: str):
+    """
+    根据 DATABASE_URL 推导同步/异步驱动地址
+    sqlite → pysqlite / aiosqlite，postgresql → psycopg / asyncpg
+    """
+    base = make_url(url)
+    backend = base.get_backend_name()
+    if backend == "sqlite":
+        return base.set(drivername="sqlite"), base.set(drivername="sqlite+aiosqlite")
+    if backend == "postgresql":
+        return base.set(drivername="postgresql+psycopg"), base.set(drivername="postgresql+asyncpg")
+    return base, base
+
+
+def _engine_options(backend: str) -> dict:
+    """连接池参数只用于服务端数据库；SQLite 使用 SQLAlchemy 默认的连接池"""
+    if backend == "sqlite":
+        return {
+            "connect_args": {
+                "check_same_thread": False,
+                "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000,
+            }
+        }
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_pre_ping": True,
+        "pool_recycle": 1800,
+    }
+
+
+def _configure_sqlite(dbapi_connection, connection_record):
+    """
+    每个 SQLite 连接的调优参数
+    WAL 允许读写并发，避免上传与查询互相阻塞出现 database is locked
+    """
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
+
+
+sync_url, async_url = _driver_urls(DATABASE_URL)
+backend = sync_url.get_backend_name()
+
+engine = create_engine(sync_url, **_engine_options(backend))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# 异步引擎：供 async 路由做非阻塞数据库 I/O
+async_engine = create_async_engine(async_url, **_engine_options(backend))
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+if backend == "sqlite":
+    event.listen(engine, "connect", _configure_sqlite)
+    event.listen(async_engine.sync_engine, "connect", _configure_sqlite)
+
 Base = declarative_base()
 
 
@@ -16,3 +84,8 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
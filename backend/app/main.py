@@ -1,22 +1,47 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 import os
 
-from .database import Base, engine
-from .routers import invoice
+from .database import SessionLocal, async_engine
+from .migrate import upgrade_database
+from .routers import invoice, thumbnail
 from .config import UPLOAD_DIR
+from .services.duplicate_detector import duplicate_detector
+from .services.file_store import file_store
+from .services.glm_service import glm_service
+from .services.metrics import render_metrics
+from .services.thumbnail_cache import thumbnail_cache
+from .services.summary_rollup import ensure_rollup
+from .services.task_queue import task_queue
+
+# Create or upgrade database tables
+upgrade_database()
 
-# Create database tables
-Base.metadata.create_all(bind=engine)
+# Populate the summary rollup for databases created before it existed
+with SessionLocal() as db:
+    ensure_rollup(db)
 
 # Create upload directory
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Start background recognition workers
+    await task_queue.start()
+    yield
+    await task_queue.stop()
+    await async_engine.dispose()
+
+
 app = FastAPI(
     title="出纳发票识别系统",
     description="发票识别 → 分类汇总 → 记账分录",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 # CORS for frontend
@@ -33,6 +58,7 @@ app.mount("/uploads", StaticFiles(directory=UPLOAD_DIR), name="uploads")
 
 # Include routers
 app.include_router(invoice.router)
+app.include_router(thumbnail.router)
 
 
 @app.get("/")
@@ -43,3 +69,21 @@ def root():
 @app.get("/health")
 def health():
     return {"status": "ok"}
+
+
+@app.get("/stats")
+def stats():
+    """识别调用、限流/熔断、查重、文件存储与缩略图缓存计数"""
+    return {
+        "glm": glm_service.get_stats(),
+        "duplicates": duplicate_detector.get_stats(),
+        "files": file_store.get_stats(),
+        "thumbnails": thumbnail_cache.get_stats(),
+    }
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """Prometheus 指标（文本格式）"""
+    content, content_type = render_metrics()
+    return Response(content=content, media_type=content_type)
@@ -0,0 +1,86 @@
+"""
+运维命令
+    python -m app.manage migrate                 升级数据库结构到最新版本
+    python -m app.manage rebuild-rollup          重建汇总表
+    python -m app.manage rebuild-rollup --check  只检查汇总表与发票表是否一致
+    python -m app.manage reclassify              按当前科目规则重新分类发票
+    python -m app.manage migrate-uploads         把旧的平铺上传文件迁入内容寻址存储
+"""
+import argparse
+import sys
+
+from .database import SessionLocal
+from .migrate import upgrade_database
+from .services.file_store import file_store, migrate_legacy_uploads
+from .services.invoice_parser import reclassify_invoices
+from .services.summary_rollup import check_rollup, rebuild_rollup
+
+
+def cmd_migrate(args) -> int:
+    upgrade_database(args.revision)
+    print(f"数据库已升级到 {args.revision}")
+    return 0
+
+
+def cmd_rebuild_rollup(args) -> int:
+    with SessionLocal() as db:
+        if args.check:
+            mismatches = check_rollup(db)
+            for line in mismatches:
+                print(line)
+            print(f"汇总表检查完成: {len(mismatches)} 个分组不一致")
+            return 1 if mismatches else 0
+
+        groups = rebuild_rollup(db)
+        print(f"汇总表已重建: {groups} 个分组")
+        return 0
+
+
+def cmd_reclassify(args) -> int:
+    with SessionLocal() as db:
+        checked, changed = reclassify_invoices(db, args.batch_size, dry_run=args.dry_run)
+    action = "需要变更" if args.dry_run else "已变更"
+    print(f"重新分类完成: 检查 {checked} 张自动归类发票, {action} {changed} 张")
+    return 0
+
+
+def cmd_migrate_uploads(args) -> int:
+    with SessionLocal() as db:
+        counts = migrate_legacy_uploads(db, file_store, dry_run=args.dry_run)
+    action = "需要迁移" if args.dry_run else "已迁移"
+    print(
+        f"上传文件迁移完成: {action} {counts['moved']} 个, 与已有文件相同 {counts['deduplicated']} 个, "
+        f"无引用未处理 {counts['orphaned']} 个"
+    )
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.manage", description="出纳发票识别系统运维命令")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    migrate = subparsers.add_parser("migrate", help="升级数据库结构")
+    migrate.add_argument("revision", nargs="?", default="head", help="目标版本，默认 head")
+    migrate.set_defaults(func=cmd_migrate)
+
+    rollup = subparsers.add_parser("rebuild-rollup", help="从发票表重建汇总表")
+    rollup.add_argument("--check", action="store_true", help="只检查一致性，不修改")
+    rollup.set_defaults(func=cmd_rebuild_rollup)
+
+    reclassify = subparsers.add_parser("reclassify", help="按当前科目规则重新分类发票")
+    reclassify.add_argument("--batch-size", type=int, default=1000, help="每批处理的发票数")
+    reclassify.add_argument("--dry-run", action="store_true", help="只统计，不修改")
+    reclassify.set_defaults(func=cmd_reclassify)
+
+    uploads = subparsers.add_parser("migrate-uploads", help="把旧的平铺上传文件迁入内容寻址存储")
+    uploads.add_argument("--dry-run", action="store_true", help="只统计，不修改")
+    uploads.set_defaults(func=cmd_migrate_uploads)
+
+    args = parser.parse_args(argv)
+    if args.command != "migrate":
+        upgrade_database()
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
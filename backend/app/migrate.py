@@ -0,0 +1,27 @@
+import os
+
+from alembic import command
+from alembic.config import Config
+
+from .database import engine
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def get_alembic_config() -> Config:
+    config = Config(os.path.join(BACKEND_DIR, "alembic.ini"))
+    config.set_main_option("script_location", os.path.join(BACKEND_DIR, "app", "migrations"))
+    # 应用内调用时不覆盖应用自己的日志配置
+    config.attributes["configure_logger"] = False
+    return config
+
+
+def upgrade_database(revision: str = "head"):
+    """
+    升级数据库结构到最新版本
+    迁移脚本对已存在的表/列/索引做了判断，早期由 create_all 建出的库也能直接升级
+    """
+    config = get_alembic_config()
+    with engine.begin() as connection:
+        config.attributes["connection"] = connection
+        command.upgrade(config, revision)
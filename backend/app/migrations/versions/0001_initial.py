@@ -0,0 +1,44 @@
+"""initial invoices table
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 早期版本由 create_all 建表，已存在时跳过
+    op.create_table(
+        "invoices",
+        sa.Column("id", sa.String(36), primary_key=True),
+        sa.Column("invoice_no", sa.String(50), nullable=True),
+        sa.Column("invoice_date", sa.Date, nullable=True),
+        sa.Column("invoice_type", sa.String(50), nullable=True),
+        sa.Column("seller_name", sa.String(200), nullable=True),
+        sa.Column("seller_tax_no", sa.String(50), nullable=True),
+        sa.Column("amount", sa.Float, nullable=True),
+        sa.Column("tax_amount", sa.Float, nullable=True),
+        sa.Column("total_amount", sa.Float, nullable=True),
+        sa.Column("expense_category", sa.String(50), nullable=True),
+        sa.Column("reimbursement_person", sa.String(50), nullable=True),
+        sa.Column("confidence", sa.Float, nullable=True),
+        sa.Column("anomaly_flag", sa.String(20), nullable=True),
+        sa.Column("anomaly_reason", sa.String(200), nullable=True),
+        sa.Column("image_path", sa.String(500), nullable=True),
+        sa.Column("raw_response", sa.JSON, nullable=True),
+        sa.Column("created_at", sa.DateTime, nullable=True),
+        sa.Column("updated_at", sa.DateTime, nullable=True),
+        if_not_exists=True,
+    )
+
+
+def downgrade():
+    op.drop_table("invoices")
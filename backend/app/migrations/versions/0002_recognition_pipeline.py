@@ -0,0 +1,74 @@
+"""recognition jobs, PDF page numbers and summary rollup
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def _add_missing_column(table: str, column: sa.Column):
+    """create_all 建出的库可能已有部分列，缺失时才添加"""
+    existing = {c["name"] for c in sa.inspect(op.get_bind()).get_columns(table)}
+    if column.name not in existing:
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.add_column(column)
+
+
+def upgrade():
+    _add_missing_column("invoices", sa.Column("page_no", sa.Integer, nullable=True))
+
+    op.create_table(
+        "recognition_jobs",
+        sa.Column("id", sa.String(36), primary_key=True),
+        sa.Column("task_id", sa.String(36), nullable=False),
+        sa.Column("filename", sa.String(255), nullable=True),
+        sa.Column("file_path", sa.String(500), nullable=False),
+        sa.Column("file_size", sa.Integer, nullable=True),
+        sa.Column("content_hash", sa.String(64), nullable=True),
+        sa.Column("reimbursement_person", sa.String(50), nullable=True),
+        sa.Column("status", sa.String(20), nullable=False),
+        sa.Column("attempts", sa.Integer, nullable=True),
+        sa.Column("error", sa.Text, nullable=True),
+        sa.Column("invoice_ids", sa.JSON, nullable=True),
+        sa.Column("created_at", sa.DateTime, nullable=True),
+        sa.Column("started_at", sa.DateTime, nullable=True),
+        sa.Column("finished_at", sa.DateTime, nullable=True),
+        if_not_exists=True,
+    )
+    _add_missing_column("recognition_jobs", sa.Column("file_size", sa.Integer, nullable=True))
+    _add_missing_column("recognition_jobs", sa.Column("content_hash", sa.String(64), nullable=True))
+    op.drop_index("ix_recognition_jobs_status", "recognition_jobs", if_exists=True)
+    op.create_index("ix_recognition_jobs_task_id", "recognition_jobs", ["task_id"], if_not_exists=True)
+    op.create_index(
+        "ix_recognition_jobs_status_created_at",
+        "recognition_jobs",
+        ["status", "created_at"],
+        if_not_exists=True,
+    )
+
+    op.create_table(
+        "invoice_rollup",
+        sa.Column("category", sa.String(50), primary_key=True),
+        sa.Column("month", sa.String(7), primary_key=True),
+        sa.Column("is_anomaly", sa.Boolean, primary_key=True),
+        sa.Column("count", sa.Integer, nullable=False),
+        sa.Column("amount", sa.Float, nullable=False),
+        sa.Column("tax_amount", sa.Float, nullable=False),
+        sa.Column("total_amount", sa.Float, nullable=False),
+        if_not_exists=True,
+    )
+
+
+def downgrade():
+    op.drop_table("invoice_rollup")
+    op.drop_table("recognition_jobs")
+    with op.batch_alter_table("invoices") as batch_op:
+        batch_op.drop_column("page_no")
@@ -0,0 +1,32 @@
+"""indexes for list, summary, export and duplicate lookups
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17
+"""
+from alembic import op
+
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ("ix_invoices_created_at_id", ["created_at", "id"]),
+    ("ix_invoices_category_created_at", ["expense_category", "created_at"]),
+    ("ix_invoices_anomaly_created_at", ["anomaly_flag", "created_at"]),
+    ("ix_invoices_invoice_date", ["invoice_date"]),
+    ("ix_invoices_person_invoice_date", ["reimbursement_person", "invoice_date"]),
+    ("ix_invoices_invoice_no_seller_tax_no", ["invoice_no", "seller_tax_no"]),
+]
+
+
+def upgrade():
+    for name, columns in INDEXES:
+        op.create_index(name, "invoices", columns, if_not_exists=True)
+
+
+def downgrade():
+    for name, _ in INDEXES:
+        op.drop_index(name, "invoices", if_exists=True)
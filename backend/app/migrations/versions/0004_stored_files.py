@@ -0,0 +1,31 @@
+"""content-addressed upload storage with reference counts
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "stored_files",
+        sa.Column("content_hash", sa.String(64), primary_key=True),
+        sa.Column("path", sa.String(500), nullable=False),
+        sa.Column("size", sa.Integer, nullable=True),
+        sa.Column("ref_count", sa.Integer, nullable=False),
+        sa.Column("created_at", sa.DateTime, nullable=True),
+        if_not_exists=True,
+    )
+    op.create_index("ix_stored_files_path", "stored_files", ["path"], unique=True, if_not_exists=True)
+
+
+def downgrade():
+    op.drop_table("stored_files")
@@ -1,6 +1,6 @@
 import uuid
 from datetime import datetime
-from sqlalchemy import Column, String, Float, Date, DateTime, Text, JSON
+from sqlalchemy import Column, String, Integer, Float, Date, DateTime, Text, JSON, Index
 from sqlalchemy.dialects.sqlite import JSON as SQLiteJSON
 
 from ..database import Base
@@ -8,6 +8,17 @@ from ..database import Base
 
 class Invoice(Base):
     __tablename__ = "invoices"
+    __table_args__ = (
+        # 列表: 按创建时间倒序（含科目/异常筛选），id 作为游标分页的决胜列
+        Index("ix_invoices_created_at_id", "created_at", "id"),
+        Index("ix_invoices_category_created_at", "expense_category", "created_at"),
+        Index("ix_invoices_anomaly_created_at", "anomaly_flag", "created_at"),
+        # 导出: 按发票日期区间、报销人筛选
+        Index("ix_invoices_invoice_date", "invoice_date"),
+        Index("ix_invoices_person_invoice_date", "reimbursement_person", "invoice_date"),
+        # 重复发票查询
+        Index("ix_invoices_invoice_no_seller_tax_no", "invoice_no", "seller_tax_no"),
+    )
 
     id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     invoice_no = Column(String(50), nullable=True)
@@ -24,6 +35,7 @@ class Invoice(Base):
     anomaly_flag = Column(String(20), nullable=True)  # 异常标记: normal, warning, error
     anomaly_reason = Column(String(200), nullable=True)  # 异常原因
     image_path = Column(String(500), nullable=True)  # 原图路径
+    page_no = Column(Integer, nullable=True)  # PDF 页码（图片为空）
     raw_response = Column(JSON, nullable=True)  # GLM 原始返回
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
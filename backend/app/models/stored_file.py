@@ -0,0 +1,19 @@
+from datetime import datetime
+from sqlalchemy import Column, String, Integer, DateTime, Index
+
+from ..database import Base
+
+
+class StoredFile(Base):
+    """上传文件存储：按内容哈希保存一份，ref_count 为引用它的排队任务与发票数"""
+
+    __tablename__ = "stored_files"
+    __table_args__ = (
+        Index("ix_stored_files_path", "path", unique=True),
+    )
+
+    content_hash = Column(String(64), primary_key=True)  # SHA-256
+    path = Column(String(500), nullable=False)  # UPLOAD_DIR/ab/cd/<sha256>.<ext>
+    size = Column(Integer, nullable=True)
+    ref_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
@@ -0,0 +1,17 @@
+from sqlalchemy import Column, String, Integer, Float, Boolean
+
+from ..database import Base
+
+
+class InvoiceRollup(Base):
+    """汇总表：按 费用科目 × 发票月份 × 是否异常 预聚合，随发票增删改同步维护"""
+
+    __tablename__ = "invoice_rollup"
+
+    category = Column(String(50), primary_key=True)  # 空科目记为"其他"
+    month = Column(String(7), primary_key=True)  # YYYY-MM，无日期为空字符串
+    is_anomaly = Column(Boolean, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+    amount = Column(Float, nullable=False, default=0)
+    tax_amount = Column(Float, nullable=False, default=0)
+    total_amount = Column(Float, nullable=False, default=0)
@@ -0,0 +1,31 @@
+import uuid
+from datetime import datetime
+from sqlalchemy import Column, String, Integer, DateTime, Text, JSON, Index
+
+from ..database import Base
+
+
+class RecognitionJob(Base):
+    """识别任务队列：每个上传文件对应一条记录，进程重启后可继续处理"""
+
+    __tablename__ = "recognition_jobs"
+    __table_args__ = (
+        Index("ix_recognition_jobs_task_id", "task_id"),
+        # worker 按创建顺序领取排队任务
+        Index("ix_recognition_jobs_status_created_at", "status", "created_at"),
+    )
+
+    id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    task_id = Column(String(36), nullable=False)  # 同一批上传共享
+    filename = Column(String(255), nullable=True)  # 原始文件名
+    file_path = Column(String(500), nullable=False)  # 已保存的文件路径
+    file_size = Column(Integer, nullable=True)
+    content_hash = Column(String(64), nullable=True)  # 上传时计算的 SHA-256
+    reimbursement_person = Column(String(50), nullable=True)
+    status = Column(String(20), nullable=False, default="queued")  # queued/running/done/failed
+    attempts = Column(Integer, default=0)
+    error = Column(Text, nullable=True)
+    invoice_ids = Column(JSON, nullable=True)  # 生成的发票记录 ID
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
@@ -1,16 +1,26 @@
+import asyncio
+import base64
+import hashlib
+import json
 import os
+import time
 import uuid
+import zipfile
 from datetime import date, datetime
-from typing import List, Optional
+from typing import Iterator, List, Optional, Tuple
 from collections import defaultdict
 
+import aiofiles
+import aiofiles.os
 from fastapi import APIRouter, Depends, File, UploadFile, HTTPException, Query
 from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import and_, func, or_, select
 
-from ..database import get_db
+from ..database import SessionLocal, get_async_db, get_db
 from ..models.invoice import Invoice
+from ..models.task import RecognitionJob
 from ..schemas.invoice import (
     InvoiceResponse,
     InvoiceUpdate,
@@ -18,35 +28,73 @@ from ..schemas.invoice import (
     SummaryResponse,
     CategorySummary,
     UploadResponse,
+    ImportResponse,
+    TaskJobStatus,
+    TaskStatusResponse,
     VoucherGenerateRequest,
     VoucherGenerateResponse,
 )
-from ..services.glm_service import glm_service
-from ..services.invoice_parser import classify_expense, detect_anomalies, parse_date
-from ..services.voucher_service import generate_vouchers
-from ..services.excel_export import create_invoice_excel
-from ..config import UPLOAD_DIR, MAX_FILES_PER_BATCH
+from ..services.duplicate_detector import duplicate_detector, duplicate_key
+from ..services.einvoice_import import import_einvoice_zip
+from ..services.einvoice_parser import STRUCTURED_EXTENSIONS
+from ..services.file_store import file_store
+from ..services.invoice_parser import MANUAL_CATEGORY_KEY
+from ..services.metrics import DB_QUERY_SECONDS, UPLOAD_BATCH_FILES, UPLOAD_BYTES, time_query
+from ..services.summary_rollup import apply_invoice, count_invoices, read_summary
+from ..services.task_queue import task_queue
+from ..services.thumbnail_cache import thumbnail_cache
+from ..services.voucher_service import aggregate_vouchers, build_vouchers
+from ..services.excel_export import stream_invoice_excel
+from ..services.fast_json import INVOICE_COLUMNS, FastJSONResponse, invoice_dicts
+from ..config import (
+    UPLOAD_DIR,
+    MAX_FILES_PER_BATCH,
+    MAX_UPLOAD_SIZE,
+    MAX_IMPORT_SIZE,
+    FAST_JSON_RESPONSES,
+)
 
 router = APIRouter(prefix="/api/invoices", tags=["invoices"])
 
 # Ensure upload directory exists
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # 1MB
+EXPORT_CHUNK_SIZE = 1000  # 导出时每批读取的行数
+# 导出明细/异常清单用到的列，按行元组读取，不构造 ORM 对象
+EXPORT_COLUMNS = (
+    Invoice.invoice_no,
+    Invoice.invoice_date,
+    Invoice.invoice_type,
+    Invoice.seller_name,
+    Invoice.amount,
+    Invoice.tax_amount,
+    Invoice.total_amount,
+    Invoice.expense_category,
+    Invoice.reimbursement_person,
+    Invoice.confidence,
+    Invoice.anomaly_flag,
+    Invoice.anomaly_reason,
+    Invoice.image_path,
+)
+
 
 @router.post("/upload", response_model=UploadResponse)
 async def upload_invoices(
     files: List[UploadFile] = File(...),
     reimbursement_person: Optional[str] = None,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    """批量上传发票图片"""
+    """批量上传发票图片/PDF，全电发票 XML/OFD 由队列直接解析，不调用 GLM"""
     if len(files) > MAX_FILES_PER_BATCH:
         raise HTTPException(
             status_code=400, detail=f"最多支持 {MAX_FILES_PER_BATCH} 张发票同时上传"
         )
 
+    UPLOAD_BATCH_FILES.observe(len(files))
     task_id = str(uuid.uuid4())
-    processed = 0
+    queued = 0
+    rejected = []
 
     for file in files:
         if not file.filename:
@@ -54,181 +102,307 @@ async def upload_invoices(
 
         # Validate file type
         ext = file.filename.lower().split(".")[-1]
-        if ext not in ["jpg", "jpeg", "png", "pdf"]:
+        if ext not in ["jpg", "jpeg", "png", "pdf", *STRUCTURED_EXTENSIONS]:
             continue
 
-        # Save file
-        file_id = str(uuid.uuid4())
-        file_path = os.path.join(UPLOAD_DIR, f"{file_id}.{ext}")
-        content = await file.read()
-        with open(file_path, "wb") as f:
-            f.write(content)
-
-        # Recognize invoice
-        result = glm_service.recognize_invoice(file_path)
-
-        if result:
-            # Parse date
-            invoice_date = parse_date(result.get("invoice_date"))
-
-            # Get expense category from GLM or auto-classify
-            expense_category = result.get("expense_category")
-            if not expense_category:
-                expense_category = classify_expense(
-                    result.get("seller_name", ""), result.get("items", [])
-                )
-
-            # Get reimbursement person from GLM (优先级: 经手人 > 领款人 > 传入参数)
-            handler = result.get("handler")  # 经手人
-            payee = result.get("payee")  # 领款人
-            person = handler or payee or result.get("reimbursement_person") or reimbursement_person
-
-            # Get amounts
-            amount = float(result.get("amount") or 0)
-            tax_amount = float(result.get("tax_amount") or 0)
-            total_amount = float(result.get("total_amount") or amount + tax_amount)
-            confidence = float(result.get("confidence") or 0.5)
-
-            # Detect anomalies
-            anomaly_flag, anomaly_reason = detect_anomalies(
-                total_amount, invoice_date, confidence, result.get("invoice_no")
-            )
-
-            # Create invoice record
-            invoice = Invoice(
-                invoice_no=result.get("invoice_no"),
-                invoice_date=invoice_date,
-                invoice_type=result.get("invoice_type") or result.get("doc_type"),
-                seller_name=result.get("seller_name"),
-                seller_tax_no=result.get("seller_tax_no"),
-                amount=amount,
-                tax_amount=tax_amount,
-                total_amount=total_amount,
-                expense_category=expense_category,
-                reimbursement_person=person,
-                confidence=confidence,
-                anomaly_flag=anomaly_flag,
-                anomaly_reason=anomaly_reason,
-                image_path=file_path,
-                raw_response=result,
-            )
-            db.add(invoice)
-            processed += 1
-        else:
-            # Create record with error
-            invoice = Invoice(
-                image_path=file_path,
+        # Save file (streamed, size-capped, hashed in the same pass), then move it
+        # into content-addressed storage; identical files are stored once
+        tmp_path = file_store.temp_path()
+        saved = await _save_upload(file, tmp_path)
+        if saved is None:
+            rejected.append(file.filename)
+            continue
+        content_hash, file_size = saved
+        UPLOAD_BYTES.observe(file_size)
+        # 入库失败时 file_store 会删除临时文件
+        file_path = await asyncio.to_thread(file_store.add, tmp_path, content_hash, ext, file_size)
+
+        # Enqueue recognition job
+        db.add(
+            RecognitionJob(
+                task_id=task_id,
+                filename=file.filename,
+                file_path=file_path,
+                file_size=file_size,
+                content_hash=content_hash,
                 reimbursement_person=reimbursement_person,
-                anomaly_flag="error",
-                anomaly_reason="识别失败",
-                confidence=0,
             )
-            db.add(invoice)
+        )
+        queued += 1
 
-    db.commit()
+    await db.commit()
+    task_queue.notify()
+
+    message = f"已提交 {queued}/{len(files)} 张发票，正在后台识别"
+    if rejected:
+        message += f"; {len(rejected)} 个文件超过 {MAX_UPLOAD_SIZE // 1024 // 1024}MB 限制"
 
     return UploadResponse(
         task_id=task_id,
         total_count=len(files),
-        processed=processed,
-        message=f"成功处理 {processed}/{len(files)} 张发票",
+        processed=0,
+        queued=queued,
+        rejected=rejected,
+        message=message,
+    )
+
+
+async def _save_upload(
+    file: UploadFile, file_path: str, max_size: int = MAX_UPLOAD_SIZE
+) -> Optional[Tuple[str, int]]:
+    """
+    分块写入上传文件并同时计算 SHA-256，返回 (哈希, 字节数)
+    超过 max_size 时立即中止、删除已写入部分并返回 None
+    """
+    if file.size is not None and file.size > max_size:
+        return None
+
+    sha256 = hashlib.sha256()
+    size = 0
+    async with aiofiles.open(file_path, "wb") as f:
+        while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+            size += len(chunk)
+            if size > max_size:
+                break
+            sha256.update(chunk)
+            await f.write(chunk)
+
+    if size > max_size:
+        await aiofiles.os.remove(file_path)
+        return None
+
+    return sha256.hexdigest(), size
+
+
+@router.post("/import", response_model=ImportResponse)
+async def import_einvoices(
+    file: UploadFile = File(...),
+    reimbursement_person: Optional[str] = None,
+):
+    """
+    批量导入全电发票：上传包含 XML/OFD 文件的 ZIP，同步解析入库（置信度 1.0）
+    ZIP 先流式写入临时文件，再逐个条目解析、分批提交，不经过识别队列和 GLM
+    """
+    tmp_path = file_store.temp_path()
+    if await _save_upload(file, tmp_path, MAX_IMPORT_SIZE) is None:
+        raise HTTPException(
+            status_code=413, detail=f"ZIP 文件超过 {MAX_IMPORT_SIZE // 1024 // 1024}MB 限制"
+        )
+    try:
+        result = await asyncio.to_thread(import_einvoice_zip, tmp_path, reimbursement_person)
+    except zipfile.BadZipFile:
+        raise HTTPException(status_code=400, detail="不是有效的 ZIP 文件")
+    finally:
+        await aiofiles.os.remove(tmp_path)
+
+    message = f"已导入 {result['imported']}/{result['total']} 张发票"
+    if result["duplicates"]:
+        message += f"; {result['duplicates']} 张疑似重复"
+    if result["failed"]:
+        message += f"; {len(result['failed'])} 个文件解析失败"
+    return ImportResponse(**result, message=message)
+
+
+@router.get("/tasks/{task_id}", response_model=TaskStatusResponse)
+async def get_task_status(task_id: str, db: AsyncSession = Depends(get_async_db)):
+    """查询识别任务进度"""
+    jobs = (
+        await db.scalars(
+            select(RecognitionJob)
+            .where(RecognitionJob.task_id == task_id)
+            .order_by(RecognitionJob.created_at)
+        )
+    ).all()
+    if not jobs:
+        raise HTTPException(status_code=404, detail="任务不存在")
+
+    counts = defaultdict(int)
+    for job in jobs:
+        counts[job.status] += 1
+    finished_jobs = [j for j in jobs if j.finished_at]
+    remaining = counts["queued"] + counts["running"]
+
+    # Throughput since the first job started
+    throughput = 0.0
+    started = [j.started_at for j in jobs if j.started_at]
+    if finished_jobs and started:
+        end = datetime.utcnow() if remaining else max(j.finished_at for j in finished_jobs)
+        elapsed = (end - min(started)).total_seconds()
+        if elapsed > 0:
+            throughput = len(finished_jobs) / elapsed * 60
+
+    eta = None
+    if remaining and throughput > 0:
+        eta = round(remaining / throughput * 60, 1)
+    elif not remaining:
+        eta = 0.0
+
+    return TaskStatusResponse(
+        task_id=task_id,
+        total=len(jobs),
+        queued=counts["queued"],
+        running=counts["running"],
+        done=counts["done"],
+        failed=counts["failed"],
+        finished=remaining == 0,
+        throughput_per_minute=round(throughput, 2),
+        eta_seconds=eta,
+        jobs=[TaskJobStatus.model_validate(j) for j in jobs],
     )
 
 
 @router.get("", response_model=InvoiceListResponse)
-def list_invoices(
+async def list_invoices(
     page: int = Query(1, ge=1),
     size: int = Query(20, ge=1, le=100),
     category: Optional[str] = None,
     anomaly_only: bool = False,
-    db: Session = Depends(get_db),
+    cursor: Optional[str] = None,
+    include_total: bool = True,
+    db: AsyncSession = Depends(get_async_db),
 ):
-    """查询发票列表"""
-    query = db.query(Invoice)
-
-    if category:
-        query = query.filter(Invoice.expense_category == category)
-
-    if anomaly_only:
-        query = query.filter(Invoice.anomaly_flag != "normal")
-
-    total = query.count()
-    items = (
-        query.order_by(Invoice.created_at.desc())
-        .offset((page - 1) * size)
-        .limit(size)
-        .all()
-    )
+    """
+    查询发票列表
+    传入上一页返回的 next_cursor 时按 (created_at, id) 游标翻页，忽略 page，
+    每页代价与第一页相同；include_total=false 时不计算总数
+    FAST_JSON_RESPONSES 开启时只查询所需列，并用 orjson 直接输出行数据
+    """
+    columns = INVOICE_COLUMNS if FAST_JSON_RESPONSES else (Invoice,)
+    query = _filter_invoices(select(*columns), category=category, anomaly_only=anomaly_only)
+
+    total = None
+    if include_total:
+        with time_query("list_count"):
+            if category == "其他":
+                # 汇总表把空科目并入"其他"，这里需要精确计数
+                total = await db.scalar(select(func.count()).select_from(query.subquery()))
+            else:
+                total = await count_invoices(db, category=category, anomaly_only=anomaly_only)
+
+    query = query.order_by(Invoice.created_at.desc(), Invoice.id.desc())
+    if cursor:
+        created_at, invoice_id = _decode_cursor(cursor)
+        query = query.filter(
+            or_(
+                Invoice.created_at < created_at,
+                and_(Invoice.created_at == created_at, Invoice.id < invoice_id),
+            )
+        )
+    else:
+        query = query.offset((page - 1) * size)
+
+    # Fetch one extra row to know whether another page exists
+    with time_query("list_page"):
+        result = await db.execute(query.limit(size + 1))
+        items = result.all() if FAST_JSON_RESPONSES else result.scalars().all()
+    next_cursor = None
+    if len(items) > size:
+        items = items[:size]
+        next_cursor = _encode_cursor(items[-1])
+
+    if FAST_JSON_RESPONSES:
+        return FastJSONResponse(
+            {
+                "items": invoice_dicts(items),
+                "total": total,
+                "page": page,
+                "size": size,
+                "next_cursor": next_cursor,
+            }
+        )
 
     return InvoiceListResponse(
         items=[InvoiceResponse.model_validate(i) for i in items],
         total=total,
         page=page,
         size=size,
+        next_cursor=next_cursor,
     )
 
 
+def _encode_cursor(invoice) -> str:
+    """invoice 可以是 ORM 对象或包含 created_at/id 列的结果行"""
+    payload = json.dumps([invoice.created_at.isoformat(), invoice.id])
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+
+def _decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    try:
+        created_at, invoice_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return datetime.fromisoformat(created_at), invoice_id
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="无效的分页游标")
+
+
 @router.get("/summary", response_model=SummaryResponse)
-def get_summary(db: Session = Depends(get_db)):
-    """获取汇总统计"""
-    # By category
-    category_stats = (
-        db.query(
-            Invoice.expense_category,
-            func.count(Invoice.id).label("count"),
-            func.sum(Invoice.amount).label("amount"),
-            func.sum(Invoice.tax_amount).label("tax"),
-        )
-        .group_by(Invoice.expense_category)
-        .all()
-    )
+async def get_summary(db: AsyncSession = Depends(get_async_db)):
+    """获取汇总统计（读取预聚合的汇总表）"""
+    by_category = {}
+    total_count, total_amount, total_tax, anomaly_count = 0, 0.0, 0.0, 0
 
-    by_category = [
-        CategorySummary(
-            category=stat[0] or "其他",
-            count=stat[1],
-            amount=round(stat[2] or 0, 2),
-            tax_amount=round(stat[3] or 0, 2),
+    with time_query("summary"):
+        rows = await read_summary(db)
+
+    for category, is_anomaly, count, amount, tax in rows:
+        item = by_category.setdefault(
+            category, CategorySummary(category=category, count=0, amount=0, tax_amount=0)
         )
-        for stat in category_stats
-    ]
+        item.count += count
+        item.amount += amount or 0
+        item.tax_amount += tax or 0
 
-    # Totals
-    totals = db.query(
-        func.count(Invoice.id),
-        func.sum(Invoice.amount),
-        func.sum(Invoice.tax_amount),
-    ).first()
+        total_count += count
+        total_amount += amount or 0
+        total_tax += tax or 0
+        if is_anomaly:
+            anomaly_count += count
 
-    anomaly_count = db.query(Invoice).filter(Invoice.anomaly_flag != "normal").count()
+    for item in by_category.values():
+        item.amount = round(item.amount, 2)
+        item.tax_amount = round(item.tax_amount, 2)
 
     return SummaryResponse(
-        by_category=by_category,
-        total_count=totals[0] or 0,
-        total_amount=round(totals[1] or 0, 2),
-        total_tax=round(totals[2] or 0, 2),
+        by_category=list(by_category.values()),
+        total_count=total_count,
+        total_amount=round(total_amount, 2),
+        total_tax=round(total_tax, 2),
         anomaly_count=anomaly_count,
     )
 
 
 @router.get("/export")
-def export_excel(db: Session = Depends(get_db)):
-    """导出 Excel 文件"""
-    # Get all invoices
-    invoices = db.query(Invoice).order_by(Invoice.created_at.desc()).all()
-    invoice_responses = [InvoiceResponse.model_validate(i) for i in invoices]
+def export_excel(
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    category: Optional[str] = None,
+    person: Optional[str] = None,
+    anomaly_only: bool = False,
+    db: Session = Depends(get_db),
+):
+    """导出 Excel 文件（支持按发票日期、科目、报销人、异常筛选）"""
+    filters = dict(
+        date_from=date_from,
+        date_to=date_to,
+        category=category,
+        person=person,
+        anomaly_only=anomaly_only,
+    )
 
     # Get summary
-    category_stats = (
-        db.query(
-            Invoice.expense_category,
-            func.count(Invoice.id).label("count"),
-            func.sum(Invoice.amount).label("amount"),
-            func.sum(Invoice.tax_amount).label("tax"),
+    with time_query("export_summary"):
+        category_stats = (
+            _filter_invoices(
+                db.query(
+                    Invoice.expense_category,
+                    func.count(Invoice.id).label("count"),
+                    func.sum(Invoice.amount).label("amount"),
+                    func.sum(Invoice.tax_amount).label("tax"),
+                ),
+                **filters,
+            )
+            .group_by(Invoice.expense_category)
+            .all()
         )
-        .group_by(Invoice.expense_category)
-        .all()
-    )
     summary = [
         CategorySummary(
             category=stat[0] or "其他",
@@ -239,23 +413,72 @@ def export_excel(db: Session = Depends(get_db)):
         for stat in category_stats
     ]
 
-    # Get anomalies
-    anomalies = [i for i in invoice_responses if i.anomaly_flag != "normal"]
-
-    # Generate vouchers
+    # Generate vouchers from per-category aggregates computed in SQL
+    with time_query("export_vouchers"):
+        category_totals, persons = aggregate_vouchers(db, *_invoice_criteria(**filters))
     today = date.today().isoformat()
-    vouchers = generate_vouchers(invoice_responses, today)
-
-    # Create Excel
-    output = create_invoice_excel(invoice_responses, summary, anomalies, vouchers)
+    vouchers = build_vouchers(category_totals, persons, today)
 
+    # Workbook is built in a worker thread (headers go out first), then sent in chunks;
+    # detail rows are read from the database in chunks
     return StreamingResponse(
-        output,
+        stream_invoice_excel(_iter_export_invoices(filters), summary, vouchers),
         media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
         headers={"Content-Disposition": f"attachment; filename=invoices_{today}.xlsx"},
     )
 
 
+def _filter_invoices(query, **filters):
+    """在 SQL 中应用列表/导出的筛选条件（Query 与 select() 均可）"""
+    criteria = _invoice_criteria(**filters)
+    return query.filter(*criteria) if criteria else query
+
+
+def _invoice_criteria(
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    category: Optional[str] = None,
+    person: Optional[str] = None,
+    anomaly_only: bool = False,
+) -> list:
+    """列表/导出筛选条件对应的 WHERE 子句"""
+    criteria = []
+    if date_from:
+        criteria.append(Invoice.invoice_date >= date_from)
+    if date_to:
+        criteria.append(Invoice.invoice_date <= date_to)
+    if category:
+        criteria.append(Invoice.expense_category == category)
+    if person:
+        criteria.append(Invoice.reimbursement_person == person)
+    if anomaly_only:
+        criteria.append(Invoice.anomaly_flag != "normal")
+    return criteria
+
+
+def _iter_export_invoices(filters: dict) -> Iterator:
+    """
+    分批读取导出的发票行（EXPORT_COLUMNS 的结果行，按属性名访问）
+    在生成 Excel 的工作线程中执行，使用独立 session，请求依赖的 session 此时可能已关闭
+    只统计读取数据库的时间，不含写 Excel 的时间
+    """
+    db = SessionLocal()
+    elapsed = 0.0
+    try:
+        query = _filter_invoices(db.query(*EXPORT_COLUMNS), **filters).order_by(Invoice.created_at.desc())
+        rows = iter(query.yield_per(EXPORT_CHUNK_SIZE))
+        while True:
+            start = time.perf_counter()
+            invoice = next(rows, None)
+            elapsed += time.perf_counter() - start
+            if invoice is None:
+                break
+            yield invoice
+    finally:
+        DB_QUERY_SECONDS.labels("export_rows").observe(elapsed)
+        db.close()
+
+
 @router.patch("/{invoice_id}", response_model=InvoiceResponse)
 def update_invoice(
     invoice_id: str, update: InvoiceUpdate, db: Session = Depends(get_db)
@@ -265,29 +488,37 @@ def update_invoice(
     if not invoice:
         raise HTTPException(status_code=404, detail="发票不存在")
 
-    for key, value in update.model_dump(exclude_unset=True).items():
+    # Move the invoice between rollup buckets in the same transaction
+    changes = update.model_dump(exclude_unset=True)
+    apply_invoice(db, invoice, -1)
+    for key, value in changes.items():
         setattr(invoice, key, value)
+    apply_invoice(db, invoice, 1)
+
+    # 人工指定的科目打上标记，reclassify 不再覆盖
+    if "expense_category" in changes:
+        invoice.raw_response = {**(invoice.raw_response or {}), MANUAL_CATEGORY_KEY: True}
 
     invoice.updated_at = datetime.utcnow()
     db.commit()
     db.refresh(invoice)
+    duplicate_detector.add(
+        duplicate_key(invoice.invoice_no, invoice.seller_tax_no, invoice.total_amount)
+    )
 
     return InvoiceResponse.model_validate(invoice)
 
 
 @router.post("/vouchers/generate", response_model=VoucherGenerateResponse)
 def generate_voucher_entries(request: VoucherGenerateRequest, db: Session = Depends(get_db)):
-    """生成凭证分录"""
-    invoices = (
-        db.query(Invoice).filter(Invoice.id.in_(request.invoice_ids)).all()
-    )
+    """生成凭证分录（在数据库中按科目汇总，不加载发票行）"""
+    category_totals, persons = aggregate_vouchers(db, Invoice.id.in_(request.invoice_ids))
 
-    if not invoices:
+    if not category_totals:
         raise HTTPException(status_code=404, detail="未找到指定发票")
 
-    invoice_responses = [InvoiceResponse.model_validate(i) for i in invoices]
-    vouchers = generate_vouchers(
-        invoice_responses, request.voucher_date, request.voucher_type, request.maker, request.department
+    vouchers = build_vouchers(
+        category_totals, persons, request.voucher_date, request.voucher_type, request.maker, request.department
     )
 
     total_debit = sum(v.金额 for v in vouchers if v.借贷方向 == "借")
@@ -305,11 +536,20 @@ def delete_invoice(invoice_id: str, db: Session = Depends(get_db)):
     if not invoice:
         raise HTTPException(status_code=404, detail="发票不存在")
 
-    # Delete file if exists
-    if invoice.image_path and os.path.exists(invoice.image_path):
-        os.remove(invoice.image_path)
+    image_path = invoice.image_path
+    if image_path:
+        thumbnail_cache.discard(image_path, invoice.page_no)
+        managed = file_store.release(db, image_path)
 
+    apply_invoice(db, invoice, -1)
     db.delete(invoice)
     db.commit()
 
+    # Delete the file once its last reference is gone (legacy uploads: right away)
+    if image_path:
+        if managed:
+            file_store.purge(image_path)
+        elif os.path.exists(image_path):
+            os.remove(image_path)
+
     return {"message": "删除成功"}
@@ -0,0 +1,47 @@
+import asyncio
+
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi.responses import FileResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..config import THUMBNAIL_MAX_AGE
+from ..database import get_async_db
+from ..models.invoice import Invoice
+from ..services.einvoice_parser import STRUCTURED_EXTENSIONS
+from ..services.thumbnail_cache import thumbnail_cache
+
+router = APIRouter(prefix="/thumbnails", tags=["thumbnails"])
+
+
+@router.get("/{invoice_id}")
+async def get_thumbnail(invoice_id: str, request: Request, db: AsyncSession = Depends(get_async_db)):
+    """
+    发票原图缩略图（JPEG）
+    ETag 由原图与缩略图参数决定，浏览器带 If-None-Match 重新验证时直接返回 304
+    """
+    row = (
+        await db.execute(select(Invoice.image_path, Invoice.page_no).where(Invoice.id == invoice_id))
+    ).first()
+    if row is None or not row.image_path:
+        raise HTTPException(status_code=404, detail="发票不存在")
+    if row.image_path.lower().rsplit(".", 1)[-1] in STRUCTURED_EXTENSIONS:
+        raise HTTPException(status_code=404, detail="结构化电子发票没有图片")
+
+    headers = {"Cache-Control": f"private, max-age={THUMBNAIL_MAX_AGE}"}
+    etag = thumbnail_cache.key(row.image_path, row.page_no)
+    if etag and _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={**headers, "ETag": f'"{etag}"'})
+
+    result = await asyncio.to_thread(thumbnail_cache.get, row.image_path, row.page_no)
+    if result is None:
+        raise HTTPException(status_code=404, detail="原图不存在")
+    path, etag = result
+    return FileResponse(path, media_type="image/jpeg", headers={**headers, "ETag": f'"{etag}"'})
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [tag.strip().removeprefix("W/").strip('"') for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags
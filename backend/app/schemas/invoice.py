@@ -21,6 +21,7 @@ class InvoiceBase(BaseModel):
 
 class InvoiceCreate(InvoiceBase):
     image_path: Optional[str] = None
+    page_no: Optional[int] = None
     raw_response: Optional[dict] = None
 
 
@@ -34,6 +35,7 @@ class InvoiceUpdate(BaseModel):
 class InvoiceResponse(InvoiceBase):
     id: str
     image_path: Optional[str] = None
+    page_no: Optional[int] = None
     created_at: datetime
     updated_at: datetime
 
@@ -43,9 +45,10 @@ class InvoiceResponse(InvoiceBase):
 
 class InvoiceListResponse(BaseModel):
     items: List[InvoiceResponse]
-    total: int
+    total: Optional[int] = None  # include_total=false 时为空
     page: int
     size: int
+    next_cursor: Optional[str] = None  # 下一页游标，没有更多数据时为空
 
 
 class CategorySummary(BaseModel):
@@ -67,9 +70,48 @@ class UploadResponse(BaseModel):
     task_id: str
     total_count: int
     processed: int
+    queued: int = 0
+    rejected: List[str] = []  # 超过大小限制被拒绝的文件名
+    message: str
+
+
+class ImportResponse(BaseModel):
+    total: int  # ZIP 中的 XML/OFD 文件数
+    imported: int
+    duplicates: int = 0  # 已导入但标记为疑似重复的发票数
+    skipped: int = 0  # 非 XML/OFD 文件
+    failed: List[str] = []  # "文件名: 原因"
     message: str
 
 
+class TaskJobStatus(BaseModel):
+    id: str
+    filename: Optional[str] = None
+    status: str  # queued/running/done/failed
+    attempts: int = 0
+    error: Optional[str] = None
+    invoice_ids: Optional[List[str]] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+
+class TaskStatusResponse(BaseModel):
+    task_id: str
+    total: int
+    queued: int
+    running: int
+    done: int
+    failed: int
+    finished: bool
+    throughput_per_minute: float  # 已完成文件数/分钟
+    eta_seconds: Optional[float] = None  # 预计剩余时间
+    jobs: List[TaskJobStatus]
+
+
 class VoucherEntry(BaseModel):
     编制日期: str
     凭证类型: str
@@ -0,0 +1,154 @@
+import hashlib
+import logging
+import math
+import threading
+from typing import Callable, Dict, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from ..config import DUPLICATE_BLOOM_CAPACITY, DUPLICATE_BLOOM_ERROR_RATE
+from ..models.invoice import Invoice
+
+logger = logging.getLogger("duplicate_detector")
+
+DuplicateKey = Tuple[str, str, float]
+
+
+def duplicate_key(invoice_no, seller_tax_no, total_amount) -> Optional[DuplicateKey]:
+    """发票查重键 (发票号, 销方税号, 价税合计)，没有发票号时不参与查重"""
+    # GLM 有时把发票号/税号识别为数字，统一转为字符串
+    invoice_no = str(invoice_no or "").strip()
+    if not invoice_no:
+        return None
+    return invoice_no, str(seller_tax_no or "").strip().upper(), round(float(total_amount or 0), 2)
+
+
+class BloomFilter:
+    """
+    布隆过滤器
+    判定"不存在"一定准确，判定"可能存在"时有 error_rate 概率误报。
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        self.capacity = capacity
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.hash_count):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, item: str):
+        for pos in self._positions(item):
+            self._bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(self._bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+
+class DuplicateDetector:
+    """
+    重复报销检测
+    内存布隆过滤器挡在前面：绝大多数发票不重复，无需查询数据库；
+    过滤器判定可能存在时，再用 (invoice_no, seller_tax_no) 索引精确确认。
+    过滤器首次使用时从发票表加载，之后随新发票增量更新。
+    batch_checker 看不到其他会话尚未提交的发票：从查重到提交并 add() 期间须持有
+    insert_lock，否则并发入库的两张相同发票都不会被判为重复。
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self._bloom: Optional[BloomFilter] = None
+        self._lock = threading.Lock()
+        self.insert_lock = threading.Lock()  # 串行化"查重 → 入库提交"
+        self.bloom_negatives = 0
+        self.db_lookups = 0
+        self.duplicates = 0
+
+    @staticmethod
+    def _encode(key: DuplicateKey) -> str:
+        return f"{key[0]}|{key[1]}|{key[2]:.2f}"
+
+    def _ensure_loaded(self, db: Session):
+        if self._bloom is not None and self._bloom.count <= self._bloom.capacity:
+            return
+
+        rows = db.execute(
+            select(Invoice.invoice_no, Invoice.seller_tax_no, Invoice.total_amount)
+            .where(Invoice.invoice_no.isnot(None))
+            .execution_options(yield_per=10000)
+        )
+        keys = [self._encode(key) for key in (duplicate_key(*row) for row in rows) if key]
+        # 预留一倍余量，超出容量后下次使用时按新数量重建
+        bloom = BloomFilter(max(self.capacity, len(keys) * 2), self.error_rate)
+        for key in keys:
+            bloom.add(key)
+        self._bloom = bloom
+        logger.info(f"查重过滤器已加载 {len(keys)} 张发票")
+
+    def find(self, db: Session, key: Optional[DuplicateKey]) -> Optional[str]:
+        """查找与 key 相同的已入库发票，返回其 ID"""
+        if key is None:
+            return None
+
+        with self._lock:
+            self._ensure_loaded(db)
+            if self._encode(key) not in self._bloom:
+                self.bloom_negatives += 1
+                return None
+            self.db_lookups += 1
+
+        candidates = db.execute(
+            select(Invoice.id, Invoice.seller_tax_no, Invoice.total_amount)
+            .where(Invoice.invoice_no == key[0])
+        )
+        for invoice_id, seller_tax_no, total_amount in candidates:
+            if duplicate_key(key[0], seller_tax_no, total_amount) == key:
+                with self._lock:
+                    self.duplicates += 1
+                return invoice_id
+        return None
+
+    def batch_checker(self, db: Session) -> Callable[[Optional[DuplicateKey]], bool]:
+        """
+        返回同一批发票共用的查重函数
+        除已入库的发票外，也能发现同一批次（如 PDF 的不同页）中的重复
+        """
+        seen = set()
+
+        def is_duplicate(key: Optional[DuplicateKey]) -> bool:
+            if key is None:
+                return False
+            duplicate = key in seen or self.find(db, key) is not None
+            seen.add(key)
+            return duplicate
+
+        return is_duplicate
+
+    def add(self, key: Optional[DuplicateKey]):
+        """登记新入库的发票（应在提交后调用）"""
+        if key is None:
+            return
+        with self._lock:
+            if self._bloom is not None:
+                self._bloom.add(self._encode(key))
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "indexed": self._bloom.count if self._bloom else 0,
+                "bloom_negatives": self.bloom_negatives,
+                "db_lookups": self.db_lookups,
+                "duplicates": self.duplicates,
+            }
+
+
+duplicate_detector = DuplicateDetector(DUPLICATE_BLOOM_CAPACITY, DUPLICATE_BLOOM_ERROR_RATE)
@@ -0,0 +1,115 @@
+import hashlib
+import logging
+import os
+import zipfile
+from typing import Dict, List, Optional, Tuple
+
+from ..config import MAX_IMPORT_FILES, MAX_UPLOAD_SIZE
+from ..database import SessionLocal
+from ..models.invoice import Invoice
+from .duplicate_detector import duplicate_detector, duplicate_key
+from .einvoice_parser import STRUCTURED_EXTENSIONS, ZIP_READ_ERRORS, EInvoiceParseError, parse_einvoice
+from .file_store import file_store
+from .invoice_parser import build_invoice
+from .summary_rollup import apply_invoice
+
+logger = logging.getLogger("einvoice_import")
+
+COMMIT_BATCH_SIZE = 500  # 每批提交的发票数
+
+# 单个条目读取/解析失败（加密、不支持的压缩方式、数据损坏、OFD 不是有效 ZIP 等），记为失败后继续
+ENTRY_ERRORS = (EInvoiceParseError, *ZIP_READ_ERRORS)
+
+
+def import_einvoice_zip(zip_path: str, reimbursement_person: Optional[str] = None) -> Dict:
+    """
+    从 ZIP 批量导入全电发票（XML/OFD），不经过识别队列和 GLM
+    逐个条目读取解析，每 COMMIT_BATCH_SIZE 张提交一次，内存占用与 ZIP 大小无关。
+    原文件按内容存入 file_store，发票的 image_path 指向它；文件引用数与发票在同一事务中提交。
+    阻塞调用，应放入线程池。
+    """
+    counts = {"total": 0, "imported": 0, "duplicates": 0, "skipped": 0}
+    failed: List[str] = []
+    pending: List[Tuple[Invoice, str, str, str, int]] = []  # (发票, 临时文件, 哈希, 扩展名, 大小)
+    # 每批从第一次查重到提交期间持有查重锁，与识别队列的入库串行
+    insert_lock = duplicate_detector.insert_lock
+    locked = False
+
+    db = SessionLocal()
+    try:
+        check_duplicate = duplicate_detector.batch_checker(db)
+
+        def is_duplicate(key) -> bool:
+            duplicate = check_duplicate(key)
+            counts["duplicates"] += duplicate
+            return duplicate
+
+        def commit_pending():
+            nonlocal locked
+            invoices = [invoice for invoice, *_ in pending]
+            with file_store.batch(db) as add_file:
+                for invoice, *blob in pending:
+                    invoice.image_path = add_file(*blob)
+                db.add_all(invoices)
+                db.flush()
+                for invoice in invoices:
+                    apply_invoice(db, invoice)
+            for invoice in invoices:
+                duplicate_detector.add(
+                    duplicate_key(invoice.invoice_no, invoice.seller_tax_no, invoice.total_amount)
+                )
+            pending.clear()
+            insert_lock.release()
+            locked = False
+
+        with zipfile.ZipFile(zip_path) as archive:
+            for info in archive.infolist():
+                if info.is_dir():
+                    continue
+                ext = info.filename.lower().rsplit(".", 1)[-1]
+                if ext not in STRUCTURED_EXTENSIONS:
+                    counts["skipped"] += 1
+                    continue
+                counts["total"] += 1
+                if counts["total"] > MAX_IMPORT_FILES:
+                    failed.append(f"{info.filename}: 超过单次导入上限 {MAX_IMPORT_FILES} 个文件")
+                    continue
+                if info.file_size > MAX_UPLOAD_SIZE:
+                    failed.append(f"{info.filename}: 文件过大")
+                    continue
+
+                try:
+                    data = archive.read(info)
+                    result = parse_einvoice(data, ext)
+                except ENTRY_ERRORS as e:
+                    failed.append(f"{info.filename}: {e}")
+                    continue
+
+                if not locked:
+                    insert_lock.acquire()
+                    locked = True
+                invoice = build_invoice(result, None, reimbursement_person, None, is_duplicate)
+                tmp_path = file_store.temp_path()
+                with open(tmp_path, "wb") as f:
+                    f.write(data)
+                pending.append((invoice, tmp_path, hashlib.sha256(data).hexdigest(), ext, len(data)))
+                counts["imported"] += 1
+                if len(pending) >= COMMIT_BATCH_SIZE:
+                    commit_pending()
+
+        if pending:
+            commit_pending()
+    finally:
+        if locked:
+            insert_lock.release()
+        db.close()
+        # 未提交的条目：删除临时文件（提交失败时 file_store 已删除）
+        for _, tmp_path, *_ in pending:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    logger.info(
+        f"导入 {zip_path}: {counts['imported']}/{counts['total']} 张，"
+        f"重复 {counts['duplicates']}，失败 {len(failed)}"
+    )
+    return {**counts, "failed": failed}
@@ -0,0 +1,203 @@
+import re
+import zipfile
+import zlib
+from datetime import datetime
+from io import BytesIO
+from typing import Dict, Iterable, List, Optional
+from xml.etree import ElementTree
+
+from ..config import MAX_UPLOAD_SIZE
+
+# 结构化电子发票文件，直接解析入库，不经过 GLM 识别
+STRUCTURED_EXTENSIONS = ("xml", "ofd")
+
+# 全电发票 XML 各字段的标签名（按优先级；兼容部分地区/版本的拼音缩写标签）
+XML_FIELDS = {
+    "invoice_no": ["InvoiceNumber", "EIid", "InvoiceNo", "Fphm"],
+    "invoice_date": ["IssueTime", "IssueDate", "RequestTime", "Kprq"],
+    "seller_name": ["SellerName", "XsfMc"],
+    "seller_tax_no": ["SellerIdNum", "SellerTaxID", "XsfNsrsbh"],
+    "amount": ["TotalAmWithoutTax", "TotalAmount", "Hjje"],
+    "tax_amount": ["TotalTaxAm", "TotalTax", "Hjse"],
+    "total_amount": ["TotalTax-includedAmount", "TotalAmountWithTax", "Jshj"],
+    "drawer": ["Drawer", "Kpr"],
+}
+XML_ITEM_TAGS = ("ItemName", "Xmmc")
+
+# OFD.xml 中 CustomData 的名称
+OFD_FIELDS = {
+    "invoice_no": ["发票号码"],
+    "invoice_date": ["开票日期"],
+    "seller_name": ["销售方名称", "销方名称"],
+    "seller_tax_no": ["销售方纳税人识别号", "销售方统一社会信用代码/纳税人识别号", "销方识别号"],
+    "amount": ["合计金额", "金额"],
+    "tax_amount": ["合计税额", "税额"],
+    "total_amount": ["价税合计", "价税合计(小写)"],
+    "invoice_code": ["发票代码"],
+    "check_code": ["校验码"],
+}
+
+
+class EInvoiceParseError(ValueError):
+    """文件不是可识别的电子发票，或缺少必要字段"""
+
+
+# 读取 OFD（ZIP）内条目时的错误：数据损坏、加密、不支持的压缩方式
+ZIP_READ_ERRORS = (zipfile.BadZipFile, zlib.error, RuntimeError, NotImplementedError, EOFError)
+
+
+def _local(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+
+def _parse_xml(data: bytes) -> ElementTree.Element:
+    """
+    解析上传的 XML。发票 XML 不需要 DTD，含 DOCTYPE/ENTITY 声明的一律拒绝，
+    防止实体扩展（billion laughs）攻击；UTF-16/32 等含空字节的编码无法做字节检查，同样拒绝。
+    """
+    if b"\x00" in data:
+        raise EInvoiceParseError("不支持的 XML 编码")
+    if b"<!DOCTYPE" in data or b"<!ENTITY" in data:
+        raise EInvoiceParseError("XML 不允许包含 DOCTYPE 或实体声明")
+    try:
+        return ElementTree.fromstring(data)
+    except ElementTree.ParseError as e:
+        raise EInvoiceParseError(f"XML 格式错误: {e}") from e
+
+
+def _amount(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return round(float(re.sub(r"[¥￥,\s]", "", value)), 2)
+    except ValueError:
+        return None
+
+
+def _date(value: Optional[str]) -> Optional[str]:
+    """统一为 YYYY-MM-DD，忽略时间部分"""
+    if not value:
+        return None
+    value = value.strip()
+    for fmt, length in (("%Y-%m-%d", 10), ("%Y%m%d", 8), ("%Y年%m月%d日", 11)):
+        try:
+            return datetime.strptime(value[:length], fmt).date().isoformat()
+        except ValueError:
+            continue
+    return None
+
+
+def _build_result(fields: Dict[str, Optional[str]], items: List[str], invoice_type: str, source: str) -> dict:
+    """把提取出的原始字段转换为与 GLM 识别结果相同结构的字典"""
+    invoice_no = (fields.get("invoice_no") or "").strip()
+    amount = _amount(fields.get("amount"))
+    tax_amount = _amount(fields.get("tax_amount"))
+    total_amount = _amount(fields.get("total_amount"))
+
+    if total_amount is None and amount is not None:
+        total_amount = round(amount + (tax_amount or 0), 2)
+    if amount is None and total_amount is not None:
+        amount = round(total_amount - (tax_amount or 0), 2)
+    if not invoice_no or total_amount is None:
+        raise EInvoiceParseError("缺少发票号码或金额")
+
+    result = {
+        "doc_type": "发票",
+        "invoice_no": invoice_no,
+        "invoice_date": _date(fields.get("invoice_date")),
+        "invoice_type": invoice_type,
+        "seller_name": fields.get("seller_name"),
+        "seller_tax_no": fields.get("seller_tax_no"),
+        "amount": amount,
+        "tax_amount": tax_amount or 0,
+        "total_amount": total_amount,
+        "items": items,
+        "confidence": 1.0,
+        "source": source,
+    }
+    for extra in ("invoice_code", "check_code", "drawer"):
+        if fields.get(extra):
+            result[extra] = fields[extra]
+    return result
+
+
+def parse_einvoice_xml(data: bytes, source: str = "xml") -> dict:
+    """解析全电发票（数电票）XML"""
+    root = _parse_xml(data)
+    texts: Dict[str, str] = {}
+    items = []
+    type_label = ""
+    for element in root.iter():
+        name = _local(element.tag)
+        text = (element.text or "").strip()
+        if name in XML_ITEM_TAGS and text:
+            items.append(text)
+        elif name == "GeneralOrSpecialVAT":
+            type_label = "".join(element.itertext())
+        elif text and name not in texts:
+            texts[name] = text
+
+    fields = {field: _first(texts, tags) for field, tags in XML_FIELDS.items()}
+    invoice_type = "增值税专票" if "专用" in type_label else "电子普票"
+    return _build_result(fields, items, invoice_type, source)
+
+
+def parse_ofd(data: bytes) -> dict:
+    """
+    解析 OFD 版电子发票
+    优先使用附件中的发票 XML（数电票 OFD 一般附带），否则读取 OFD.xml 中的 CustomData
+    """
+    try:
+        archive = zipfile.ZipFile(BytesIO(data))
+    except zipfile.BadZipFile as e:
+        raise EInvoiceParseError("不是有效的 OFD 文件") from e
+
+    with archive:
+        for info in archive.infolist():
+            name = info.filename.lower()
+            if not name.endswith(".xml") or "attach" not in name or info.file_size > MAX_UPLOAD_SIZE:
+                continue
+            try:
+                return parse_einvoice_xml(_read_entry(archive, info), source="ofd")
+            except EInvoiceParseError:
+                continue
+
+        try:
+            info = archive.getinfo("OFD.xml")
+        except KeyError as e:
+            raise EInvoiceParseError("OFD 文件缺少 OFD.xml") from e
+        if info.file_size > MAX_UPLOAD_SIZE:
+            raise EInvoiceParseError("OFD.xml 过大")
+        root = _parse_xml(_read_entry(archive, info))
+
+    custom = {}
+    for element in root.iter():
+        if _local(element.tag) == "CustomData" and element.get("Name"):
+            custom.setdefault(element.get("Name").strip(), (element.text or "").strip())
+    if not custom:
+        raise EInvoiceParseError("OFD 文件中没有发票数据")
+
+    fields = {field: _first(custom, names) for field, names in OFD_FIELDS.items()}
+    invoice_type = "增值税专票" if "专用" in custom.get("发票类型", "") else "电子普票"
+    return _build_result(fields, [], invoice_type, "ofd")
+
+
+def _read_entry(archive: zipfile.ZipFile, info: zipfile.ZipInfo) -> bytes:
+    try:
+        return archive.read(info)
+    except ZIP_READ_ERRORS as e:
+        raise EInvoiceParseError(f"OFD 文件损坏或无法读取: {e}") from e
+
+
+def parse_einvoice(data: bytes, ext: str) -> dict:
+    """按扩展名解析结构化电子发票，失败时抛出 EInvoiceParseError"""
+    if ext == "ofd":
+        return parse_ofd(data)
+    return parse_einvoice_xml(data)
+
+
+def _first(values: Dict[str, str], keys: Iterable[str]) -> Optional[str]:
+    for key in keys:
+        if values.get(key):
+            return values[key]
+    return None
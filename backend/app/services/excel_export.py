@@ -1,194 +1,236 @@
-from io import BytesIO
-from typing import List
+import asyncio
+import os
+import pickle
+import tempfile
+from typing import AsyncIterator, Iterable, List
+
 from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment, Border, Side, PatternFill
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, Border, Side, PatternFill
+from openpyxl.utils import get_column_letter
 
-from ..schemas.invoice import InvoiceResponse, VoucherEntry, CategorySummary
+from ..schemas.invoice import VoucherEntry, CategorySummary
 
+# 样式定义
+HEADER_FONT = Font(bold=True)
+HEADER_FILL = PatternFill(start_color="DAEEF3", end_color="DAEEF3", fill_type="solid")
+BORDER = Border(
+    left=Side(style="thin"),
+    right=Side(style="thin"),
+    top=Side(style="thin"),
+    bottom=Side(style="thin"),
+)
 
-def create_invoice_excel(
-    invoices: List[InvoiceResponse],
-    summary: List[CategorySummary],
-    anomalies: List[InvoiceResponse],
-    vouchers: List[VoucherEntry],
-) -> BytesIO:
-    """创建包含4个Sheet的Excel文件"""
-    wb = Workbook()
-
-    # 样式定义
-    header_font = Font(bold=True)
-    header_fill = PatternFill(start_color="DAEEF3", end_color="DAEEF3", fill_type="solid")
-    border = Border(
-        left=Side(style="thin"),
-        right=Side(style="thin"),
-        top=Side(style="thin"),
-        bottom=Side(style="thin"),
-    )
+MAX_COLUMN_WIDTH = 50
+STREAM_CHUNK_SIZE = 64 * 1024
 
-    # Sheet 1: 凭证导入模板 (放在第一个)
-    ws1 = wb.active
-    ws1.title = "凭证导入模板"
-    headers1 = [
-        "编制日期",
-        "凭证类型",
-        "凭证序号",
-        "凭证号",
-        "制单人",
-        "附件张数",
-        "会计年度",
-        "科目编码",
-        "科目名称",
-        "凭证摘要",
-        "借贷方向",
-        "金额",
-        "币种",
-        "汇率",
-        "原币金额",
-        "数量",
-        "单价",
-        "结算方式名称",
-        "结算日期",
-        "结算票号",
-        "业务日期",
-        "员工编号",
-        "员工姓名",
-        "往来单位编号",
-        "往来单位名称",
-        "货品编号",
-        "货品名称",
-        "部门名称",
-        "项目名称",
+VOUCHER_HEADERS = [
+    "编制日期",
+    "凭证类型",
+    "凭证序号",
+    "凭证号",
+    "制单人",
+    "附件张数",
+    "会计年度",
+    "科目编码",
+    "科目名称",
+    "凭证摘要",
+    "借贷方向",
+    "金额",
+    "币种",
+    "汇率",
+    "原币金额",
+    "数量",
+    "单价",
+    "结算方式名称",
+    "结算日期",
+    "结算票号",
+    "业务日期",
+    "员工编号",
+    "员工姓名",
+    "往来单位编号",
+    "往来单位名称",
+    "货品编号",
+    "货品名称",
+    "部门名称",
+    "项目名称",
+]
+DETAIL_HEADERS = [
+    "发票号",
+    "日期",
+    "类型",
+    "销方名称",
+    "金额",
+    "税额",
+    "价税合计",
+    "费用科目",
+    "报销人",
+    "置信度",
+    "状态",
+    "异常原因",
+]
+SUMMARY_HEADERS = ["费用科目", "发票数量", "合计金额", "合计税额"]
+ANOMALY_HEADERS = ["发票号", "销方名称", "金额", "异常原因", "原图路径"]
+
+
+class _SheetBuffer:
+    """
+    工作表行缓冲
+    write-only 工作表必须在写入第一行前确定列宽，因此先把行序列化到临时文件，
+    同时增量统计每列最大宽度，最后一次性写入。内存占用与行数无关。
+    """
+
+    def __init__(self, headers: List[str]):
+        self.headers = headers
+        self.widths = [len(h) for h in headers]
+        self.row_count = 0
+        self._file = tempfile.TemporaryFile()
+
+    def append(self, row: list):
+        for index, value in enumerate(row):
+            length = len(str(value))
+            if length > self.widths[index]:
+                self.widths[index] = length
+        pickle.dump(row, self._file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.row_count += 1
+
+    def write_to(self, ws):
+        for index, width in enumerate(self.widths, 1):
+            ws.column_dimensions[get_column_letter(index)].width = min(width + 2, MAX_COLUMN_WIDTH)
+
+        header = []
+        for title in self.headers:
+            cell = WriteOnlyCell(ws, value=title)
+            cell.font = HEADER_FONT
+            cell.fill = HEADER_FILL
+            cell.border = BORDER
+            header.append(cell)
+        ws.append(header)
+
+        self._file.seek(0)
+        for _ in range(self.row_count):
+            ws.append(pickle.load(self._file))
+        self._file.close()
+
+
+def _voucher_row(v: VoucherEntry) -> list:
+    return [
+        v.编制日期 or "",
+        v.凭证类型 or "",
+        v.凭证序号 if v.凭证序号 is not None else "",
+        v.凭证号 or "",
+        v.制单人 or "",
+        v.附件张数 if v.附件张数 is not None else 0,
+        v.会计年度 or "",
+        v.科目编码 or "",
+        v.科目名称 or "",
+        v.凭证摘要 or "",
+        v.借贷方向 or "",
+        v.金额 if v.金额 is not None else 0,
+        v.币种 or "人民币",
+        v.汇率 if v.汇率 is not None else 1,
+        v.原币金额 if v.原币金额 is not None else 0,
+        v.数量 if v.数量 is not None else "",
+        v.单价 if v.单价 is not None else "",
+        v.结算方式名称 or "",
+        v.结算日期 or "",
+        v.结算票号 or "",
+        v.业务日期 or "",
+        v.员工编号 or "",
+        v.员工姓名 or "",
+        v.往来单位编号 or "",
+        v.往来单位名称 or "",
+        v.货品编号 or "",
+        v.货品名称 or "",
+        v.部门名称 or "",
+        v.项目名称 or "",
     ]
-    ws1.append(headers1)
-    for cell in ws1[1]:
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.border = border
 
-    for v in vouchers:
-        ws1.append(
-            [
-                v.编制日期 or "",
-                v.凭证类型 or "",
-                v.凭证序号 if v.凭证序号 is not None else "",
-                v.凭证号 or "",
-                v.制单人 or "",
-                v.附件张数 if v.附件张数 is not None else 0,
-                v.会计年度 or "",
-                v.科目编码 or "",
-                v.科目名称 or "",
-                v.凭证摘要 or "",
-                v.借贷方向 or "",
-                v.金额 if v.金额 is not None else 0,
-                v.币种 or "人民币",
-                v.汇率 if v.汇率 is not None else 1,
-                v.原币金额 if v.原币金额 is not None else 0,
-                v.数量 if v.数量 is not None else "",
-                v.单价 if v.单价 is not None else "",
-                v.结算方式名称 or "",
-                v.结算日期 or "",
-                v.结算票号 or "",
-                v.业务日期 or "",
-                v.员工编号 or "",
-                v.员工姓名 or "",
-                v.往来单位编号 or "",
-                v.往来单位名称 or "",
-                v.货品编号 or "",
-                v.货品名称 or "",
-                v.部门名称 or "",
-                v.项目名称 or "",
-            ]
-        )
 
-    # Sheet 2: 发票明细表
-    ws2 = wb.create_sheet("发票明细表")
-    headers2 = [
-        "发票号",
-        "日期",
-        "类型",
-        "销方名称",
-        "金额",
-        "税额",
-        "价税合计",
-        "费用科目",
-        "报销人",
-        "置信度",
-        "状态",
-        "异常原因",
+def _detail_row(inv) -> list:
+    status = "✓" if inv.anomaly_flag == "normal" else "⚠️"
+    return [
+        inv.invoice_no or "",
+        str(inv.invoice_date) if inv.invoice_date else "",
+        inv.invoice_type or "",
+        inv.seller_name or "",
+        inv.amount,
+        inv.tax_amount,
+        inv.total_amount,
+        inv.expense_category or "",
+        inv.reimbursement_person or "",
+        f"{inv.confidence:.0%}" if inv.confidence else "",
+        status,
+        inv.anomaly_reason or "",
     ]
-    ws2.append(headers2)
-    for cell in ws2[1]:
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.border = border
 
-    for inv in invoices:
-        status = "✓" if inv.anomaly_flag == "normal" else "⚠️"
-        ws2.append(
-            [
-                inv.invoice_no or "",
-                str(inv.invoice_date) if inv.invoice_date else "",
-                inv.invoice_type or "",
-                inv.seller_name or "",
-                inv.amount,
-                inv.tax_amount,
-                inv.total_amount,
-                inv.expense_category or "",
-                inv.reimbursement_person or "",
-                f"{inv.confidence:.0%}" if inv.confidence else "",
-                status,
-                inv.anomaly_reason or "",
-            ]
-        )
 
-    # Sheet 3: 汇总表
-    ws3 = wb.create_sheet("汇总表")
-    headers3 = ["费用科目", "发票数量", "合计金额", "合计税额"]
-    ws3.append(headers3)
-    for cell in ws3[1]:
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.border = border
+def _anomaly_row(inv) -> list:
+    return [
+        inv.invoice_no or "",
+        inv.seller_name or "",
+        inv.total_amount,
+        inv.anomaly_reason or "",
+        inv.image_path or "",
+    ]
+
+
+def write_invoice_excel(
+    path: str,
+    invoices: Iterable,
+    summary: List[CategorySummary],
+    vouchers: List[VoucherEntry],
+):
+    """
+    以 write-only 模式写出包含4个Sheet的Excel文件
+    invoices 可以是任意可迭代对象（InvoiceResponse 或 ORM 行），只遍历一次，
+    异常清单在同一次遍历中生成。
+    """
+    voucher_sheet = _SheetBuffer(VOUCHER_HEADERS)
+    for v in vouchers:
+        voucher_sheet.append(_voucher_row(v))
+
+    detail_sheet = _SheetBuffer(DETAIL_HEADERS)
+    anomaly_sheet = _SheetBuffer(ANOMALY_HEADERS)
+    for inv in invoices:
+        detail_sheet.append(_detail_row(inv))
+        if inv.anomaly_flag != "normal":
+            anomaly_sheet.append(_anomaly_row(inv))
 
+    summary_sheet = _SheetBuffer(SUMMARY_HEADERS)
     for item in summary:
-        ws3.append([item.category, item.count, item.amount, item.tax_amount])
+        summary_sheet.append([item.category, item.count, item.amount, item.tax_amount])
 
+    wb = Workbook(write_only=True)
+    # Sheet 1: 凭证导入模板 (放在第一个)
+    voucher_sheet.write_to(wb.create_sheet("凭证导入模板"))
+    # Sheet 2: 发票明细表
+    detail_sheet.write_to(wb.create_sheet("发票明细表"))
+    # Sheet 3: 汇总表
+    summary_sheet.write_to(wb.create_sheet("汇总表"))
     # Sheet 4: 异常清单
-    ws4 = wb.create_sheet("异常清单")
-    headers4 = ["发票号", "销方名称", "金额", "异常原因", "原图路径"]
-    ws4.append(headers4)
-    for cell in ws4[1]:
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.border = border
-
-    for inv in anomalies:
-        ws4.append(
-            [
-                inv.invoice_no or "",
-                inv.seller_name or "",
-                inv.total_amount,
-                inv.anomaly_reason or "",
-                inv.image_path or "",
-            ]
-        )
-
-    # 调整列宽
-    for ws in [ws1, ws2, ws3, ws4]:
-        for column in ws.columns:
-            max_length = 0
-            column_letter = column[0].column_letter
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = min(max_length + 2, 50)
-            ws.column_dimensions[column_letter].width = adjusted_width
-
-    # 保存到内存
-    output = BytesIO()
-    wb.save(output)
-    output.seek(0)
-    return output
+    anomaly_sheet.write_to(wb.create_sheet("异常清单"))
+
+    wb.save(path)
+
+
+async def stream_invoice_excel(
+    invoices: Iterable,
+    summary: List[CategorySummary],
+    vouchers: List[VoucherEntry],
+) -> AsyncIterator[bytes]:
+    """
+    供 StreamingResponse 使用：在工作线程中把完整 Excel 生成到临时文件，再分块输出
+    这不是真正的流式生成——xlsx 是 zip 包，必须整个写完才有第一个字节可发。
+    StreamingResponse 会先发送响应头，连接在生成期间保持打开；生成不占用事件循环。
+    invoices 在工作线程中遍历，其中的数据库读取也在该线程执行。
+    """
+    fd, path = tempfile.mkstemp(suffix=".xlsx", prefix="invoices_")
+    os.close(fd)
+    try:
+        await asyncio.to_thread(write_invoice_excel, path, invoices, summary, vouchers)
+        with open(path, "rb") as f:
+            while chunk := await asyncio.to_thread(f.read, STREAM_CHUNK_SIZE):
+                yield chunk
+    finally:
+        os.remove(path)
@@ -0,0 +1,180 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger("expense_classifier")
+
+DEFAULT_CATEGORY = "其他"
+
+
+class KeywordMatcher:
+    """
+    多模式关键词匹配器（Aho-Corasick 自动机）
+    所有关键词编译进一个自动机，对文本只扫描一遍。
+    每个关键词带一个优先级（数值越小越优先），match 返回命中的最高优先级。
+    """
+
+    def __init__(self, patterns: Iterable[Tuple[str, int]]):
+        # 节点以数组下标表示：转移表、失败指针、该节点可输出的最高优先级
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._best: List[Optional[int]] = [None]
+
+        for keyword, priority in patterns:
+            if not keyword:
+                continue
+            node = 0
+            for char in keyword:
+                next_node = self._goto[node].get(char)
+                if next_node is None:
+                    next_node = len(self._goto)
+                    self._goto[node][char] = next_node
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._best.append(None)
+                node = next_node
+            if self._best[node] is None or priority < self._best[node]:
+                self._best[node] = priority
+
+        self._build_fail_links()
+
+    def _build_fail_links(self):
+        """按层次遍历建立失败指针，并把后缀节点的输出合并到当前节点"""
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fallback = self._fail[node]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(char, 0)
+                self._fail[child] = target if target != child else 0
+
+                inherited = self._best[self._fail[child]]
+                if inherited is not None and (
+                    self._best[child] is None or inherited < self._best[child]
+                ):
+                    self._best[child] = inherited
+
+    def match(self, text: str) -> Optional[int]:
+        """返回文本中命中关键词的最高优先级，未命中返回 None"""
+        goto, fail, best_of = self._goto, self._fail, self._best
+        node = 0
+        best = None
+        for char in text:
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            priority = best_of[node]
+            if priority is not None and (best is None or priority < best):
+                best = priority
+                if best == 0:
+                    break
+        return best
+
+
+class ExpenseClassifier:
+    """
+    费用科目分类器
+    规则为 {科目: [关键词, ...]}，科目顺序即优先级：同时命中多个科目时取排在前面的。
+    配置了规则文件时，按修改时间检查变更并热加载；文件无效时保留上一版规则。
+    """
+
+    def __init__(
+        self,
+        default_rules: Dict[str, List[str]],
+        rules_path: str = "",
+        reload_interval: float = 5.0,
+    ):
+        self.rules_path = rules_path
+        self.reload_interval = reload_interval
+        self._default_rules = default_rules
+        self._lock = threading.Lock()
+        self._rules_mtime: Optional[float] = None
+        self._next_check = 0.0
+
+        self.rules: Dict[str, List[str]] = default_rules
+        self._compiled = self._compile(default_rules)
+        if rules_path:
+            self.reload()
+
+    @staticmethod
+    def _compile(rules: Dict[str, List[str]]) -> Tuple[List[str], KeywordMatcher]:
+        matcher = KeywordMatcher(
+            (keyword.lower(), priority)
+            for priority, keywords in enumerate(rules.values())
+            for keyword in keywords
+        )
+        return list(rules), matcher
+
+    @staticmethod
+    def _load_rules(path: str) -> Dict[str, List[str]]:
+        with open(path, "r", encoding="utf-8") as f:
+            rules = json.load(f)
+        if not isinstance(rules, dict) or not all(
+            isinstance(keywords, list) and all(isinstance(k, str) for k in keywords)
+            for keywords in rules.values()
+        ):
+            raise ValueError("规则文件格式应为 {科目: [关键词, ...]}")
+        return rules
+
+    def reload(self) -> bool:
+        """
+        从规则文件重新加载规则
+        返回是否加载了新规则；文件不存在时回退到内置规则
+        """
+        with self._lock:
+            self._next_check = time.monotonic() + self.reload_interval
+            try:
+                mtime = os.path.getmtime(self.rules_path)
+            except OSError:
+                if self._rules_mtime is None:
+                    return False
+                logger.warning(f"规则文件 {self.rules_path} 不存在，使用内置规则")
+                rules, mtime = self._default_rules, None
+            else:
+                if mtime == self._rules_mtime:
+                    return False
+                try:
+                    rules = self._load_rules(self.rules_path)
+                except (OSError, ValueError) as e:
+                    logger.error(f"规则文件 {self.rules_path} 加载失败，继续使用当前规则: {e}")
+                    self._rules_mtime = mtime
+                    return False
+
+            # 先编译再整体替换，分类线程总是看到完整的一版规则
+            self._compiled = self._compile(rules)
+            self.rules = rules
+            self._rules_mtime = mtime
+            logger.info(
+                f"已加载费用科目规则: {len(rules)} 个科目, "
+                f"{sum(len(k) for k in rules.values())} 个关键词"
+            )
+            return True
+
+    def _maybe_reload(self):
+        if self.rules_path and time.monotonic() >= self._next_check:
+            self.reload()
+
+    @staticmethod
+    def _classify(compiled: Tuple[List[str], KeywordMatcher], seller_name: str, items: list) -> str:
+        categories, matcher = compiled
+        text = (seller_name or "") + " ".join(items or [])
+        priority = matcher.match(text.lower())
+        return categories[priority] if priority is not None else DEFAULT_CATEGORY
+
+    def classify(self, seller_name: str, items: list) -> str:
+        """根据销方名称和商品名称分类费用科目"""
+        self._maybe_reload()
+        return self._classify(self._compiled, seller_name, items)
+
+    def classify_many(self, rows: Iterable[Tuple[str, list]]) -> List[str]:
+        """批量分类 [(销方名称, 商品列表), ...]，整批使用同一版规则"""
+        self._maybe_reload()
+        compiled = self._compiled
+        return [self._classify(compiled, seller_name, items) for seller_name, items in rows]
@@ -0,0 +1,169 @@
+import base64
+import hashlib
+import json
+import math
+import random
+import threading
+import time
+from collections import deque
+from types import SimpleNamespace
+from typing import Optional
+
+import httpx
+from zhipuai.core import APIInternalError, APIReachLimitError, APITimeoutError
+
+FAKE_ENDPOINT = "http://fake-glm.local/api/paas/v4/chat/completions"
+
+SELLERS = [
+    ("北京滴滴出行科技有限公司", "交通费", ["客运服务费"]),
+    ("中国铁路北京局集团有限公司", "交通费", ["铁路旅客运输"]),
+    ("中国国际航空股份有限公司", "交通费", ["机票款", "民航发展基金"]),
+    ("上海锦江之星酒店管理有限公司", "差旅费-住宿", ["住宿费"]),
+    ("杭州西湖国宾馆", "差旅费-住宿", ["住宿服务"]),
+    ("北京全聚德烤鸭股份有限公司", "业务招待费", ["餐饮服务"]),
+    ("海底捞餐饮股份有限公司", "业务招待费", ["餐费"]),
+    ("得力集团有限公司", "办公费", ["文具", "打印纸"]),
+    ("晨光文具股份有限公司", "办公费", ["办公用品"]),
+    ("中国移动通信集团北京有限公司", "通讯费", ["话费"]),
+    ("中国联合网络通信有限公司", "通讯费", ["宽带费"]),
+    ("联想(北京)有限公司", "固定资产", ["笔记本电脑"]),
+    ("戴尔(中国)有限公司", "固定资产", ["服务器"]),
+    ("京东五金工具专营店", "低值易耗品", ["工具", "耗材"]),
+    ("某某咨询服务有限公司", "其他", ["咨询服务费"]),
+]
+INVOICE_TYPES = ["电子普票", "电子普票", "增值税普票", "增值税专票"]
+PEOPLE = ["张三", "李四", "王五", "赵六", "钱七"]
+
+
+class FakeGLMClient:
+    """
+    本地 GLM 替身，接口与 ZhipuAI 客户端的 chat.completions.create 相同
+    按对数正态分布模拟延迟，按比例模拟 5xx、超时和 429（含每分钟配额），
+    根据图片内容生成确定性的发票数据：同一张图片总是得到同一结果，不同图片各不相同。
+    一次请求包含多张图片时返回带 index 的 JSON 数组（对应 GLM_BATCH_SIZE 批量识别）。
+    用于压测和基准测试，不消耗 API 配额。
+    """
+
+    def __init__(
+        self,
+        latency_median: float = 2.0,
+        latency_sigma: float = 0.5,
+        error_rate: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        requests_per_minute: float = 0,
+        timeout: float = 60.0,
+        seed: Optional[int] = None,
+    ):
+        self.latency_median = latency_median
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.requests_per_minute = requests_per_minute
+        self.timeout = timeout
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._recent = deque()  # 最近 60 秒的请求时间，用于模拟配额
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, model: str, messages: list, **kwargs):
+        request = httpx.Request("POST", FAKE_ENDPOINT)
+        images = self._images(messages)
+        with self._lock:
+            draw = self._random.random()
+            latency = self.latency_median * math.exp(self._random.gauss(0, self.latency_sigma))
+            # 多图请求的延迟随图片数增加，但低于逐张请求之和
+            latency *= 1 + 0.4 * max(0, len(images) - 1)
+            retry_after = self._check_quota()
+
+        if retry_after is not None or draw < self.rate_limit_rate:
+            headers = {"retry-after": f"{retry_after:.0f}"} if retry_after else {}
+            raise APIReachLimitError(
+                "模拟 429: 请求频率超过限制",
+                response=httpx.Response(429, headers=headers, request=request),
+            )
+        if draw < self.rate_limit_rate + self.error_rate:
+            time.sleep(min(latency, self.timeout) / 4)
+            raise APIInternalError(
+                "模拟 500: 服务内部错误", response=httpx.Response(500, request=request)
+            )
+        if latency > self.timeout:
+            time.sleep(self.timeout)
+            raise APITimeoutError(request)
+
+        time.sleep(latency)
+        if len(images) > 1:
+            results = [{"index": n, **self._invoice(image)} for n, image in enumerate(images, 1)]
+            content = json.dumps(results, ensure_ascii=False, indent=2)
+        else:
+            content = self._content(images[0] if images else b"")
+        prompt_tokens = 1100 + sum(len(image) // 700 for image in images)
+        completion_tokens = len(content) // 2
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+            usage=SimpleNamespace(
+                prompt_tokens=prompt_tokens,
+                completion_tokens=completion_tokens,
+                total_tokens=prompt_tokens + completion_tokens,
+            ),
+        )
+
+    def _check_quota(self) -> Optional[float]:
+        """超过每分钟配额时返回需要等待的秒数（调用方持有锁）"""
+        if self.requests_per_minute <= 0:
+            return None
+        now = time.monotonic()
+        while self._recent and now - self._recent[0] >= 60:
+            self._recent.popleft()
+        if len(self._recent) >= self.requests_per_minute:
+            return max(1.0, 60 - (now - self._recent[0]))
+        self._recent.append(now)
+        return None
+
+    @staticmethod
+    def _images(messages: list) -> list:
+        images = []
+        for message in messages:
+            for part in message.get("content", []):
+                if isinstance(part, dict) and part.get("type") == "image_url":
+                    url = part["image_url"]["url"]
+                    images.append(base64.b64decode(url.split(",", 1)[-1]))
+        return images
+
+    @classmethod
+    def _content(cls, image_bytes: bytes) -> str:
+        # 真实响应有时会把 JSON 包在 markdown 代码块里
+        text = json.dumps(cls._invoice(image_bytes), ensure_ascii=False, indent=2)
+        fenced = hashlib.sha256(image_bytes).digest()[8] < 77  # 约 30%
+        return f"```json\n{text}\n```" if fenced else text
+
+    @staticmethod
+    def _invoice(image_bytes: bytes) -> dict:
+        """按图片内容哈希生成一张看起来真实的发票"""
+        seed = int.from_bytes(hashlib.sha256(image_bytes).digest()[:8], "big")
+        rng = random.Random(seed)
+        seller, category, items = rng.choice(SELLERS)
+        invoice_type = rng.choice(INVOICE_TYPES)
+        amount = round(math.exp(rng.uniform(math.log(15), math.log(12000))), 2)
+        tax_rate = 0.0 if category == "交通费" and rng.random() < 0.5 else rng.choice([0.01, 0.03, 0.06, 0.13])
+        tax = round(amount * tax_rate, 2)
+        day = time.time() - rng.uniform(0, 240) * 86400
+        return {
+            "doc_type": "发票",
+            "invoice_no": str(rng.randrange(10**19, 10**20)),
+            "invoice_date": time.strftime("%Y-%m-%d", time.localtime(day)),
+            "invoice_type": invoice_type,
+            "seller_name": seller,
+            "seller_tax_no": f"91{rng.randrange(10**15, 10**16)}",
+            "amount": amount,
+            "tax_amount": tax,
+            "total_amount": round(amount + tax, 2),
+            "items": items,
+            "payee": rng.choice(PEOPLE),
+            "handler": None,
+            "approver": None,
+            "reviewer": None,
+            "department": None,
+            "expense_category": category,
+            "attachments_count": rng.randint(0, 3),
+            "confidence": round(rng.betavariate(20, 1.2), 2),
+        }
@@ -0,0 +1,28 @@
+from typing import Iterable, List
+
+import orjson
+from fastapi import Response
+
+from ..models.invoice import Invoice
+from ..schemas.invoice import InvoiceResponse
+
+# 与 InvoiceResponse 字段一一对应的列，select(*INVOICE_COLUMNS) 直接得到行元组
+INVOICE_FIELDS = tuple(InvoiceResponse.model_fields)
+INVOICE_COLUMNS = tuple(getattr(Invoice, name) for name in INVOICE_FIELDS)
+
+
+class FastJSONResponse(Response):
+    """
+    orjson 序列化的 JSON 响应
+    内容来自数据库的可信数据，不经过 response_model 校验；date/datetime 输出与 Pydantic 一致
+    """
+
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content)
+
+
+def invoice_dicts(rows: Iterable) -> List[dict]:
+    """把 select(*INVOICE_COLUMNS) 的结果行转成 InvoiceResponse 形状的字典"""
+    return [dict(zip(INVOICE_FIELDS, row)) for row in rows]
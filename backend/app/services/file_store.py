@@ -0,0 +1,230 @@
+import hashlib
+import logging
+import os
+import threading
+import uuid
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from ..config import UPLOAD_DIR
+from ..database import SessionLocal
+from ..models.invoice import Invoice
+from ..models.stored_file import StoredFile
+from ..models.task import RecognitionJob
+
+logger = logging.getLogger("file_store")
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+class FileStore:
+    """
+    按内容寻址的上传文件存储
+    文件保存为 root/ab/cd/<sha256>.<ext>（两级 256 路分片），相同内容只存一份。
+    stored_files.ref_count 记录引用数：上传排队时占 1 个，识别完成后转给生成的发票
+    （PDF 每页一张发票各占 1 个），删除发票时释放，最后一个引用释放后才删除文件。
+    同一进程内的入库与删除由锁串行，避免刚释放的文件被新上传复用时误删。
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self.tmp_dir = os.path.join(root, "tmp")
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self.stored = 0
+        self.deduplicated = 0
+        self.removed = 0
+
+    def temp_path(self) -> str:
+        """上传写入用的临时文件路径（与存储目录同一文件系统，入库时原子移动）"""
+        return os.path.join(self.tmp_dir, f"{uuid.uuid4().hex}.part")
+
+    def blob_path(self, content_hash: str, ext: str) -> str:
+        return os.path.join(self.root, content_hash[:2], content_hash[2:4], f"{content_hash}.{ext}")
+
+    def add(self, tmp_path: str, content_hash: str, ext: str, size: int) -> str:
+        """
+        把已写完并算好哈希的临时文件纳入存储，引用数 +1，返回文件路径
+        已有相同内容时直接丢弃临时文件。阻塞调用，async 代码中应放入线程池。
+        """
+        db = SessionLocal()
+        try:
+            with self.batch(db) as add_file:
+                return add_file(tmp_path, content_hash, ext, size)
+        finally:
+            db.close()
+
+    @contextmanager
+    def batch(self, db: Session) -> Iterator[Callable[[str, str, str, int], str]]:
+        """
+        在调用方的事务中纳入一批临时文件，引用数与引用它们的记录一起提交
+            with file_store.batch(db) as add_file:
+                invoice.image_path = add_file(tmp_path, content_hash, ext, size)
+                db.add(invoice)
+        正常退出时提交 db 再把临时文件移入存储；出现异常时回滚并删除这批临时文件。
+        全程持有存储锁，与 purge 串行。
+        """
+        moves: List[Tuple[str, str]] = []
+
+        def add_file(tmp_path: str, content_hash: str, ext: str, size: int) -> str:
+            insert = pg_insert if db.bind.dialect.name == "postgresql" else sqlite_insert
+            stmt = insert(StoredFile).values(
+                content_hash=content_hash,
+                path=self.blob_path(content_hash, ext),
+                size=size,
+                ref_count=1,
+            )
+            stmt = stmt.on_conflict_do_update(
+                index_elements=["content_hash"],
+                set_={"ref_count": StoredFile.ref_count + 1},
+            )
+            db.execute(stmt)
+            path = db.scalar(select(StoredFile.path).where(StoredFile.content_hash == content_hash))
+            moves.append((tmp_path, path))
+            return path
+
+        with self._lock:
+            try:
+                yield add_file
+                db.commit()
+            except BaseException:
+                db.rollback()
+                for tmp_path, _ in moves:
+                    if os.path.exists(tmp_path):
+                        os.remove(tmp_path)
+                raise
+
+            for tmp_path, path in moves:
+                if os.path.exists(path):
+                    os.remove(tmp_path)
+                    self.deduplicated += 1
+                else:
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    os.replace(tmp_path, path)
+                    self.stored += 1
+
+    def add_refs(self, db: Session, path: str, count: int):
+        """在调用方的事务中增加引用（如一个排队任务生成了多张发票）"""
+        if count:
+            db.execute(
+                update(StoredFile)
+                .where(StoredFile.path == path)
+                .values(ref_count=StoredFile.ref_count + count)
+            )
+
+    def release(self, db: Session, path: str) -> bool:
+        """
+        在调用方的事务中释放一个引用
+        返回 False 表示文件不归存储管理（升级前的旧上传）；提交后应调用 purge
+        """
+        result = db.execute(
+            update(StoredFile)
+            .where(StoredFile.path == path)
+            .values(ref_count=StoredFile.ref_count - 1)
+        )
+        return result.rowcount > 0
+
+    def purge(self, path: str) -> bool:
+        """引用已全部释放时删除文件，返回是否删除"""
+        with self._lock:
+            db = SessionLocal()
+            try:
+                # 条件删除：并发事务刚增加的引用提交后，这里不会误删
+                deleted = db.execute(
+                    delete(StoredFile).where(StoredFile.path == path, StoredFile.ref_count <= 0)
+                )
+                db.commit()
+            finally:
+                db.close()
+            if not deleted.rowcount:
+                return False
+
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self.removed += 1
+            return True
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            "stored": self.stored,
+            "deduplicated": self.deduplicated,
+            "removed": self.removed,
+        }
+
+
+def migrate_legacy_uploads(db: Session, store: "FileStore", dry_run: bool = False) -> Dict[str, int]:
+    """
+    把 UPLOAD_DIR 根目录下旧的 <uuid>.<ext> 文件迁入内容寻址存储
+    引用数 = 指向该文件的发票数 + 尚未完成的识别任务数；没有任何引用的文件保留原处不动
+    """
+    counts = {"moved": 0, "deduplicated": 0, "orphaned": 0}
+    seen = set()
+    for entry in os.scandir(store.root):
+        if not entry.is_file():
+            continue
+        old_path = os.path.join(store.root, entry.name)
+
+        invoices = db.scalar(select(func.count()).where(Invoice.image_path == old_path))
+        pending = db.scalar(
+            select(func.count()).where(
+                RecognitionJob.file_path == old_path,
+                RecognitionJob.status.in_(["queued", "running"]),
+            )
+        )
+        if not invoices and not pending:
+            counts["orphaned"] += 1
+            continue
+
+        sha256 = hashlib.sha256()
+        with open(old_path, "rb") as f:
+            while chunk := f.read(HASH_CHUNK_SIZE):
+                sha256.update(chunk)
+        content_hash = sha256.hexdigest()
+        ext = entry.name.rsplit(".", 1)[-1].lower()
+
+        stored: Optional[StoredFile] = db.get(StoredFile, content_hash)
+        counts["deduplicated" if stored or content_hash in seen else "moved"] += 1
+        seen.add(content_hash)
+        if dry_run:
+            continue
+
+        if stored is None:
+            stored = StoredFile(
+                content_hash=content_hash,
+                path=store.blob_path(content_hash, ext),
+                size=entry.stat().st_size,
+                ref_count=0,
+            )
+            db.add(stored)
+        stored.ref_count += invoices + pending
+
+        db.execute(update(Invoice).where(Invoice.image_path == old_path).values(image_path=stored.path))
+        db.execute(
+            update(RecognitionJob).where(RecognitionJob.file_path == old_path).values(file_path=stored.path)
+        )
+        # 提交失败时把文件移回原处，数据库与文件保持一致，重新执行即可
+        moved = not os.path.exists(stored.path)
+        if moved:
+            os.makedirs(os.path.dirname(stored.path), exist_ok=True)
+            os.replace(old_path, stored.path)
+        try:
+            db.commit()
+        except Exception:
+            if moved:
+                os.replace(stored.path, old_path)
+            raise
+        if not moved:
+            os.remove(old_path)
+        logger.info(f"{old_path} -> {stored.path}")
+
+    return counts
+
+
+file_store = FileStore(UPLOAD_DIR)
@@ -1,28 +1,107 @@
+import asyncio
 import base64
+import hashlib
 import json
 import logging
 import os
+import random
 import re
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Optional
+from typing import Callable, List, Optional
 from zhipuai import ZhipuAI
+from zhipuai.core import (
+    APIConnectionError,
+    APIReachLimitError,
+    APIStatusError,
+    APITimeoutError,
+)
 
-from ..config import GLM_API_KEY
+from ..config import (
+    GLM_API_KEY,
+    GLM_BACKEND,
+    FAKE_GLM_LATENCY_MEDIAN,
+    FAKE_GLM_LATENCY_SIGMA,
+    FAKE_GLM_ERROR_RATE,
+    FAKE_GLM_RATE_LIMIT_RATE,
+    FAKE_GLM_RPM,
+    FAKE_GLM_SEED,
+    LOG_DIR,
+    GLM_LOG_FLUSH_INTERVAL,
+    GLM_LOG_BATCH_SIZE,
+    GLM_LOG_QUEUE_SIZE,
+    GLM_LOG_MAX_BYTES,
+    GLM_LOG_ROTATE_HOURS,
+    GLM_LOG_BACKUP_COUNT,
+    GLM_LOG_COMPRESS,
+    GLM_LOG_PAYLOAD_SAMPLE_RATE,
+    GLM_REQUEST_TIMEOUT,
+    GLM_RATE_LIMIT_RPM,
+    GLM_RATE_LIMIT_BURST,
+    GLM_MAX_RETRIES,
+    GLM_RETRY_BASE_DELAY,
+    GLM_RETRY_MAX_DELAY,
+    GLM_BREAKER_FAILURE_THRESHOLD,
+    GLM_BREAKER_RESET_SECONDS,
+    GLM_BATCH_SIZE,
+    GLM_BATCH_WAIT,
+    RECOGNITION_CONCURRENCY,
+    CACHE_ENABLED,
+    CACHE_DB_PATH,
+    CACHE_MEMORY_ENTRIES,
+    CACHE_MAX_ENTRIES,
+    CACHE_TTL_DAYS,
+    IMAGE_PREPROCESS_ENABLED,
+    INVOICE_QR_MODE,
+)
+from .fake_glm import FakeGLMClient
+from .image_preprocess import preprocess_image
+from .invoice_qr import decode_invoice_qr, merge_qr, qr_result
+from .log_writer import BatchedFileHandler, BatchedLogWriter
+from .metrics import (
+    GLM_BATCH_IMAGES,
+    GLM_ERRORS,
+    GLM_IMAGE_BYTES,
+    GLM_RECOGNITION_SECONDS,
+    GLM_REQUEST_SECONDS,
+    GLM_RETRIES,
+    GLM_TOKENS,
+)
+from .recognition_cache import RecognitionCache
+from .request_batcher import RequestBatcher
+from .resilience import CircuitBreaker, CircuitBreakerOpen, TokenBucket, backoff_delay
 
 # 配置日志
-LOG_DIR = "./logs"
 os.makedirs(LOG_DIR, exist_ok=True)
 
+
+def _log_writer(filename: str, **kwargs) -> BatchedLogWriter:
+    return BatchedLogWriter(
+        os.path.join(LOG_DIR, filename),
+        flush_interval=GLM_LOG_FLUSH_INTERVAL,
+        batch_size=GLM_LOG_BATCH_SIZE,
+        queue_size=GLM_LOG_QUEUE_SIZE,
+        max_bytes=GLM_LOG_MAX_BYTES,
+        rotate_seconds=GLM_LOG_ROTATE_HOURS * 3600,
+        backup_count=GLM_LOG_BACKUP_COUNT,
+        compress=GLM_LOG_COMPRESS,
+        **kwargs,
+    )
+
+
+# 调用明细 (JSON Lines)，序列化也在后台线程中进行
+details_writer = _log_writer(
+    "glm_details.jsonl", serialize=lambda entry: json.dumps(entry, ensure_ascii=False)
+)
+
 # 创建 GLM 专用 logger
 glm_logger = logging.getLogger("glm_service")
 glm_logger.setLevel(logging.DEBUG)
 
-# 文件处理器 - 记录所有调用
-file_handler = logging.FileHandler(
-    os.path.join(LOG_DIR, "glm_calls.log"),
-    encoding="utf-8"
-)
+# 文件处理器 - 记录所有调用（后台批量写入，不阻塞识别线程）
+file_handler = BatchedFileHandler(_log_writer("glm_calls.log"))
 file_handler.setLevel(logging.DEBUG)
 file_handler.setFormatter(logging.Formatter(
     "%(asctime)s | %(levelname)s | %(message)s",
@@ -40,6 +119,18 @@ console_handler.setFormatter(logging.Formatter(
 glm_logger.addHandler(file_handler)
 glm_logger.addHandler(console_handler)
 
+# 费用科目分类标准（完整识别与二维码补充识别共用）
+EXPENSE_CATEGORY_GUIDE = """【费用科目分类标准】请根据单据内容判断，expense_category 必须是以下值之一：
+- "交通费": 滴滴、出租车、地铁、公交、高铁、火车票、机票、航空、铁路、出行相关
+- "差旅费-住宿": 酒店、宾馆、民宿、住宿、旅馆、客房
+- "业务招待费": 餐饮、餐厅、饭店、酒楼、餐馆、食堂、请客吃饭
+- "办公费": 文具、打印、复印、办公用品、纸张、墨盒、笔记本(文具类)、文件夹
+- "通讯费": 电信、移动、联通、话费、通讯、宽带、网络费
+- "固定资产": 固定资产、设备、电脑、服务器、打印机、空调、家具、大型办公设备
+- "低值易耗品": 低值易耗品、工具、耗材
+- "其他": 无法归入以上类别的费用
+"""
+
 INVOICE_PROMPT = """请识别这张单据图片（可能是发票或费用报销单），提取以下信息并以 JSON 格式返回：
 {
   "doc_type": "发票/费用报销单/收据/其他",
@@ -62,16 +153,7 @@ INVOICE_PROMPT = """请识别这张单据图片（可能是发票或费用报销
   "confidence": 置信度(0-1之间的小数，表示识别准确度)
 }
 
-【费用科目分类标准】请根据单据内容判断，expense_category 必须是以下值之一：
-- "交通费": 滴滴、出租车、地铁、公交、高铁、火车票、机票、航空、铁路、出行相关
-- "差旅费-住宿": 酒店、宾馆、民宿、住宿、旅馆、客房
-- "业务招待费": 餐饮、餐厅、饭店、酒楼、餐馆、食堂、请客吃饭
-- "办公费": 文具、打印、复印、办公用品、纸张、墨盒、笔记本(文具类)、文件夹
-- "通讯费": 电信、移动、联通、话费、通讯、宽带、网络费
-- "固定资产": 固定资产、设备、电脑、服务器、打印机、空调、家具、大型办公设备
-- "低值易耗品": 低值易耗品、工具、耗材
-- "其他": 无法归入以上类别的费用
-
+""" + EXPENSE_CATEGORY_GUIDE + """
 注意事项：
 1. 如果某个字段无法识别，请设为 null
 2. 金额字段必须是纯数字，不要带单位符号（如 ¥29659.07 应返回 29659.07）
@@ -83,93 +165,483 @@ INVOICE_PROMPT = """请识别这张单据图片（可能是发票或费用报销
 8. expense_category 必须严格从上述分类标准中选择一个
 """
 
+# merge 模式下二维码已给出发票号码、日期、不含税金额，只请模型识别其余字段（提示词和输出都更短）
+QR_SUPPLEMENT_PROMPT = """这是一张增值税发票，发票号码、开票日期和不含税金额已从二维码读出，无需识别。请只提取以下信息并以 JSON 格式返回：
+{
+  "invoice_type": "增值税专票/增值税普票/电子普票/其他",
+  "seller_name": "销方名称",
+  "seller_tax_no": "销方税号",
+  "tax_amount": 税额(数字，如果没有则为0),
+  "total_amount": 价税合计(数字),
+  "items": ["商品/服务名称"],
+  "payee": "领款人姓名",
+  "handler": "经手人姓名",
+  "expense_category": "费用类别(必须从下方分类标准中选择)",
+  "confidence": 置信度(0-1之间的小数，表示识别准确度)
+}
+
+""" + EXPENSE_CATEGORY_GUIDE + """
+无法识别的字段设为 null；金额必须是纯数字；只返回 JSON 对象，不要包含其他说明文字。
+"""
+
+# 批量识别时追加在 INVOICE_PROMPT 之后
+BATCH_INSTRUCTIONS = """
+【批量识别】本次共 {count} 张图片，请按图片顺序逐张识别，返回一个 JSON 数组（此要求替代上文第 4 条）：
+[{{"index": 1, ...第 1 张图片的字段...}}, {{"index": 2, ...}}, ...]
+数组长度必须等于图片数量，index 从 1 开始，与图片顺序一致；
+某张图片无法识别时返回 {{"index": 序号}}，其余字段设为 null。只返回 JSON 数组，不要包含其他说明文字。
+"""
+
+GLM_MODEL = "glm-4.6v"
+
+# 缓存版本：模型或提示词变化时自动失效
+CACHE_VERSION = hashlib.sha256(
+    f"{GLM_MODEL}\n{INVOICE_PROMPT}\n{QR_SUPPLEMENT_PROMPT}".encode("utf-8")
+).hexdigest()[:16]
+
+
+class GLMUnavailableError(Exception):
+    """
+    GLM 暂时不可用（熔断中或重试耗尽），任务应重新排队而不是记为识别失败
+    rejected 表示请求被熔断器直接拒绝，没有真正发出
+    """
+
+    def __init__(self, message: str, retry_after: float = 0.0, rejected: bool = False):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.rejected = rejected
+
+
+def _classify_error(error: Exception):
+    """
+    判断 API 错误是否可重试
+    返回: (可重试, 是否服务端故障, 服务端要求的等待秒数)
+    """
+    if isinstance(error, APIReachLimitError):
+        retry_after = error.response.headers.get("retry-after")
+        try:
+            return True, False, float(retry_after) if retry_after else None
+        except ValueError:
+            return True, False, None
+    if isinstance(error, APIStatusError):
+        status = error.status_code
+        return status >= 500 or status in (408, 409), status >= 500, None
+    if isinstance(error, APIConnectionError):  # 包括超时
+        return True, True, None
+    return False, False, None
+
+
+def _error_type(error: Exception) -> str:
+    """错误类型标签，用于 glm_errors 指标"""
+    if isinstance(error, APIReachLimitError):
+        return "rate_limited"
+    if isinstance(error, APIStatusError):
+        return f"http_{error.status_code}"
+    if isinstance(error, APITimeoutError):
+        return "timeout"
+    if isinstance(error, APIConnectionError):
+        return "connection"
+    return type(error).__name__
+
+
+def _create_client():
+    """
+    按 GLM_BACKEND 创建识别后端，返回具有 chat.completions.create 接口的客户端
+    zhipu 未配置 API Key 时返回 None（模拟模式，直接返回固定结果）
+    """
+    if GLM_BACKEND == "fake":
+        return FakeGLMClient(
+            latency_median=FAKE_GLM_LATENCY_MEDIAN,
+            latency_sigma=FAKE_GLM_LATENCY_SIGMA,
+            error_rate=FAKE_GLM_ERROR_RATE,
+            rate_limit_rate=FAKE_GLM_RATE_LIMIT_RATE,
+            requests_per_minute=FAKE_GLM_RPM,
+            timeout=GLM_REQUEST_TIMEOUT,
+            seed=int(FAKE_GLM_SEED) if FAKE_GLM_SEED else None,
+        )
+    if GLM_BACKEND != "zhipu":
+        raise ValueError(f"未知的 GLM_BACKEND: {GLM_BACKEND}")
+    if not GLM_API_KEY:
+        return None
+    # SDK 自带重试关闭，由下面的限流/重试/熔断统一控制
+    return ZhipuAI(api_key=GLM_API_KEY, timeout=GLM_REQUEST_TIMEOUT, max_retries=0)
+
 
 class GLMService:
     def __init__(self):
-        self.client = ZhipuAI(api_key=GLM_API_KEY) if GLM_API_KEY else None
+        if INVOICE_QR_MODE not in ("off", "merge", "skip"):
+            raise ValueError(f"未知的 INVOICE_QR_MODE: {INVOICE_QR_MODE}")
+        self.client = _create_client()
         self.call_count = 0
         self.total_tokens = 0
-
-        if self.client:
+        self.retry_count = 0
+        self.qr_decoded = 0
+        self.batch_count = 0
+        self.batch_fallbacks = 0
+        self.rate_limiter = TokenBucket(GLM_RATE_LIMIT_RPM, GLM_RATE_LIMIT_BURST)
+        self.breaker = CircuitBreaker(GLM_BREAKER_FAILURE_THRESHOLD, GLM_BREAKER_RESET_SECONDS)
+        # 识别在线程池中并发执行，计数器需要加锁
+        self._stats_lock = threading.Lock()
+        # 专用线程池，大小与识别并发数一致，不占用默认线程池
+        self._executor = ThreadPoolExecutor(
+            max_workers=RECOGNITION_CONCURRENCY, thread_name_prefix="glm"
+        )
+        self.cache = (
+            RecognitionCache(
+                CACHE_DB_PATH,
+                CACHE_VERSION,
+                memory_entries=CACHE_MEMORY_ENTRIES,
+                max_entries=CACHE_MAX_ENTRIES,
+                ttl_seconds=CACHE_TTL_DAYS * 24 * 3600,
+            )
+            if CACHE_ENABLED
+            else None
+        )
+
+        # 多张图片合并为一次请求；批量结果缺失或格式错误的图片退回单张识别
+        self.batcher = (
+            RequestBatcher(self._recognize_batch, GLM_BATCH_SIZE, GLM_BATCH_WAIT)
+            if GLM_BATCH_SIZE > 1
+            else None
+        )
+
+        if isinstance(self.client, FakeGLMClient):
+            glm_logger.warning(
+                f"GLM Service 初始化: 使用本地模拟后端 (延迟中位数 {FAKE_GLM_LATENCY_MEDIAN}s, "
+                f"5xx {FAKE_GLM_ERROR_RATE:.0%}, 429 {FAKE_GLM_RATE_LIMIT_RATE:.0%})"
+            )
+        elif self.client:
             glm_logger.info(f"GLM Service 初始化成功, API Key: {GLM_API_KEY[:8]}...{GLM_API_KEY[-4:]}")
         else:
             glm_logger.warning("GLM Service 初始化: 无 API Key, 使用模拟模式")
 
-    def recognize_invoice(self, image_path: str) -> Optional[dict]:
-        """识别发票图片，返回解析结果"""
-        self.call_count += 1
-        call_id = f"GLM-{self.call_count:04d}"
+    def recognize_invoice(self, image_path: str, content_hash: Optional[str] = None) -> Optional[dict]:
+        """
+        识别发票图片，返回解析结果
+        上传时已计算 content_hash 的，缓存命中后无需再读取文件
+        """
+        # Determine image type
+        if image_path.lower().endswith(".png"):
+            mime_type = "image/png"
+        elif image_path.lower().endswith((".jpg", ".jpeg")):
+            mime_type = "image/jpeg"
+        else:
+            mime_type = "image/png"
+
+        def load_image() -> bytes:
+            with open(image_path, "rb") as img_file:
+                return img_file.read()
+
+        return self._recognize(image_path, load_image, mime_type, content_hash)
+
+    def recognize_image(
+        self, image_bytes: bytes, source: str, mime_type: str = "image/png"
+    ) -> Optional[dict]:
+        """识别内存中的图片（如 PDF 渲染页），source 仅用于日志"""
+        return self._recognize(source, lambda: image_bytes, mime_type)
+
+    def _recognize(
+        self,
+        source: str,
+        load_image: Callable[[], bytes],
+        mime_type: str,
+        content_hash: Optional[str] = None,
+    ) -> Optional[dict]:
+        with self._stats_lock:
+            self.call_count += 1
+            call_id = f"GLM-{self.call_count:04d}"
         start_time = time.time()
 
-        glm_logger.info(f"[{call_id}] 开始识别 | 图片: {image_path}")
+        glm_logger.info(f"[{call_id}] 开始识别 | 图片: {source}")
 
         if not self.client:
             glm_logger.warning(f"[{call_id}] 使用模拟模式 (无 API Key)")
+            GLM_RECOGNITION_SECONDS.labels("mock").observe(time.time() - start_time)
             return self._mock_response()
 
+        outcome = "failed"
         try:
-            # 获取图片大小
-            file_size = os.path.getsize(image_path)
-            glm_logger.debug(f"[{call_id}] 图片大小: {file_size / 1024:.1f} KB")
-
-            # Read and encode image
-            with open(image_path, "rb") as img_file:
-                img_base64 = base64.b64encode(img_file.read()).decode("utf-8")
-
-            # Determine image type
-            if image_path.lower().endswith(".png"):
-                img_url = f"data:image/png;base64,{img_base64}"
-            elif image_path.lower().endswith((".jpg", ".jpeg")):
-                img_url = f"data:image/jpeg;base64,{img_base64}"
-            else:
-                img_url = f"data:image/png;base64,{img_base64}"
-
-            glm_logger.debug(f"[{call_id}] 调用 GLM API | Model: glm-4.6v")
-
-            response = self.client.chat.completions.create(
-                model="glm-4.6v",
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [
-                            {"type": "image_url", "image_url": {"url": img_url}},
-                            {"type": "text", "text": INVOICE_PROMPT},
-                        ],
-                    }
-                ],
-            )
+            image_bytes = None
+            if content_hash is None:
+                image_bytes = load_image()
+                content_hash = hashlib.sha256(image_bytes).hexdigest()
+
+            # 按内容哈希查询缓存
+            if self.cache:
+                cached = self.cache.get(content_hash)
+                if cached is not None:
+                    elapsed = time.time() - start_time
+                    glm_logger.info(f"[{call_id}] 命中缓存 | 耗时: {elapsed * 1000:.1f}ms | 发票号: {cached.get('invoice_no', 'N/A')}")
+                    outcome = "cache"
+                    return cached
+
+            if image_bytes is None:
+                image_bytes = load_image()
+            glm_logger.debug(f"[{call_id}] 图片大小: {len(image_bytes) / 1024:.1f} KB")
+            GLM_IMAGE_BYTES.labels("original").observe(len(image_bytes))
+
+            # 电子发票二维码：解码出的字段是精确值，skip 模式下直接返回，不调用模型
+            qr = self._decode_qr(call_id, image_bytes)
+            if qr and INVOICE_QR_MODE == "skip":
+                outcome = "qr"
+                return qr_result(qr)
+
+            # 预处理: 缩放/灰度/去除 EXIF 并重新编码为 JPEG
+            if IMAGE_PREPROCESS_ENABLED:
+                try:
+                    processed, mime_type = preprocess_image(image_bytes)
+                    glm_logger.info(
+                        f"[{call_id}] 图片预处理 | {len(image_bytes) / 1024:.1f} KB -> {len(processed) / 1024:.1f} KB "
+                        f"({len(processed) / len(image_bytes):.0%})"
+                    )
+                    image_bytes = processed
+                except Exception as e:
+                    glm_logger.warning(f"[{call_id}] 图片预处理失败，使用原图 | 错误: {str(e)}")
+
+            # Encode image
+            GLM_IMAGE_BYTES.labels("sent").observe(len(image_bytes))
+            img_base64 = base64.b64encode(image_bytes).decode("utf-8")
+            img_url = f"data:{mime_type};base64,{img_base64}"
+
+            glm_logger.debug(f"[{call_id}] 调用 GLM API | Model: {GLM_MODEL}")
+
+            content = None
+            if self.batcher:
+                content = self.batcher.submit(img_url).result()
+                if content is None:
+                    with self._stats_lock:
+                        self.batch_fallbacks += 1
+                    glm_logger.warning(f"[{call_id}] 批量识别未返回该图片的有效结果，改为单张识别")
+            if content is None:
+                # 已解码二维码时只请模型补充二维码没有的字段（批量识别仍使用完整提示词）
+                prompt = QR_SUPPLEMENT_PROMPT if qr else INVOICE_PROMPT
+                response = self._call_api(
+                    call_id,
+                    [
+                        {"type": "image_url", "image_url": {"url": img_url}},
+                        {"type": "text", "text": prompt},
+                    ],
+                )
+                content = response.choices[0].message.content
+                self._record_usage(call_id, response)
 
             elapsed = time.time() - start_time
-            content = response.choices[0].message.content
-
-            # 记录 token 使用量
-            usage = getattr(response, 'usage', None)
-            if usage:
-                prompt_tokens = getattr(usage, 'prompt_tokens', 0)
-                completion_tokens = getattr(usage, 'completion_tokens', 0)
-                total_tokens = getattr(usage, 'total_tokens', 0)
-                self.total_tokens += total_tokens
-                glm_logger.info(f"[{call_id}] Token 使用: prompt={prompt_tokens}, completion={completion_tokens}, total={total_tokens}")
 
             # 解析结果
             result = self._parse_response(content)
+            if result and qr:
+                result = merge_qr(result, qr)
+            log_payload = random.random() < GLM_LOG_PAYLOAD_SAMPLE_RATE
 
             if result:
+                outcome = "api"
+                if self.cache:
+                    self.cache.put(content_hash, result)
                 glm_logger.info(f"[{call_id}] 识别成功 | 耗时: {elapsed:.2f}s | 发票号: {result.get('invoice_no', 'N/A')} | 金额: {result.get('total_amount', 0)}")
-                glm_logger.debug(f"[{call_id}] 完整结果: {json.dumps(result, ensure_ascii=False)}")
+                if log_payload:
+                    glm_logger.debug(f"[{call_id}] 完整结果: {json.dumps(result, ensure_ascii=False)}")
             else:
+                GLM_ERRORS.labels("parse_error").inc()
                 glm_logger.warning(f"[{call_id}] 解析失败 | 耗时: {elapsed:.2f}s | 原始响应: {content[:200]}...")
 
-            # 记录原始响应到日志文件
-            self._log_raw_response(call_id, image_path, content, result, elapsed)
+            # 记录原始响应到日志文件（解析失败时总是记录完整响应）
+            self._log_raw_response(
+                call_id, source, content if log_payload or not result else None, result, elapsed
+            )
 
             return result
 
+        except GLMUnavailableError as e:
+            outcome = "unavailable"
+            elapsed = time.time() - start_time
+            glm_logger.error(f"[{call_id}] GLM 暂不可用，任务将重新排队 | 耗时: {elapsed:.2f}s | 错误: {str(e)}")
+            self._log_error(call_id, source, str(e), elapsed)
+            raise
+
         except Exception as e:
             elapsed = time.time() - start_time
             glm_logger.error(f"[{call_id}] API 调用失败 | 耗时: {elapsed:.2f}s | 错误: {str(e)}")
-            self._log_error(call_id, image_path, str(e), elapsed)
+            self._log_error(call_id, source, str(e), elapsed)
+            return None
+
+        finally:
+            GLM_RECOGNITION_SECONDS.labels(outcome).observe(time.time() - start_time)
+
+    def _decode_qr(self, call_id: str, image_bytes: bytes) -> Optional[dict]:
+        """本地解码发票二维码，失败或未找到时返回 None（不影响后续模型识别）"""
+        if INVOICE_QR_MODE == "off":
+            return None
+        start = time.perf_counter()
+        try:
+            qr = decode_invoice_qr(image_bytes)
+        except Exception as e:
+            glm_logger.warning(f"[{call_id}] 二维码解码失败 | 错误: {str(e)}")
+            return None
+        elapsed = time.perf_counter() - start
+        if qr is None:
+            glm_logger.debug(f"[{call_id}] 未找到发票二维码 | 耗时: {elapsed * 1000:.1f}ms")
             return None
+        with self._stats_lock:
+            self.qr_decoded += 1
+        glm_logger.info(
+            f"[{call_id}] 二维码解码成功 | 耗时: {elapsed * 1000:.1f}ms | 发票号: {qr['invoice_no']} | 金额: {qr['amount']}"
+        )
+        return qr
+
+    def _recognize_batch(self, img_urls: List[str]) -> List[Optional[str]]:
+        """
+        RequestBatcher 的处理函数：把一批图片合并为一次请求
+        返回每张图片对应的 JSON 文本，缺失或格式错误的为 None（调用方改为单张识别）；
+        GLM 不可用时抛出 GLMUnavailableError，整批任务重新排队
+        """
+        count = len(img_urls)
+        with self._stats_lock:
+            self.batch_count += 1
+            batch_id = f"GLM-B{self.batch_count:04d}"
+
+        # 等待超时时只凑到一张：按单张请求发送，原样返回响应
+        prompt = INVOICE_PROMPT if count == 1 else INVOICE_PROMPT + BATCH_INSTRUCTIONS.format(count=count)
+        content = [{"type": "image_url", "image_url": {"url": url}} for url in img_urls]
+        content.append({"type": "text", "text": prompt})
+        glm_logger.info(f"[{batch_id}] 批量识别 {count} 张图片")
+        GLM_BATCH_IMAGES.observe(count)
+        try:
+            response = self._call_api(batch_id, content)
+        except GLMUnavailableError:
+            raise
+        except Exception as e:
+            glm_logger.error(f"[{batch_id}] 批量请求失败，逐张重试 | 错误: {str(e)}")
+            return [None] * count
+
+        self._record_usage(batch_id, response, count)
+        raw = response.choices[0].message.content
+        if count == 1:
+            return [raw]
+        items = self._split_batch(raw, count)
+        valid = sum(item is not None for item in items)
+        if valid < count:
+            glm_logger.warning(f"[{batch_id}] 批量结果 {valid}/{count} 有效 | 原始响应: {raw[:200]}...")
+        return [json.dumps(item, ensure_ascii=False) if item else None for item in items]
+
+    @staticmethod
+    def _split_batch(content: str, count: int) -> List[Optional[dict]]:
+        """把批量响应中的 JSON 数组按 index（缺失时按位置）拆回每张图片，校验不通过的为 None"""
+        results: List[Optional[dict]] = [None] * count
+        match = re.search(r"\[[\s\S]*\]", content or "")
+        try:
+            items = json.loads(match.group()) if match else None
+        except json.JSONDecodeError:
+            items = None
+        if not isinstance(items, list):
+            return results
+
+        for position, item in enumerate(items):
+            if not isinstance(item, dict):
+                continue
+            index = item.pop("index", None)
+            if isinstance(index, int) and 1 <= index <= count:
+                slot = index - 1
+            elif len(items) == count:
+                slot = position
+            else:
+                continue
+            has_fields = any(item.get(field) not in (None, "") for field in ("invoice_no", "total_amount", "amount"))
+            if results[slot] is None and has_fields:
+                results[slot] = item
+        return results
+
+    def _record_usage(self, call_id: str, response, images: int = 1):
+        """记录 token 使用量，批量请求按图片数均摊到每张图片"""
+        usage = getattr(response, 'usage', None)
+        if not usage:
+            return
+        prompt_tokens = getattr(usage, 'prompt_tokens', 0) or 0
+        completion_tokens = getattr(usage, 'completion_tokens', 0) or 0
+        total_tokens = getattr(usage, 'total_tokens', 0) or 0
+        with self._stats_lock:
+            self.total_tokens += total_tokens
+        for _ in range(images):
+            GLM_TOKENS.labels("prompt").observe(prompt_tokens / images)
+            GLM_TOKENS.labels("completion").observe(completion_tokens / images)
+        glm_logger.info(
+            f"[{call_id}] Token 使用: prompt={prompt_tokens}, completion={completion_tokens}, total={total_tokens}"
+            + (f" | 每张 {total_tokens / images:.0f}" if images > 1 else "")
+        )
+
+    def _call_api(self, call_id: str, content: list):
+        """
+        带限流、重试和熔断的 GLM 调用
+        429/超时/5xx 按带抖动的指数退避重试；超时/5xx 计入熔断器，
+        熔断打开或重试耗尽时抛出 GLMUnavailableError
+        """
+        for attempt in range(GLM_MAX_RETRIES + 1):
+            try:
+                self.breaker.before_call()
+            except CircuitBreakerOpen as e:
+                GLM_ERRORS.labels("breaker_open").inc()
+                raise GLMUnavailableError(str(e), e.retry_after, rejected=True)
+
+            self.rate_limiter.acquire()
+            request_start = time.perf_counter()
+            try:
+                response = self.client.chat.completions.create(
+                    model=GLM_MODEL,
+                    messages=[{"role": "user", "content": content}],
+                )
+            except Exception as e:
+                GLM_REQUEST_SECONDS.labels("error").observe(time.perf_counter() - request_start)
+                GLM_ERRORS.labels(_error_type(e)).inc()
+                retryable, server_error, retry_after = _classify_error(e)
+                if server_error:
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.release()
+                if not retryable:
+                    raise
+                if retry_after is None and not server_error:
+                    retry_after = GLM_RETRY_BASE_DELAY
+                if not server_error:
+                    # 配额不足：所有线程一起放慢
+                    self.rate_limiter.penalize(retry_after)
+                if attempt == GLM_MAX_RETRIES:
+                    raise GLMUnavailableError(
+                        f"重试 {GLM_MAX_RETRIES} 次后仍失败: {e}", self.breaker.retry_after()
+                    ) from e
+
+                delay = backoff_delay(attempt, GLM_RETRY_BASE_DELAY, GLM_RETRY_MAX_DELAY, retry_after)
+                with self._stats_lock:
+                    self.retry_count += 1
+                GLM_RETRIES.inc()
+                glm_logger.warning(
+                    f"[{call_id}] API 调用失败，{delay:.1f}s 后第 {attempt + 1} 次重试 | 错误: {str(e)}"
+                )
+                time.sleep(delay)
+            else:
+                GLM_REQUEST_SECONDS.labels("success").observe(time.perf_counter() - request_start)
+                self.breaker.record_success()
+                return response
+
+    def retry_after(self) -> float:
+        """熔断中时返回距离恢复的秒数，供任务队列暂停领取任务"""
+        return self.breaker.retry_after()
+
+    async def recognize_invoice_async(
+        self, image_path: str, content_hash: Optional[str] = None
+    ) -> Optional[dict]:
+        """在线程池中执行识别，避免阻塞事件循环"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, self.recognize_invoice, image_path, content_hash
+        )
+
+    async def recognize_image_async(
+        self, image_bytes: bytes, source: str, mime_type: str = "image/png"
+    ) -> Optional[dict]:
+        """在线程池中识别内存中的图片"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, self.recognize_image, image_bytes, source, mime_type
+        )
 
     def _parse_response(self, content: str) -> Optional[dict]:
         """解析 GLM 返回的内容"""
@@ -183,24 +655,27 @@ class GLMService:
             glm_logger.error(f"JSON 解析错误: {e}")
             return None
 
-    def _log_raw_response(self, call_id: str, image_path: str, raw_content: str, parsed_result: dict, elapsed: float):
-        """记录原始响应到详细日志文件"""
-        log_file = os.path.join(LOG_DIR, "glm_details.jsonl")
+    def _log_raw_response(self, call_id: str, image_path: str, raw_content: Optional[str], parsed_result: dict, elapsed: float):
+        """
+        记录原始响应到详细日志文件
+        raw_content 为 None 表示本次未被采样，只记录调用概要
+        """
         log_entry = {
             "call_id": call_id,
             "timestamp": datetime.now().isoformat(),
             "image_path": image_path,
             "elapsed_seconds": round(elapsed, 3),
             "success": parsed_result is not None,
-            "raw_response": raw_content,
-            "parsed_result": parsed_result
         }
-        with open(log_file, "a", encoding="utf-8") as f:
-            f.write(json.dumps(log_entry, ensure_ascii=False) + "\n")
+        if raw_content is not None:
+            log_entry["raw_response"] = raw_content
+            log_entry["parsed_result"] = parsed_result
+        else:
+            log_entry["invoice_no"] = parsed_result.get("invoice_no")
+        details_writer.write(log_entry)
 
     def _log_error(self, call_id: str, image_path: str, error: str, elapsed: float):
         """记录错误到详细日志文件"""
-        log_file = os.path.join(LOG_DIR, "glm_details.jsonl")
         log_entry = {
             "call_id": call_id,
             "timestamp": datetime.now().isoformat(),
@@ -209,8 +684,7 @@ class GLMService:
             "success": False,
             "error": error
         }
-        with open(log_file, "a", encoding="utf-8") as f:
-            f.write(json.dumps(log_entry, ensure_ascii=False) + "\n")
+        details_writer.write(log_entry)
 
     def _mock_response(self) -> dict:
         """当没有 API Key 时返回模拟数据"""
@@ -232,7 +706,22 @@ class GLMService:
         return {
             "total_calls": self.call_count,
             "total_tokens": self.total_tokens,
-            "api_key_configured": self.client is not None
+            "api_key_configured": bool(GLM_API_KEY),
+            "backend": GLM_BACKEND,
+            "retries": self.retry_count,
+            "qr": {"mode": INVOICE_QR_MODE, "decoded": self.qr_decoded},
+            "batching": (
+                {**self.batcher.get_stats(), "fallbacks": self.batch_fallbacks}
+                if self.batcher
+                else None
+            ),
+            "rate_limiter": self.rate_limiter.get_stats(),
+            "circuit_breaker": self.breaker.get_stats(),
+            "cache": self.cache.get_stats() if self.cache else None,
+            "logging": {
+                "calls": file_handler.writer.get_stats(),
+                "details": details_writer.get_stats(),
+            },
         }
 
 
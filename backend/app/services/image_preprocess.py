@@ -0,0 +1,40 @@
+from io import BytesIO
+from typing import Tuple
+
+from PIL import Image, ImageOps
+
+from ..config import (
+    IMAGE_MAX_EDGE,
+    IMAGE_GRAYSCALE,
+    IMAGE_JPEG_QUALITY,
+)
+
+
+def preprocess_image(image_bytes: bytes) -> Tuple[bytes, str]:
+    """
+    识别前的图片预处理，返回 (图片字节, MIME 类型)
+    按 EXIF 方向摆正 → 缩放到最长边不超过 IMAGE_MAX_EDGE → 可选灰度 →
+    重新编码为 JPEG（不携带 EXIF）。CPU 密集，应在线程池中调用。
+    """
+    with Image.open(BytesIO(image_bytes)) as img:
+        img = ImageOps.exif_transpose(img)
+
+        # 只缩小不放大
+        if max(img.size) > IMAGE_MAX_EDGE:
+            img.thumbnail((IMAGE_MAX_EDGE, IMAGE_MAX_EDGE), Image.Resampling.LANCZOS)
+
+        if IMAGE_GRAYSCALE:
+            img = img.convert("L")
+        elif img.mode in ("RGBA", "LA", "P"):
+            # 透明背景铺白，避免 JPEG 转换后变黑
+            img = img.convert("RGBA")
+            background = Image.new("RGB", img.size, (255, 255, 255))
+            background.paste(img, mask=img.getchannel("A"))
+            img = background
+        elif img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+
+        output = BytesIO()
+        img.save(output, format="JPEG", quality=IMAGE_JPEG_QUALITY, optimize=True)
+
+    return output.getvalue(), "image/jpeg"
@@ -1,9 +1,21 @@
 from datetime import date, datetime, timedelta
-from typing import Optional, Tuple
-
-from ..config import CONFIDENCE_THRESHOLD, AMOUNT_ANOMALY_THRESHOLD, DATE_ANOMALY_DAYS
-
-# 费用科目自动映射规则
+from typing import Callable, Iterable, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from ..config import (
+    CONFIDENCE_THRESHOLD,
+    AMOUNT_ANOMALY_THRESHOLD,
+    DATE_ANOMALY_DAYS,
+    CATEGORY_RULES_FILE,
+    CATEGORY_RULES_RELOAD_SECONDS,
+)
+from ..models.invoice import Invoice
+from .duplicate_detector import DuplicateKey, duplicate_key
+from .expense_classifier import ExpenseClassifier
+from .summary_rollup import apply_invoice
+
+# 费用科目自动映射规则（内置默认值，可由 CATEGORY_RULES_FILE 覆盖）
 CATEGORY_RULES = {
     "交通费": ["滴滴", "出租", "地铁", "公交", "高铁", "火车", "机票", "航空", "铁路", "出行"],
     "差旅费-住宿": ["酒店", "宾馆", "民宿", "住宿", "旅馆", "客房"],
@@ -27,17 +39,70 @@ ACCOUNT_CODE_MAP = {
 }
 
 
+# raw_response 中的标记：科目由人工修改（PATCH），重新分类时跳过
+MANUAL_CATEGORY_KEY = "manual_category"
+
+
+expense_classifier = ExpenseClassifier(
+    CATEGORY_RULES, CATEGORY_RULES_FILE, CATEGORY_RULES_RELOAD_SECONDS
+)
+
+
 def classify_expense(seller_name: str, items: list) -> str:
     """根据销方名称和商品名称自动分类费用科目"""
-    text = (seller_name or "") + " ".join(items or [])
-    text = text.lower()
+    return expense_classifier.classify(seller_name, items)
+
+
+def classify_many(rows: Iterable[Tuple[str, list]]) -> List[str]:
+    """批量分类费用科目 [(销方名称, 商品列表), ...]"""
+    return expense_classifier.classify_many(rows)
 
-    for category, keywords in CATEGORY_RULES.items():
-        for keyword in keywords:
-            if keyword.lower() in text:
-                return category
 
-    return "其他"
+def reclassify_invoices(db: Session, batch_size: int = 1000, dry_run: bool = False) -> Tuple[int, int]:
+    """
+    用当前规则重新分类自动归类的发票（GLM 直接给出科目的、人工修改过科目的不动）
+    按主键分批读取，每批一次 classify_many，变更的发票同步更新汇总表。
+    返回: (检查数量, 变更数量)
+    """
+    checked = changed = 0
+    last_id = ""
+    while True:
+        batch = (
+            db.query(Invoice)
+            .filter(Invoice.id > last_id, Invoice.raw_response.isnot(None))
+            .order_by(Invoice.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not batch:
+            break
+        last_id = batch[-1].id
+
+        auto = [
+            inv
+            for inv in batch
+            if not any((inv.raw_response or {}).get(key) for key in ("expense_category", MANUAL_CATEGORY_KEY))
+        ]
+        categories = classify_many(
+            (inv.seller_name or "", (inv.raw_response or {}).get("items") or []) for inv in auto
+        )
+        for invoice, category in zip(auto, categories):
+            if invoice.expense_category == category:
+                continue
+            changed += 1
+            if not dry_run:
+                apply_invoice(db, invoice, -1)
+                invoice.expense_category = category
+                apply_invoice(db, invoice)
+        checked += len(auto)
+
+        if dry_run:
+            db.rollback()
+        else:
+            db.commit()
+        db.expunge_all()
+
+    return checked, changed
 
 
 def detect_anomalies(
@@ -45,6 +110,8 @@ def detect_anomalies(
     invoice_date: Optional[date],
     confidence: float,
     invoice_no: Optional[str] = None,
+    is_duplicate: bool = False,
+    qr_only: bool = False,
 ) -> Tuple[str, str]:
     """
     检测发票异常
@@ -52,6 +119,14 @@ def detect_anomalies(
     """
     anomalies = []
 
+    # 0. 重复报销（发票号+销方税号+价税合计 与已有发票相同）
+    if is_duplicate:
+        anomalies.append(f"疑似重复报销(发票号{invoice_no}已存在)")
+
+    # 0.1 仅凭二维码入库：二维码不含销方、税额，价税合计未知
+    if qr_only:
+        anomalies.append("仅识别二维码，销方/税额/价税合计需人工复核")
+
     # 1. 金额异常
     if amount and amount > AMOUNT_ANOMALY_THRESHOLD:
         anomalies.append(f"金额>{AMOUNT_ANOMALY_THRESHOLD}元需审批")
@@ -69,7 +144,7 @@ def detect_anomalies(
             anomalies.append("发票日期在未来")
 
     if anomalies:
-        flag = "warning" if len(anomalies) == 1 else "error"
+        flag = "warning" if len(anomalies) == 1 and not is_duplicate else "error"
         return flag, "; ".join(anomalies)
 
     return "normal", ""
@@ -92,3 +167,89 @@ def parse_date(date_str: str) -> Optional[date]:
         except ValueError:
             continue
     return None
+
+
+def build_invoice(
+    result: Optional[dict],
+    file_path: str,
+    reimbursement_person: Optional[str],
+    page_no: Optional[int] = None,
+    is_duplicate: Optional[Callable[[Optional[DuplicateKey]], bool]] = None,
+) -> Invoice:
+    """
+    根据识别结果构建发票记录
+    is_duplicate 为查重函数（见 DuplicateDetector.batch_checker），不传则不查重
+    """
+    if not result:
+        # Create record with error
+        return Invoice(
+            image_path=file_path,
+            page_no=page_no,
+            reimbursement_person=reimbursement_person,
+            anomaly_flag="error",
+            anomaly_reason="识别失败",
+            confidence=0,
+        )
+
+    # Parse date
+    invoice_date = parse_date(result.get("invoice_date"))
+
+    # Get expense category from GLM or auto-classify
+    expense_category = result.get("expense_category")
+    if not expense_category:
+        expense_category = classify_expense(
+            result.get("seller_name", ""), result.get("items", [])
+        )
+
+    # Get reimbursement person from GLM (优先级: 经手人 > 领款人 > 传入参数)
+    handler = result.get("handler")  # 经手人
+    payee = result.get("payee")  # 领款人
+    person = handler or payee or result.get("reimbursement_person") or reimbursement_person
+
+    # Get amounts
+    amount = float(result.get("amount") or 0)
+    # 仅凭二维码的结果（INVOICE_QR_MODE=skip）没有税额，不能用不含税金额充当价税合计
+    qr_only = result.get("source") == "qr"
+    if qr_only:
+        tax_amount = total_amount = None
+    else:
+        tax_amount = float(result.get("tax_amount") or 0)
+        total_amount = float(result.get("total_amount") or amount + tax_amount)
+    confidence = float(result.get("confidence") or 0.5)
+
+    # Detect anomalies
+    # GLM 有时把发票号/税号识别为数字
+    invoice_no = str(result.get("invoice_no") or "").strip() or None
+    seller_tax_no = str(result.get("seller_tax_no") or "").strip() or None
+    duplicate = bool(
+        is_duplicate
+        and is_duplicate(duplicate_key(invoice_no, seller_tax_no, total_amount))
+    )
+    anomaly_flag, anomaly_reason = detect_anomalies(
+        amount if total_amount is None else total_amount,
+        invoice_date,
+        confidence,
+        invoice_no,
+        duplicate,
+        qr_only,
+    )
+
+    # Create invoice record
+    return Invoice(
+        invoice_no=invoice_no,
+        invoice_date=invoice_date,
+        invoice_type=result.get("invoice_type") or result.get("doc_type"),
+        seller_name=result.get("seller_name"),
+        seller_tax_no=seller_tax_no,
+        amount=amount,
+        tax_amount=tax_amount,
+        total_amount=total_amount,
+        expense_category=expense_category,
+        reimbursement_person=person,
+        confidence=confidence,
+        anomaly_flag=anomaly_flag,
+        anomaly_reason=anomaly_reason,
+        image_path=file_path,
+        page_no=page_no,
+        raw_response=result,
+    )
@@ -0,0 +1,104 @@
+from datetime import datetime
+from io import BytesIO
+from typing import Optional
+
+import zxingcpp
+from PIL import Image
+
+# 二维码中的发票种类代码
+INVOICE_TYPE_CODES = {
+    "01": "增值税专票",
+    "04": "增值税普票",
+    "08": "增值税专票",  # 增值税电子专用发票
+    "10": "电子普票",
+    "11": "增值税普票",  # 卷票
+    "14": "电子普票",  # 通行费
+    "31": "增值税专票",  # 数电票（增值税专用发票）
+    "32": "电子普票",  # 数电票（普通发票）
+}
+
+# 解码前把长边缩到该尺寸以内：二维码模块足够大，解码耗时与像素数成正比
+QR_DECODE_MAX_EDGE = 2000
+
+
+def parse_invoice_qr(text: str) -> Optional[dict]:
+    """
+    解析增值税发票二维码内容，格式不符时返回 None
+    01,发票种类代码,发票代码,发票号码,金额(不含税),开票日期(YYYYMMDD),校验码,随机码
+    数电票没有发票代码和校验码，发票号码为 20 位
+    """
+    parts = [part.strip() for part in text.strip().split(",")]
+    if len(parts) < 6 or parts[0] != "01":
+        return None
+    type_code, invoice_code, invoice_no, amount, date_str = parts[1:6]
+    check_code = parts[6] if len(parts) > 6 else ""
+
+    if not invoice_no.isdigit() or len(invoice_no) not in (8, 20):
+        return None
+    if invoice_code and not (invoice_code.isdigit() and len(invoice_code) in (10, 12)):
+        return None
+    try:
+        amount = round(float(amount), 2)
+        invoice_date = datetime.strptime(date_str, "%Y%m%d").date()
+    except ValueError:
+        return None
+
+    return {
+        "type_code": type_code,
+        "invoice_type": INVOICE_TYPE_CODES.get(type_code),
+        "invoice_code": invoice_code or None,
+        "invoice_no": invoice_no,
+        "amount": amount,
+        "invoice_date": invoice_date.isoformat(),
+        "check_code": check_code or None,
+    }
+
+
+def decode_invoice_qr(image_bytes: bytes) -> Optional[dict]:
+    """在图片中查找发票二维码并解析，找不到或内容不是发票二维码时返回 None"""
+    with Image.open(BytesIO(image_bytes)) as src:
+        # JPEG 直接按缩小比例解码
+        src.draft("L", (QR_DECODE_MAX_EDGE, QR_DECODE_MAX_EDGE))
+        img = src.convert("L")
+    img.thumbnail((QR_DECODE_MAX_EDGE, QR_DECODE_MAX_EDGE))
+
+    for barcode in zxingcpp.read_barcodes(img, formats=zxingcpp.BarcodeFormat.QRCode):
+        parsed = parse_invoice_qr(barcode.text)
+        if parsed:
+            return parsed
+    return None
+
+
+def qr_result(qr: dict) -> dict:
+    """
+    仅凭二维码构建识别结果（INVOICE_QR_MODE=skip）
+    二维码不含销方、税额和商品明细，这些字段与价税合计均为空；
+    build_invoice 据 source="qr" 标记异常，交由人工复核补全
+    """
+    return {
+        "doc_type": "发票",
+        "invoice_no": qr["invoice_no"],
+        "invoice_date": qr["invoice_date"],
+        "invoice_type": qr["invoice_type"],
+        "seller_name": None,
+        "seller_tax_no": None,
+        "amount": qr["amount"],
+        "tax_amount": None,
+        "total_amount": None,
+        "items": [],
+        "confidence": 1.0,
+        "source": "qr",
+        "qr": qr,
+    }
+
+
+def merge_qr(result: dict, qr: dict) -> dict:
+    """用二维码中的字段覆盖模型识别结果（二维码内容是精确值），其余字段保留模型结果"""
+    merged = dict(result)
+    merged.setdefault("doc_type", "发票")
+    for field in ("invoice_no", "invoice_date", "amount"):
+        merged[field] = qr[field]
+    if qr["invoice_type"]:
+        merged["invoice_type"] = qr["invoice_type"]
+    merged["qr"] = qr
+    return merged
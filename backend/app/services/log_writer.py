@@ -0,0 +1,205 @@
+import atexit
+import glob
+import gzip
+import logging
+import os
+import queue
+import shutil
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict
+
+# 写日志自身的错误走独立 logger，不经过 BatchedLogWriter，避免失败时递归
+logger = logging.getLogger("log_writer")
+
+_STOP = object()
+
+
+class BatchedLogWriter:
+    """
+    后台批量写日志文件
+    write() 只把记录放入有界队列，不做任何文件 I/O；后台线程每 flush_interval 秒
+    （或攒满 batch_size 条）合并写入一次。队列满时丢弃新记录并计数，绝不阻塞调用方。
+    文件超过 max_bytes 或打开超过 rotate_seconds 秒后轮转为 <path>.<时间戳>[.gz]，
+    保留最近 backup_count 个。max_bytes / rotate_seconds 为 0 表示不按该条件轮转。
+    写入/轮转失败的记录计入 errors，后台线程继续运行。
+    """
+
+    def __init__(
+        self,
+        path: str,
+        serialize: Callable[[Any], str] = str,
+        flush_interval: float = 1.0,
+        batch_size: int = 500,
+        queue_size: int = 10000,
+        max_bytes: int = 0,
+        rotate_seconds: float = 0,
+        backup_count: int = 7,
+        compress: bool = False,
+    ):
+        self.path = path
+        self.serialize = serialize
+        self.flush_interval = flush_interval
+        self.batch_size = max(1, batch_size)
+        self.max_bytes = max_bytes
+        self.rotate_seconds = rotate_seconds
+        self.backup_count = backup_count
+        self.compress = compress
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._file = None
+        self._size = 0
+        self._opened_at = 0.0
+        self.written = 0
+        self.dropped = 0
+        self.errors = 0
+        self.batches = 0
+        self.rotations = 0
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._thread = threading.Thread(
+            target=self._run, name=f"log-writer-{os.path.basename(path)}", daemon=True
+        )
+        self._thread.start()
+        atexit.register(self.close)
+
+    def write(self, record: Any):
+        """入队一条记录（非阻塞）"""
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+
+    def close(self, timeout: float = 5.0):
+        """写完队列中剩余的记录并停止后台线程"""
+        if not self._thread.is_alive():
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            try:
+                first = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+
+            # 攒一批：最多 batch_size 条或等到 flush_interval
+            batch = []
+            deadline = time.monotonic() + self.flush_interval
+            item = first
+            while True:
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+
+            if batch:
+                self._write_batch(batch)
+
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def _write_batch(self, batch: list):
+        lines = []
+        for record in batch:
+            try:
+                lines.append(self.serialize(record) + "\n")
+            except Exception:
+                logger.exception(f"日志序列化失败 ({self.path})")
+                with self._lock:
+                    self.errors += 1
+        data = "".join(lines).encode("utf-8")
+
+        try:
+            if self._file and self._should_rotate(len(data)):
+                self._rotate()
+            if self._file is None:
+                self._open()
+            self._file.write(data)
+            self._file.flush()
+            self._size += len(data)
+        except Exception:
+            # 轮转、压缩或写入中的任何异常都不能让后台线程退出，本批记录计为失败
+            logger.exception(f"写日志失败 ({self.path})")
+            with self._lock:
+                self.errors += len(lines)
+            return
+
+        with self._lock:
+            self.written += len(lines)
+            self.batches += 1
+
+    def _open(self):
+        self._file = open(self.path, "ab")
+        self._size = self._file.tell()
+        self._opened_at = time.time()
+
+    def _should_rotate(self, incoming: int) -> bool:
+        if self.max_bytes and self._size and self._size + incoming > self.max_bytes:
+            return True
+        return bool(self.rotate_seconds) and time.time() - self._opened_at >= self.rotate_seconds
+
+    def _rotate(self):
+        self._file.close()
+        self._file = None
+
+        rotated = f"{self.path}.{datetime.now():%Y%m%d-%H%M%S}"
+        suffix = 1
+        while os.path.exists(rotated) or os.path.exists(rotated + ".gz"):
+            rotated = f"{self.path}.{datetime.now():%Y%m%d-%H%M%S}.{suffix}"
+            suffix += 1
+        os.replace(self.path, rotated)
+
+        if self.compress:
+            with open(rotated, "rb") as src, gzip.open(rotated + ".gz", "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            os.remove(rotated)
+
+        # 按修改时间清理多余的历史文件
+        backups = sorted(glob.glob(glob.escape(self.path) + ".*"), key=os.path.getmtime)
+        for old in backups[: max(0, len(backups) - self.backup_count)]:
+            os.remove(old)
+
+        with self._lock:
+            self.rotations += 1
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "queued": self._queue.qsize(),
+                "written": self.written,
+                "dropped": self.dropped,
+                "errors": self.errors,
+                "batches": self.batches,
+                "rotations": self.rotations,
+            }
+
+
+class BatchedFileHandler(logging.Handler):
+    """把格式化后的日志行交给 BatchedLogWriter，emit 不做文件 I/O"""
+
+    def __init__(self, writer: BatchedLogWriter, level=logging.NOTSET):
+        super().__init__(level)
+        self.writer = writer
+
+    def emit(self, record: logging.LogRecord):
+        try:
+            self.writer.write(self.format(record))
+        except Exception:
+            self.handleError(record)
+
+    def close(self):
+        self.writer.close()
+        super().close()
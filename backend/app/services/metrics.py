@@ -0,0 +1,85 @@
+import os
+import time
+from contextlib import contextmanager
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    REGISTRY,
+    generate_latest,
+)
+from prometheus_client import multiprocess
+
+# 设置 PROMETHEUS_MULTIPROC_DIR 时（多 worker 部署），各进程的指标写入该目录，/metrics 汇总输出
+MULTIPROCESS = bool(os.getenv("PROMETHEUS_MULTIPROC_DIR"))
+
+GLM_REQUEST_SECONDS = Histogram(
+    "glm_request_seconds",
+    "单次 GLM API 请求耗时（不含限流等待与重试退避）",
+    ["outcome"],
+    buckets=(0.5, 1, 2, 3, 5, 8, 13, 20, 30, 60, 120),
+)
+GLM_RECOGNITION_SECONDS = Histogram(
+    "glm_recognition_seconds",
+    "单张图片识别总耗时（含读取、预处理、缓存查询、限流与重试）",
+    ["outcome"],
+    buckets=(0.005, 0.05, 0.25, 1, 2, 5, 10, 20, 30, 60, 120),
+)
+GLM_IMAGE_BYTES = Histogram(
+    "glm_image_bytes",
+    "识别图片大小（original 为原图，sent 为预处理后实际发送的大小）",
+    ["stage"],
+    buckets=(32e3, 64e3, 128e3, 256e3, 512e3, 1e6, 2e6, 4e6, 8e6, 16e6),
+)
+GLM_TOKENS = Histogram(
+    "glm_tokens",
+    "每张图片的 token 数（批量请求按图片数均摊）",
+    ["kind"],
+    buckets=(100, 250, 500, 1000, 1500, 2000, 3000, 5000, 8000, 13000),
+)
+GLM_BATCH_IMAGES = Histogram(
+    "glm_batch_images",
+    "每次批量请求包含的图片数",
+    buckets=(1, 2, 3, 4, 6, 8, 12, 16),
+)
+GLM_ERRORS = Counter("glm_errors", "GLM 调用错误数", ["type"])
+GLM_RETRIES = Counter("glm_retries", "GLM 调用重试次数")
+
+UPLOAD_BATCH_FILES = Histogram(
+    "upload_batch_files",
+    "每次上传的文件数",
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200),
+)
+UPLOAD_BYTES = Histogram(
+    "upload_file_bytes",
+    "上传文件大小",
+    buckets=(64e3, 256e3, 512e3, 1e6, 2e6, 5e6, 10e6),
+)
+
+DB_QUERY_SECONDS = Histogram(
+    "db_query_seconds",
+    "接口数据库查询耗时",
+    ["query"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+
+
+@contextmanager
+def time_query(name: str):
+    """记录一段数据库查询的耗时（同步与 async 代码均可使用）"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        DB_QUERY_SECONDS.labels(name).observe(time.perf_counter() - start)
+
+
+def render_metrics():
+    """返回 (Prometheus 文本格式内容, Content-Type)"""
+    registry = REGISTRY
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry), CONTENT_TYPE_LATEST
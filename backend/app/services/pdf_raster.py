@@ -0,0 +1,57 @@
+import threading
+from io import BytesIO
+from typing import Iterator, Tuple
+
+import pypdfium2 as pdfium
+from PIL import Image
+
+from ..config import PDF_RENDER_DPI, IMAGE_MAX_EDGE
+
+# PDFium 不是线程安全的，所有调用需串行
+_pdfium_lock = threading.Lock()
+
+
+def iter_pdf_pages(pdf_path: str, dpi: int = PDF_RENDER_DPI) -> Iterator[Tuple[int, bytes]]:
+    """
+    逐页渲染 PDF，生成 (页码, PNG 字节)
+    每次只渲染一页并立即释放位图，长 PDF 不会整体驻留内存。
+    渲染尺寸同时受 IMAGE_MAX_EDGE 限制，避免超大页面生成巨型位图。
+    """
+    with _pdfium_lock:
+        pdf = pdfium.PdfDocument(pdf_path)
+        page_count = len(pdf)
+
+    try:
+        for index in range(page_count):
+            with _pdfium_lock:
+                page = pdf[index]
+                width, height = page.get_size()  # 单位: 点 (1/72 英寸)
+                scale = min(dpi / 72, IMAGE_MAX_EDGE / max(width, height))
+                bitmap = page.render(scale=scale)
+                image = bitmap.to_pil()
+                bitmap.close()
+                page.close()
+
+            output = BytesIO()
+            image.save(output, format="PNG")
+            image.close()
+            yield index + 1, output.getvalue()
+    finally:
+        with _pdfium_lock:
+            pdf.close()
+
+
+def render_pdf_page(pdf_path: str, page_no: int = 1, max_edge: int = IMAGE_MAX_EDGE) -> Image.Image:
+    """渲染 PDF 的单页（页码从 1 开始），最长边缩放到 max_edge，用于生成缩略图"""
+    with _pdfium_lock:
+        pdf = pdfium.PdfDocument(pdf_path)
+        try:
+            page = pdf[page_no - 1]
+            width, height = page.get_size()
+            bitmap = page.render(scale=max_edge / max(width, height))
+            image = bitmap.to_pil()
+            bitmap.close()
+            page.close()
+        finally:
+            pdf.close()
+    return image
@@ -0,0 +1,191 @@
+import copy
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+# 内存命中时的 accessed_at 更新攒够这么多条再写盘
+TOUCH_BATCH_SIZE = 100
+
+
+class RecognitionCache:
+    """
+    识别结果缓存（按图片内容寻址）
+    两级结构：内存 LRU → SQLite 文件，键为 "版本:图片SHA-256"。
+    版本由模型名和提示词计算，提示词变化后旧条目自动失效。
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        version: str,
+        memory_entries: int = 1024,
+        max_entries: int = 100000,
+        ttl_seconds: int = 30 * 24 * 3600,
+    ):
+        self.version = version
+        self.memory_entries = memory_entries
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+
+        self._memory: OrderedDict = OrderedDict()  # key -> (created_at, result)
+        self._touched: Dict[str, float] = {}  # 内存命中、尚未写盘的 key -> accessed_at
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS recognition_cache (
+                key TEXT PRIMARY KEY,
+                version TEXT NOT NULL,
+                result TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS ix_recognition_cache_accessed_at "
+            "ON recognition_cache (accessed_at)"
+        )
+        # 提示词/模型变更后的旧版本条目直接清理
+        self._conn.execute(
+            "DELETE FROM recognition_cache WHERE version != ?", (self.version,)
+        )
+        self._conn.commit()
+        self._disk_count = self._conn.execute(
+            "SELECT COUNT(*) FROM recognition_cache"
+        ).fetchone()[0]
+
+    def _key(self, content_hash: str) -> str:
+        return f"{self.version}:{content_hash}"
+
+    def get(self, content_hash: str) -> Optional[dict]:
+        """查询缓存，未命中或已过期返回 None"""
+        key = self._key(content_hash)
+        now = time.time()
+
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                created_at, result = entry
+                if now - created_at <= self.ttl_seconds:
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    # 磁盘淘汰按 accessed_at 进行，内存命中也要记录访问时间（批量写入）
+                    self._touched[key] = now
+                    if len(self._touched) >= TOUCH_BATCH_SIZE:
+                        self._flush_touches()
+                        self._conn.commit()
+                    return copy.deepcopy(result)
+                del self._memory[key]
+
+            row = self._conn.execute(
+                "SELECT result, created_at FROM recognition_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            result_json, created_at = row
+            if now - created_at > self.ttl_seconds:
+                self._conn.execute("DELETE FROM recognition_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                self._disk_count -= 1
+                self.evictions += 1
+                self.misses += 1
+                return None
+
+            self._conn.execute(
+                "UPDATE recognition_cache SET accessed_at = ? WHERE key = ?", (now, key)
+            )
+            self._conn.commit()
+            result = json.loads(result_json)
+            self._remember(key, created_at, result)
+            self.disk_hits += 1
+            return copy.deepcopy(result)
+
+    def put(self, content_hash: str, result: dict):
+        """写入缓存"""
+        key = self._key(content_hash)
+        now = time.time()
+
+        with self._lock:
+            self._remember(key, now, copy.deepcopy(result))
+            self._touched.pop(key, None)
+            # INSERT OR REPLACE 覆盖已有条目时 rowcount 也是 1，只有新键才计数
+            exists = self._conn.execute(
+                "SELECT 1 FROM recognition_cache WHERE key = ?", (key,)
+            ).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO recognition_cache "
+                "(key, version, result, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, self.version, json.dumps(result, ensure_ascii=False), now, now),
+            )
+            if exists is None:
+                self._disk_count += 1
+            self._conn.commit()
+
+            if self._disk_count > self.max_entries:
+                self._evict_disk(now)
+
+    def _remember(self, key: str, created_at: float, result: dict):
+        self._memory[key] = (created_at, result)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _flush_touches(self):
+        """把内存命中的访问时间写入磁盘（调用方持有锁并负责提交）"""
+        if not self._touched:
+            return
+        self._conn.executemany(
+            "UPDATE recognition_cache SET accessed_at = ? WHERE key = ?",
+            [(accessed_at, key) for key, accessed_at in self._touched.items()],
+        )
+        self._touched.clear()
+
+    def _evict_disk(self, now: float):
+        """删除过期条目；仍超限时按最近访问时间淘汰最旧的 10%"""
+        self._flush_touches()
+        expired = self._conn.execute(
+            "DELETE FROM recognition_cache WHERE created_at < ?", (now - self.ttl_seconds,)
+        ).rowcount
+        self._disk_count = self._conn.execute(
+            "SELECT COUNT(*) FROM recognition_cache"
+        ).fetchone()[0]
+
+        overflow = 0
+        if self._disk_count > self.max_entries:
+            overflow = self._disk_count - self.max_entries + self.max_entries // 10
+            self._conn.execute(
+                "DELETE FROM recognition_cache WHERE key IN ("
+                "SELECT key FROM recognition_cache ORDER BY accessed_at LIMIT ?)",
+                (overflow,),
+            )
+            self._disk_count -= overflow
+        self._conn.commit()
+        self.evictions += expired + overflow
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            lookups = hits + self.misses
+            return {
+                "version": self.version,
+                "memory_entries": len(self._memory),
+                "disk_entries": self._disk_count,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            }
@@ -0,0 +1,75 @@
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Tuple
+
+
+class RequestBatcher:
+    """
+    把多个线程并发提交的请求攒成一批统一处理
+    攒满 max_size 个时由提交最后一个请求的线程执行 handler，
+    否则在第一个请求等待 max_wait 秒后由计时器线程执行。
+    handler 接收请求列表，返回等长的结果列表；抛出异常时该批所有请求都收到此异常。
+    """
+
+    def __init__(self, handler: Callable[[List[Any]], List[Any]], max_size: int, max_wait: float):
+        self.handler = handler
+        self.max_size = max_size
+        self.max_wait = max_wait
+        self._lock = threading.Lock()
+        self._pending: List[Tuple[Any, Future]] = []
+        self._generation = 0  # 每取走一批 +1，过期的计时器据此忽略
+        self.batches = 0
+        self.items = 0
+
+    def submit(self, item: Any) -> Future:
+        """提交一个请求，返回其结果的 Future"""
+        future: Future = Future()
+        with self._lock:
+            self._pending.append((item, future))
+            if len(self._pending) >= self.max_size:
+                batch = self._take()
+            else:
+                batch = None
+                if len(self._pending) == 1:
+                    timer = threading.Timer(self.max_wait, self._flush, args=(self._generation,))
+                    timer.daemon = True
+                    timer.start()
+        if batch:
+            self._run(batch)
+        return future
+
+    def _take(self) -> List[Tuple[Any, Future]]:
+        """取走当前批次（调用方持有锁）"""
+        batch, self._pending = self._pending, []
+        self._generation += 1
+        self.batches += 1
+        self.items += len(batch)
+        return batch
+
+    def _flush(self, generation: int):
+        with self._lock:
+            if generation != self._generation or not self._pending:
+                return
+            batch = self._take()
+        self._run(batch)
+
+    def _run(self, batch: List[Tuple[Any, Future]]):
+        try:
+            results = self.handler([item for item, _ in batch])
+            if len(results) != len(batch):
+                raise ValueError(f"批量处理返回 {len(results)} 个结果，应为 {len(batch)} 个")
+        except BaseException as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
+
+    def get_stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "max_size": self.max_size,
+                "batches": self.batches,
+                "images": self.items,
+                "avg_batch_size": round(self.items / self.batches, 2) if self.batches else 0,
+            }
@@ -0,0 +1,165 @@
+import random
+import threading
+import time
+from typing import Dict, Optional
+
+
+class TokenBucket:
+    """
+    令牌桶限流器（线程安全）
+    按 rate_per_minute 匀速补充令牌，最多积攒 burst 个；acquire 在令牌不足时阻塞等待。
+    rate_per_minute <= 0 表示不限流。
+    """
+
+    def __init__(self, rate_per_minute: float, burst: int):
+        self.rate = rate_per_minute / 60.0
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self.acquired = 0
+        self.throttled = 0
+        self.wait_seconds = 0.0
+
+    def _refill(self, now: float):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self):
+        """取一个令牌，必要时等待"""
+        if self.rate <= 0:
+            return
+
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    self.acquired += 1
+                    if waited:
+                        self.throttled += 1
+                        self.wait_seconds += waited
+                    return
+                delay = (1 - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    def penalize(self, seconds: float):
+        """收到 429 时清空令牌，推迟后续请求"""
+        if self.rate <= 0:
+            return
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens = min(self._tokens, 0.0) - seconds * self.rate
+
+    def get_stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "rate_per_minute": round(self.rate * 60, 2),
+                "burst": self.burst,
+                "acquired": self.acquired,
+                "throttled": self.throttled,
+                "wait_seconds": round(self.wait_seconds, 2),
+            }
+
+
+class CircuitBreakerOpen(Exception):
+    """熔断器打开，调用被快速拒绝"""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"GLM 服务暂不可用，{retry_after:.0f} 秒后重试")
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    熔断器
+    连续失败 failure_threshold 次后打开，reset_timeout 秒内的调用直接拒绝；
+    到期后进入半开状态，只放行一个探测请求，成功则关闭，失败则重新打开；
+    探测进行中其余调用仍被拒绝，retry_after() 返回 probe_interval，调用方据此等待。
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int, reset_timeout: float, probe_interval: float = 1.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.probe_interval = min(probe_interval, reset_timeout)
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.rejected = 0
+
+    def retry_after(self) -> float:
+        """距离允许下一次调用的秒数，0 表示可以调用"""
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                return self.probe_interval if self._probing else 0.0
+            if self.state != self.OPEN:
+                return 0.0
+            return max(0.0, self._opened_at + self.reset_timeout - time.monotonic())
+
+    def before_call(self):
+        """调用前检查，熔断时抛出 CircuitBreakerOpen"""
+        with self._lock:
+            if self.state == self.OPEN:
+                remaining = self._opened_at + self.reset_timeout - time.monotonic()
+                if remaining > 0:
+                    self.rejected += 1
+                    raise CircuitBreakerOpen(remaining)
+                self.state = self.HALF_OPEN
+                self._probing = False
+
+            if self.state == self.HALF_OPEN:
+                if self._probing:
+                    self.rejected += 1
+                    raise CircuitBreakerOpen(self.probe_interval)
+                self._probing = True
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self._failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.opened += 1
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+    def release(self):
+        """调用未产生成功/失败结论（如非重试类错误）时释放半开探测名额"""
+        with self._lock:
+            self._probing = False
+
+    def get_stats(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self._failures,
+                "opened": self.opened,
+                "rejected": self.rejected,
+            }
+
+
+def backoff_delay(attempt: int, base: float, cap: float, retry_after: Optional[float] = None) -> float:
+    """
+    第 attempt 次重试前的等待时间（full jitter 指数退避）
+    服务端给出 Retry-After 时以其为下限
+    """
+    delay = random.uniform(0, min(cap, base * 2 ** attempt))
+    if retry_after:
+        delay = max(delay, min(retry_after, cap))
+    return delay
@@ -0,0 +1,150 @@
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from ..models.invoice import Invoice
+from ..models.summary import InvoiceRollup
+
+RollupKey = Tuple[str, str, bool]
+
+
+def rollup_key(category, invoice_date, anomaly_flag) -> RollupKey:
+    """计算发票所属的汇总键 (科目, 月份, 是否异常)"""
+    month = invoice_date.strftime("%Y-%m") if invoice_date else ""
+    is_anomaly = anomaly_flag is not None and anomaly_flag != "normal"
+    return category or "其他", month, is_anomaly
+
+
+def apply_invoice(db: Session, invoice: Invoice, sign: int = 1):
+    """
+    把一张发票计入（sign=1）或移出（sign=-1）汇总表
+    与发票本身的修改在同一个 session 中执行，随调用方一起提交
+    """
+    _upsert(
+        db,
+        rollup_key(invoice.expense_category, invoice.invoice_date, invoice.anomaly_flag),
+        sign,
+        sign * (invoice.amount or 0),
+        sign * (invoice.tax_amount or 0),
+        sign * (invoice.total_amount or 0),
+    )
+
+
+def _upsert(db: Session, key: RollupKey, count: int, amount: float, tax: float, total: float):
+    """原子累加，避免并发请求读-改-写丢失更新"""
+    insert = pg_insert if db.bind.dialect.name == "postgresql" else sqlite_insert
+    category, month, is_anomaly = key
+    stmt = insert(InvoiceRollup).values(
+        category=category,
+        month=month,
+        is_anomaly=is_anomaly,
+        count=count,
+        amount=amount,
+        tax_amount=tax,
+        total_amount=total,
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["category", "month", "is_anomaly"],
+        set_={
+            "count": InvoiceRollup.count + stmt.excluded.count,
+            "amount": InvoiceRollup.amount + stmt.excluded.amount,
+            "tax_amount": InvoiceRollup.tax_amount + stmt.excluded.tax_amount,
+            "total_amount": InvoiceRollup.total_amount + stmt.excluded.total_amount,
+        },
+    )
+    db.execute(stmt)
+
+
+async def read_summary(db: AsyncSession) -> List[tuple]:
+    """读取按 (科目, 是否异常) 合并后的汇总行，行数与科目数同阶"""
+    result = await db.execute(
+        select(
+            InvoiceRollup.category,
+            InvoiceRollup.is_anomaly,
+            func.sum(InvoiceRollup.count),
+            func.sum(InvoiceRollup.amount),
+            func.sum(InvoiceRollup.tax_amount),
+        )
+        .group_by(InvoiceRollup.category, InvoiceRollup.is_anomaly)
+        .having(func.sum(InvoiceRollup.count) > 0)
+    )
+    return result.all()
+
+
+async def count_invoices(db: AsyncSession, category: str = None, anomaly_only: bool = False) -> int:
+    """从汇总表计算发票数量，代替对发票表的 COUNT(*)"""
+    query = select(func.coalesce(func.sum(InvoiceRollup.count), 0))
+    if category:
+        query = query.where(InvoiceRollup.category == category)
+    if anomaly_only:
+        query = query.where(InvoiceRollup.is_anomaly.is_(True))
+    return await db.scalar(query)
+
+
+def compute_rollup(db: Session) -> Dict[RollupKey, list]:
+    """从发票表全量计算汇总（流式读取，内存与分组数同阶）"""
+    totals: Dict[RollupKey, list] = defaultdict(lambda: [0, 0.0, 0.0, 0.0])
+    rows = db.query(
+        Invoice.expense_category,
+        Invoice.invoice_date,
+        Invoice.anomaly_flag,
+        Invoice.amount,
+        Invoice.tax_amount,
+        Invoice.total_amount,
+    ).yield_per(5000)
+    for category, invoice_date, anomaly_flag, amount, tax, total in rows:
+        entry = totals[rollup_key(category, invoice_date, anomaly_flag)]
+        entry[0] += 1
+        entry[1] += amount or 0
+        entry[2] += tax or 0
+        entry[3] += total or 0
+    return totals
+
+
+def rebuild_rollup(db: Session) -> int:
+    """清空并重建汇总表，返回分组数"""
+    totals = compute_rollup(db)
+    db.query(InvoiceRollup).delete()
+    db.add_all(
+        InvoiceRollup(
+            category=category,
+            month=month,
+            is_anomaly=is_anomaly,
+            count=count,
+            amount=amount,
+            tax_amount=tax,
+            total_amount=total,
+        )
+        for (category, month, is_anomaly), (count, amount, tax, total) in totals.items()
+    )
+    db.commit()
+    return len(totals)
+
+
+def check_rollup(db: Session) -> List[str]:
+    """对比汇总表与全量计算结果，返回不一致的分组描述"""
+    expected = compute_rollup(db)
+    actual = {
+        (r.category, r.month, r.is_anomaly): [r.count, r.amount, r.tax_amount, r.total_amount]
+        for r in db.query(InvoiceRollup).all()
+        if r.count
+    }
+
+    mismatches = []
+    for key in sorted(set(expected) | set(actual)):
+        want = expected.get(key, [0, 0.0, 0.0, 0.0])
+        got = actual.get(key, [0, 0.0, 0.0, 0.0])
+        if want[0] != got[0] or any(abs(w - g) > 0.005 for w, g in zip(want[1:], got[1:])):
+            mismatches.append(f"{key}: 期望 {want}, 实际 {got}")
+    return mismatches
+
+
+def ensure_rollup(db: Session):
+    """汇总表为空但已有发票时（首次升级）自动重建"""
+    if db.query(InvoiceRollup).first() is None and db.query(Invoice).first() is not None:
+        rebuild_rollup(db)
@@ -0,0 +1,280 @@
+import asyncio
+import logging
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from sqlalchemy import update
+
+from ..config import RECOGNITION_CONCURRENCY, PDF_PAGE_CONCURRENCY, GLM_JOB_MAX_ATTEMPTS
+from ..database import SessionLocal
+from ..models.task import RecognitionJob
+from .duplicate_detector import duplicate_detector, duplicate_key
+from .einvoice_parser import STRUCTURED_EXTENSIONS, EInvoiceParseError, parse_einvoice
+from .file_store import file_store
+from .glm_service import GLMUnavailableError, glm_service
+from .invoice_parser import build_invoice
+from .pdf_raster import iter_pdf_pages
+from .summary_rollup import apply_invoice
+
+logger = logging.getLogger("task_queue")
+
+# 没有新任务时的轮询间隔（秒），enqueue 会立即唤醒 worker
+POLL_INTERVAL = 2.0
+
+
+class TaskQueue:
+    """
+    基于数据库的识别任务队列
+    上传接口写入 recognition_jobs 表后立即返回，worker 池在后台消费。
+    发票记录与任务状态在同一事务中提交，重启后已完成的文件不会再次调用 GLM。
+    领取/完成任务的数据库操作是同步调用，一律放入线程执行，不阻塞事件循环。
+    """
+
+    def __init__(self, concurrency: int):
+        self.concurrency = concurrency
+        self._wakeup = asyncio.Event()
+        self._workers: List[asyncio.Task] = []
+
+    async def start(self):
+        """恢复中断的任务并启动 worker 池"""
+        recovered = await asyncio.to_thread(self._requeue_interrupted)
+        if recovered:
+            logger.info(f"恢复 {recovered} 个中断的识别任务")
+        self._workers = [
+            asyncio.create_task(self._worker(), name=f"recognition-worker-{n}")
+            for n in range(self.concurrency)
+        ]
+        self._wakeup.set()
+
+    async def stop(self):
+        """停止 worker 池，正在执行的任务下次启动时重新排队"""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def notify(self):
+        """有新任务入队时唤醒 worker"""
+        self._wakeup.set()
+
+    async def _worker(self):
+        while True:
+            try:
+                await self._run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # 如 SQLite "database is locked"：记录后继续，worker 不能退出
+                logger.exception("识别 worker 异常，稍后重试")
+                await asyncio.sleep(POLL_INTERVAL)
+
+    async def _run_once(self):
+        # GLM 熔断期间暂停领取，任务留在队列中等待恢复
+        paused = glm_service.retry_after()
+        if paused:
+            await asyncio.sleep(min(paused, POLL_INTERVAL))
+            return
+
+        job = await asyncio.to_thread(self._claim_next)
+        if job is None:
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            return
+
+        try:
+            await self._process(job)
+        except asyncio.CancelledError:
+            raise
+        except GLMUnavailableError as e:
+            await asyncio.to_thread(self._requeue, job, e)
+            # 被拒绝后稍等再领取，避免反复领取-拒绝形成空转
+            await asyncio.sleep(POLL_INTERVAL)
+        except Exception as e:
+            logger.exception(f"识别任务 {job.id} 处理异常")
+            try:
+                await asyncio.to_thread(self._finish, job, [(None, None)], str(e))
+            except Exception:
+                # 任务保持 running，下次启动时由 _requeue_interrupted 重新排队
+                logger.exception(f"识别任务 {job.id} 保存失败状态出错")
+
+    def _requeue_interrupted(self) -> int:
+        db = SessionLocal()
+        try:
+            result = db.execute(
+                update(RecognitionJob)
+                .where(RecognitionJob.status == "running")
+                .values(status="queued", started_at=None)
+            )
+            db.commit()
+            return result.rowcount
+        finally:
+            db.close()
+
+    def _requeue(self, job: RecognitionJob, error: GLMUnavailableError):
+        """GLM 不可用时把任务放回队列；多次仍不可用则记为失败"""
+        attempts = job.attempts - 1 if error.rejected else job.attempts
+        if attempts >= GLM_JOB_MAX_ATTEMPTS:
+            logger.warning(f"识别任务 {job.id} 已重试 {attempts} 次，放弃")
+            self._finish(job, [(None, None)], error=str(error))
+            return
+
+        db = SessionLocal()
+        try:
+            db.execute(
+                update(RecognitionJob)
+                .where(RecognitionJob.id == job.id)
+                .values(status="queued", started_at=None, attempts=attempts, error=str(error))
+            )
+            db.commit()
+        finally:
+            db.close()
+
+    def _claim_next(self) -> Optional[RecognitionJob]:
+        """取出最早的排队任务并标记为 running"""
+        db = SessionLocal()
+        try:
+            while True:
+                job = (
+                    db.query(RecognitionJob)
+                    .filter(RecognitionJob.status == "queued")
+                    .order_by(RecognitionJob.created_at)
+                    .first()
+                )
+                if job is None:
+                    return None
+
+                claimed = db.execute(
+                    update(RecognitionJob)
+                    .where(RecognitionJob.id == job.id, RecognitionJob.status == "queued")
+                    .values(
+                        status="running",
+                        started_at=datetime.utcnow(),
+                        attempts=RecognitionJob.attempts + 1,
+                    )
+                )
+                db.commit()
+                if claimed.rowcount:
+                    db.refresh(job)
+                    db.expunge(job)
+                    return job
+        finally:
+            db.close()
+
+    async def _process(self, job: RecognitionJob):
+        ext = job.file_path.lower().rsplit(".", 1)[-1]
+        if ext in STRUCTURED_EXTENSIONS:
+            # 全电发票 XML/OFD 直接解析，不调用 GLM
+            try:
+                result = await asyncio.to_thread(self._parse_structured, job.file_path, ext)
+            except EInvoiceParseError as e:
+                await asyncio.to_thread(self._finish, job, [(None, None)], f"解析失败: {e}")
+                return
+            await asyncio.to_thread(self._finish, job, [(None, result)])
+            return
+
+        if ext == "pdf":
+            results = await self._recognize_pdf(job)
+        else:
+            result = await glm_service.recognize_invoice_async(job.file_path, job.content_hash)
+            results = [(None, result)]
+
+        await asyncio.to_thread(self._finish, job, results or [(None, None)])
+
+    @staticmethod
+    def _parse_structured(file_path: str, ext: str) -> dict:
+        with open(file_path, "rb") as f:
+            return parse_einvoice(f.read(), ext)
+
+    async def _recognize_pdf(self, job: RecognitionJob) -> List[Tuple[int, Optional[dict]]]:
+        """
+        逐页渲染并并发识别 PDF
+        渲染受信号量约束：只有空出识别名额时才渲染下一页，内存中最多
+        PDF_PAGE_CONCURRENCY 页图片。
+        """
+        pages = iter_pdf_pages(job.file_path)
+        slots = asyncio.Semaphore(PDF_PAGE_CONCURRENCY)
+        tasks = []
+
+        async def recognize_page(page_no: int, image_bytes: bytes):
+            try:
+                source = f"{job.file_path}#page={page_no}"
+                return page_no, await glm_service.recognize_image_async(image_bytes, source)
+            finally:
+                slots.release()
+
+        try:
+            while True:
+                await slots.acquire()
+                page = await asyncio.to_thread(next, pages, None)
+                if page is None:
+                    slots.release()
+                    break
+                tasks.append(asyncio.create_task(recognize_page(*page)))
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+        finally:
+            # 被取消时渲染线程可能仍持有生成器，交给垃圾回收
+            if not pages.gi_running:
+                pages.close()
+
+        try:
+            results = await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+        return sorted(results, key=lambda r: r[0])
+
+    def _finish(
+        self,
+        job: RecognitionJob,
+        results: List[Tuple[Optional[int], Optional[dict]]],
+        error: Optional[str] = None,
+    ):
+        """保存发票记录（每页一条）并更新任务状态（同一事务）"""
+        failed_pages = [page_no for page_no, result in results if not result]
+        failed = len(failed_pages) == len(results)
+        if error is None and failed_pages:
+            error = "识别失败" if failed else f"第 {', '.join(map(str, failed_pages))} 页识别失败"
+
+        # 多个 worker 并发完成任务：查重到提交须串行，否则同批上传的相同发票互相看不到
+        with duplicate_detector.insert_lock:
+            db = SessionLocal()
+            try:
+                is_duplicate = duplicate_detector.batch_checker(db)
+                invoices = [
+                    build_invoice(result, job.file_path, job.reimbursement_person, page_no, is_duplicate)
+                    for page_no, result in results
+                ]
+                db.add_all(invoices)
+                db.flush()
+                for invoice in invoices:
+                    apply_invoice(db, invoice)
+                # 任务持有的文件引用转给发票，每页发票各持有一个
+                file_store.add_refs(db, job.file_path, len(invoices) - 1)
+
+                db.execute(
+                    update(RecognitionJob)
+                    .where(RecognitionJob.id == job.id)
+                    .values(
+                        status="failed" if failed else "done",
+                        error=error,
+                        invoice_ids=[invoice.id for invoice in invoices],
+                        finished_at=datetime.utcnow(),
+                    )
+                )
+                db.commit()
+                for invoice in invoices:
+                    duplicate_detector.add(
+                        duplicate_key(invoice.invoice_no, invoice.seller_tax_no, invoice.total_amount)
+                    )
+            finally:
+                db.close()
+
+
+task_queue = TaskQueue(RECOGNITION_CONCURRENCY)
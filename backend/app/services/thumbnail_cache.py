@@ -0,0 +1,170 @@
+import hashlib
+import os
+import tempfile
+import threading
+from io import BytesIO
+from typing import Dict, Optional, Tuple
+
+from PIL import Image, ImageOps
+
+from ..config import (
+    THUMBNAIL_DIR,
+    THUMBNAIL_MAX_EDGE,
+    THUMBNAIL_JPEG_QUALITY,
+    THUMBNAIL_CACHE_MAX_BYTES,
+)
+from .pdf_raster import render_pdf_page
+
+
+class ThumbnailCache:
+    """
+    缩略图磁盘缓存
+    键由原图路径、页码、原图大小/修改时间和缩略图参数计算，同时作为强 ETag：
+    原图或参数不变时内容一定不变。文件按键的前两位分目录存放。
+    总大小超过 max_bytes 时按最近访问时间（命中时更新 mtime）淘汰到 90%。
+    """
+
+    def __init__(self, cache_dir: str, max_edge: int, quality: int, max_bytes: int):
+        self.cache_dir = cache_dir
+        self.max_edge = max_edge
+        self.quality = quality
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._total_bytes: Optional[int] = None  # 首次写入时扫描目录得到
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def key(self, image_path: str, page_no: Optional[int] = None) -> Optional[str]:
+        """缩略图键（即 ETag），原图不存在时返回 None；只读取文件元数据"""
+        try:
+            stat = os.stat(image_path)
+        except OSError:
+            return None
+        source = (
+            f"{os.path.abspath(image_path)}|{page_no or 1}|{stat.st_size}|{stat.st_mtime_ns}|"
+            f"{self.max_edge}|{self.quality}"
+        )
+        return hashlib.sha256(source.encode("utf-8")).hexdigest()[:32]
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.jpg")
+
+    def get(self, image_path: str, page_no: Optional[int] = None) -> Optional[Tuple[str, str]]:
+        """
+        返回 (缩略图文件路径, ETag)，缓存未命中时生成
+        CPU 密集，应在线程池中调用；原图不存在时返回 None
+        """
+        key = self.key(image_path, page_no)
+        if key is None:
+            return None
+
+        path = self._path(key)
+        try:
+            os.utime(path)
+            with self._lock:
+                self.hits += 1
+            return path, key
+        except FileNotFoundError:
+            pass
+
+        data = self._render(image_path, page_no)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # 先写临时文件再原子替换，并发请求同一张图时不会读到半个文件
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self.misses += 1
+            self._add_bytes(len(data), keep=path)
+        return path, key
+
+    def discard(self, image_path: str, page_no: Optional[int] = None):
+        """删除发票时顺带删除缩略图（需在删除原图之前调用）"""
+        key = self.key(image_path, page_no)
+        if key is None:
+            return
+        path = self._path(key)
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except OSError:
+            return
+        with self._lock:
+            if self._total_bytes is not None:
+                self._total_bytes -= size
+
+    def _render(self, image_path: str, page_no: Optional[int]) -> bytes:
+        edge = self.max_edge
+        if image_path.lower().endswith(".pdf"):
+            img = render_pdf_page(image_path, page_no or 1, edge)
+        else:
+            with Image.open(image_path) as src:
+                # JPEG 直接按缩小比例解码，大图无需完整解码
+                src.draft("RGB", (edge, edge))
+                img = ImageOps.exif_transpose(src)
+
+        img.thumbnail((edge, edge), Image.Resampling.LANCZOS)
+        if img.mode in ("RGBA", "LA", "P"):
+            # 透明背景铺白，避免 JPEG 转换后变黑
+            img = img.convert("RGBA")
+            background = Image.new("RGB", img.size, (255, 255, 255))
+            background.paste(img, mask=img.getchannel("A"))
+            img = background
+        elif img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+
+        output = BytesIO()
+        img.save(output, format="JPEG", quality=self.quality, optimize=True)
+        return output.getvalue()
+
+    def _add_bytes(self, size: int, keep: str):
+        """记录新增大小，超出容量时淘汰；keep 为刚写入、即将返回的文件（调用方持有锁）"""
+        if self._total_bytes is None:
+            self._total_bytes = sum(size for _, size, _ in self._scan())
+        else:
+            self._total_bytes += size
+        if self._total_bytes <= self.max_bytes:
+            return
+
+        target = self.max_bytes * 0.9
+        for path, size, _ in sorted(self._scan(), key=lambda entry: entry[2]):
+            if self._total_bytes <= target:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            self._total_bytes -= size
+            self.evictions += 1
+
+    def _scan(self):
+        """遍历缓存目录，生成 (路径, 大小, 最近访问时间)"""
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.endswith(".jpg"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                yield path, stat.st_size, stat.st_mtime
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "total_bytes": self._total_bytes,
+            }
+
+
+thumbnail_cache = ThumbnailCache(
+    THUMBNAIL_DIR, THUMBNAIL_MAX_EDGE, THUMBNAIL_JPEG_QUALITY, THUMBNAIL_CACHE_MAX_BYTES
+)
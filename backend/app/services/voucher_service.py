@@ -1,10 +1,19 @@
 from datetime import datetime
-from typing import List
+from typing import Dict, List, Optional, Tuple
 from collections import defaultdict
 
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from ..models.invoice import Invoice
 from ..schemas.invoice import VoucherEntry, InvoiceResponse
 from .invoice_parser import get_account_code
 
+# {科目: {"amount", "tax", "count", "seller_count", "seller", "person"}}，seller/person 取排序最前的一个
+CategoryTotals = Dict[str, dict]
+# (报销人数, 排序最前的报销人)
+PersonTotals = Tuple[int, Optional[str]]
+
 
 def generate_vouchers(
     invoices: List[InvoiceResponse],
@@ -15,7 +24,7 @@ def generate_vouchers(
 ) -> List[VoucherEntry]:
     """
     根据发票列表生成凭证分录
-    按费用科目分组，生成借贷分录
+    按费用科目分组，生成借贷分录；数据在数据库中时用 aggregate_vouchers + build_vouchers
     """
     if not invoices:
         return []
@@ -25,18 +34,90 @@ def generate_vouchers(
         "amount": 0,
         "tax": 0,
         "count": 0,
-        "invoices": [],
         "sellers": set(),  # 收集销方名称
+        "persons": set(),
     })
 
     for inv in invoices:
         category = inv.expense_category or "其他"
-        category_totals[category]["amount"] += inv.amount
-        category_totals[category]["tax"] += inv.tax_amount
+        category_totals[category]["amount"] += inv.amount or 0
+        category_totals[category]["tax"] += inv.tax_amount or 0
         category_totals[category]["count"] += 1
-        category_totals[category]["invoices"].append(inv)
         if inv.seller_name:
             category_totals[category]["sellers"].add(inv.seller_name)
+        if inv.reimbursement_person:
+            category_totals[category]["persons"].add(inv.reimbursement_person)
+
+    all_persons = set().union(*(data["persons"] for data in category_totals.values()))
+    totals = {
+        category: {
+            "amount": data["amount"],
+            "tax": data["tax"],
+            "count": data["count"],
+            "seller_count": len(data["sellers"]),
+            "seller": min(data["sellers"], default=None),
+            "person": min(data["persons"], default=None),
+        }
+        for category, data in sorted(category_totals.items())
+    }
+    persons = (len(all_persons), min(all_persons, default=None))
+    return build_vouchers(totals, persons, voucher_date, voucher_type, maker, department)
+
+
+def aggregate_vouchers(db: Session, *criteria) -> Tuple[CategoryTotals, PersonTotals]:
+    """
+    在数据库中按科目汇总生成凭证所需的数据（一条 SQL）
+    criteria 为发票筛选条件；只返回每个科目一行，内存占用与发票数量无关
+    """
+    category = func.coalesce(func.nullif(Invoice.expense_category, ""), "其他")
+    seller = func.nullif(Invoice.seller_name, "")
+    person = func.nullif(Invoice.reimbursement_person, "")
+
+    person_count = select(func.count(func.distinct(person))).where(*criteria).scalar_subquery()
+    first_person = select(func.min(person)).where(*criteria).scalar_subquery()
+    rows = db.execute(
+        select(
+            category,
+            func.sum(Invoice.amount),
+            func.sum(Invoice.tax_amount),
+            func.count(Invoice.id),
+            func.count(func.distinct(seller)),
+            func.min(seller),
+            func.min(person),
+            person_count,
+            first_person,
+        )
+        .where(*criteria)
+        .group_by(category)
+        .order_by(category)
+    ).all()
+
+    totals = {
+        row[0]: {
+            "amount": row[1] or 0,
+            "tax": row[2] or 0,
+            "count": row[3],
+            "seller_count": row[4],
+            "seller": row[5],
+            "person": row[6],
+        }
+        for row in rows
+    }
+    persons = (rows[0][7], rows[0][8]) if rows else (0, None)
+    return totals, persons
+
+
+def build_vouchers(
+    category_totals: CategoryTotals,
+    persons: PersonTotals,
+    voucher_date: str,
+    voucher_type: str = "转",
+    maker: str = "系统",
+    department: str = "",
+) -> List[VoucherEntry]:
+    """由科目汇总生成借方（各费用科目）与贷方（其他应付款）分录"""
+    if not category_totals:
+        return []
 
     vouchers = []
     voucher_no = 1
@@ -48,14 +129,12 @@ def generate_vouchers(
         total = data["amount"] + data["tax"]
 
         # 获取报销人信息
-        reimbursement_person = ""
+        reimbursement_person = data["person"] or ""
         employee_no = ""
-        if data["invoices"]:
-            reimbursement_person = data["invoices"][0].reimbursement_person or ""
 
         # 获取往来单位（销方）
-        sellers_list = list(data["sellers"])
-        vendor_name = sellers_list[0] if len(sellers_list) == 1 else f"{sellers_list[0]}等{len(sellers_list)}家" if sellers_list else ""
+        seller_count = data["seller_count"]
+        vendor_name = data["seller"] if seller_count == 1 else f"{data['seller']}等{seller_count}家" if seller_count else ""
 
         voucher = VoucherEntry(
             编制日期=voucher_date,
@@ -95,12 +174,8 @@ def generate_vouchers(
     total_count = sum(d["count"] for d in category_totals.values())
 
     # 获取所有报销人
-    all_persons = set()
-    for data in category_totals.values():
-        for inv in data["invoices"]:
-            if inv.reimbursement_person:
-                all_persons.add(inv.reimbursement_person)
-    person_name = list(all_persons)[0] if len(all_persons) == 1 else f"{list(all_persons)[0]}等{len(all_persons)}人" if all_persons else ""
+    person_count, first_person = persons
+    person_name = first_person if person_count == 1 else f"{first_person}等{person_count}人" if person_count else ""
 
     credit_voucher = VoucherEntry(
         编制日期=voucher_date,
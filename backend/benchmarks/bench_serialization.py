@@ -0,0 +1,93 @@
+"""
+列表/导出序列化基准：Pydantic 逐行校验 vs 行元组 + orjson
+
+    cd backend && python -m benchmarks.bench_serialization [--rows 10000] [--repeat 5]
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+
+from app.database import Base
+from app.models.invoice import Invoice
+from app.schemas.invoice import InvoiceListResponse, InvoiceResponse
+from app.routers.invoice import EXPORT_COLUMNS
+from app.services.excel_export import _detail_row
+from app.services.fast_json import INVOICE_COLUMNS, FastJSONResponse, invoice_dicts
+
+from .data import populate
+
+def pydantic_path(db: Session, rows: int) -> bytes:
+    """现有路径：ORM 对象 → model_validate → response_model JSON"""
+    items = db.scalars(select(Invoice).limit(rows)).all()
+    response = InvoiceListResponse(
+        items=[InvoiceResponse.model_validate(i) for i in items], total=rows, page=1, size=rows
+    )
+    return response.model_dump_json().encode("utf-8")
+
+
+def fast_path(db: Session, rows: int) -> bytes:
+    """快速路径：行元组 → 字典 → orjson"""
+    items = db.execute(select(*INVOICE_COLUMNS).limit(rows)).all()
+    content = {"items": invoice_dicts(items), "total": rows, "page": 1, "size": rows, "next_cursor": None}
+    return FastJSONResponse(content).body
+
+
+def export_orm_rows(db: Session, rows: int):
+    """导出明细：ORM 对象"""
+    for invoice in db.query(Invoice).limit(rows).yield_per(1000):
+        _detail_row(invoice)
+        db.expunge(invoice)
+
+
+def export_tuple_rows(db: Session, rows: int):
+    """导出明细：只读所需列的行元组"""
+    for row in db.query(*EXPORT_COLUMNS).limit(rows).yield_per(1000):
+        _detail_row(row)
+
+
+def best_of(fn, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        Base.metadata.create_all(engine)
+        with Session(engine) as db:
+            populate(db, args.rows)
+
+            slow_body = pydantic_path(db, args.rows)
+            fast_body = fast_path(db, args.rows)
+            assert json.loads(slow_body) == json.loads(fast_body), "两条路径输出不一致"
+
+            slow = best_of(lambda: pydantic_path(db, args.rows), args.repeat)
+            db.expunge_all()
+            fast = best_of(lambda: fast_path(db, args.rows), args.repeat)
+            export_slow = best_of(lambda: export_orm_rows(db, args.rows), args.repeat)
+            export_fast = best_of(lambda: export_tuple_rows(db, args.rows), args.repeat)
+        engine.dispose()
+
+    print(f"rows={args.rows} body={len(fast_body) / 1024:.0f} KB")
+    print(f"list  pydantic:   {slow * 1000:8.1f} ms")
+    print(f"list  orjson:     {fast * 1000:8.1f} ms  ({slow / fast:.1f}x)")
+    print(f"export orm rows:  {export_slow * 1000:8.1f} ms")
+    print(f"export tuples:    {export_fast * 1000:8.1f} ms  ({export_slow / export_fast:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""基准测试数据：批量生成发票行并写入数据库"""
+import random
+import uuid
+from datetime import date, datetime, timedelta
+from typing import Iterator, List
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from app.models.invoice import Invoice
+from app.services.summary_rollup import rebuild_rollup
+
+CATEGORIES = ["交通费", "差旅费-住宿", "业务招待费", "办公费", "通讯费", "固定资产", "低值易耗品", "其他"]
+PEOPLE = ["张三", "李四", "王五", "赵六", "钱七"]
+
+
+def invoice_rows(count: int, seed: int = 0) -> Iterator[dict]:
+    """生成 count 条发票行（字典），created_at 按秒递减，同一 seed 结果相同"""
+    rng = random.Random(seed)
+    now = datetime.now()
+    today = date.today()
+    for n in range(count):
+        amount = round(rng.uniform(10, 6000), 2)
+        tax = round(amount * rng.choice([0, 0.01, 0.03, 0.06, 0.13]), 2)
+        anomaly = rng.random() < 0.15
+        yield {
+            "id": str(uuid.UUID(int=rng.getrandbits(128))),
+            "invoice_no": str(rng.randrange(10**19, 10**20)),
+            "invoice_date": today - timedelta(days=rng.randrange(365)),
+            "invoice_type": "电子普票",
+            "seller_name": f"供应商{rng.randrange(2000)}有限公司",
+            "seller_tax_no": f"91110000MA{rng.randrange(10**8):08d}",
+            "amount": amount,
+            "tax_amount": tax,
+            "total_amount": round(amount + tax, 2),
+            "expense_category": rng.choice(CATEGORIES),
+            "reimbursement_person": rng.choice(PEOPLE),
+            "confidence": round(rng.uniform(0.8, 1), 2),
+            "anomaly_flag": "warning" if anomaly else "normal",
+            "anomaly_reason": "金额超过5000元，需审批" if anomaly else None,
+            "image_path": f"./uploads/{uuid.uuid4().hex}.png",
+            "created_at": now - timedelta(seconds=n),
+            "updated_at": now,
+        }
+
+
+def populate(db: Session, count: int, batch_size: int = 10000, seed: int = 0):
+    """批量插入 count 条发票并重建汇总表"""
+    batch: List[dict] = []
+    for row in invoice_rows(count, seed):
+        batch.append(row)
+        if len(batch) >= batch_size:
+            db.execute(insert(Invoice), batch)
+            batch = []
+    if batch:
+        db.execute(insert(Invoice), batch)
+    db.commit()
+    rebuild_rollup(db)
@@ -0,0 +1,376 @@
+"""
+基准测试套件：使用本地 GLM 模拟后端（GLM_BACKEND=fake），不消耗 API 配额
+
+    cd backend && python -m benchmarks.suite
+    python -m benchmarks.suite --scenarios list --rows 10000,100000
+    python -m benchmarks.suite --compare benchmarks/results/abc1234.json
+
+场景：
+    upload  不同识别并发数下批量上传 → 识别完成的吞吐（张/分钟）
+    list    不同数据量下列表首页、深分页、游标翻页与 /summary 的延迟（p50/p95）
+    export  不同数据量下 /export 的耗时与 Python 堆内存峰值
+每个场景（每个参数组合）在独立子进程中运行，使用临时目录中的数据库与上传目录。
+结果写入 JSON（默认 benchmarks/results/<commit>.json），用 --compare 与旧结果对比。
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from io import BytesIO
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCENARIOS = ("upload", "list", "export")
+
+
+def _ints(value: str):
+    return [int(v) for v in value.split(",") if v]
+
+
+def _percentile(samples, q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def _timings(samples) -> dict:
+    """毫秒统计"""
+    ms = [s * 1000 for s in samples]
+    return {
+        "p50_ms": round(_percentile(ms, 0.5), 2),
+        "p95_ms": round(_percentile(ms, 0.95), 2),
+        "mean_ms": round(statistics.fmean(ms), 2),
+    }
+
+
+def _max_rss_mb() -> float:
+    # Linux 上 ru_maxrss 单位为 KB，macOS 为字节
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+# ---------------------------------------------------------------- 子进程中运行
+
+
+def _sample_images(count: int, seed: int = 0):
+    """生成 count 张内容互不相同的 PNG（识别结果由模拟后端按内容哈希确定）"""
+    from PIL import Image, ImageDraw
+
+    rng = random.Random(seed)
+    for n in range(count):
+        img = Image.new("RGB", (1200, 800), "white")
+        draw = ImageDraw.Draw(img)
+        for _ in range(40):
+            x, y = rng.randrange(1100), rng.randrange(760)
+            draw.rectangle((x, y, x + rng.randrange(20, 100), y + 12), fill=(0, 0, 0))
+        draw.text((20, 20), f"benchmark invoice {seed}-{n}", fill=(0, 0, 0))
+        output = BytesIO()
+        img.save(output, format="PNG")
+        yield f"invoice_{n:05d}.png", output.getvalue()
+
+
+def run_upload(files: int, batch: int) -> dict:
+    from fastapi.testclient import TestClient
+
+    from app.config import GLM_BATCH_SIZE, RECOGNITION_CONCURRENCY
+    from app.main import app
+    from app.services.glm_service import glm_service
+
+    images = list(_sample_images(files))
+    with TestClient(app) as client:
+        start = time.perf_counter()
+        task_ids = []
+        for i in range(0, len(images), batch):
+            payload = [("files", (name, data, "image/png")) for name, data in images[i : i + batch]]
+            response = client.post("/api/invoices/upload", files=payload)
+            response.raise_for_status()
+            task_ids.append(response.json()["task_id"])
+        uploaded = time.perf_counter() - start
+
+        done = failed = 0
+        for task_id in task_ids:
+            while True:
+                status = client.get(f"/api/invoices/tasks/{task_id}").json()
+                if status["finished"]:
+                    done += status["done"]
+                    failed += status["failed"]
+                    break
+                time.sleep(0.2)
+        elapsed = time.perf_counter() - start
+
+    stats = glm_service.get_stats()
+    return {
+        "concurrency": RECOGNITION_CONCURRENCY,
+        "files": files,
+        "done": done,
+        "failed": failed,
+        "upload_seconds": round(uploaded, 3),
+        "seconds": round(elapsed, 3),
+        "per_minute": round(done / elapsed * 60, 1),
+        "glm_batch_size": GLM_BATCH_SIZE,
+        "glm_calls": stats["total_calls"],
+        "glm_retries": stats["retries"],
+        "tokens_per_invoice": round(stats["total_tokens"] / done) if done else None,
+    }
+
+
+def _populate(rows: int) -> float:
+    """建表并写入 rows 条发票，返回耗时；需在导入 app.main 之前调用"""
+    from app.database import SessionLocal
+    from app.migrate import upgrade_database
+
+    from .data import populate
+
+    upgrade_database()
+    start = time.perf_counter()
+    with SessionLocal() as db:
+        populate(db, rows)
+    return time.perf_counter() - start
+
+
+def run_list(rows: int, repeat: int) -> dict:
+    populate_seconds = _populate(rows)
+
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+
+    size = 20
+    with TestClient(app) as client:
+        first = client.get("/api/invoices", params={"size": size}).json()
+        cases = {
+            "list_first_page": {"size": size},
+            "list_first_page_no_total": {"size": size, "include_total": "false"},
+            "list_deep_offset": {"size": size, "page": max(1, rows // size // 2)},
+            "list_cursor": {"size": size, "cursor": first["next_cursor"], "include_total": "false"},
+            "list_category": {"size": size, "category": "办公费"},
+        }
+        result = {"rows": rows, "populate_seconds": round(populate_seconds, 2)}
+        for name, params in cases.items():
+            result[name] = _measure(lambda: client.get("/api/invoices", params=params), repeat)
+        result["summary"] = _measure(lambda: client.get("/api/invoices/summary"), repeat)
+    return result
+
+
+def _measure(request, repeat: int) -> dict:
+    request().raise_for_status()  # 预热
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        request().raise_for_status()
+        samples.append(time.perf_counter() - start)
+    return _timings(samples)
+
+
+def run_export(rows: int) -> dict:
+    populate_seconds = _populate(rows)
+
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+
+    with TestClient(app) as client:
+        start = time.perf_counter()
+        response = client.get("/api/invoices/export")
+        response.raise_for_status()
+        elapsed = time.perf_counter() - start
+        size = len(response.content)
+        rss = _max_rss_mb()
+
+        # 第二遍单独测内存：tracemalloc 会明显拖慢执行，不计入耗时
+        tracemalloc.start()
+        client.get("/api/invoices/export").raise_for_status()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    return {
+        "rows": rows,
+        "populate_seconds": round(populate_seconds, 2),
+        "seconds": round(elapsed, 3),
+        "rows_per_second": round(rows / elapsed),
+        "file_kb": size // 1024,
+        "peak_python_mb": round(peak / 1024 / 1024, 1),
+        "max_rss_mb": rss,
+    }
+
+
+def worker(scenario: str, params: dict, result_path: str):
+    if scenario == "upload":
+        result = run_upload(params["files"], params["batch"])
+    elif scenario == "list":
+        result = run_list(params["rows"], params["repeat"])
+    else:
+        result = run_export(params["rows"])
+    with open(result_path, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False)
+
+
+# ---------------------------------------------------------------- 主进程
+
+
+def _spawn(scenario: str, params: dict, env: dict) -> dict:
+    """在独立子进程和临时目录中运行一个场景，返回其结果"""
+    with tempfile.TemporaryDirectory(prefix="invoice-bench-") as tmp:
+        result_path = os.path.join(tmp, "result.json")
+        child_env = {
+            **os.environ,
+            "DATABASE_URL": f"sqlite:///{os.path.join(tmp, 'bench.db')}",
+            "UPLOAD_DIR": os.path.join(tmp, "uploads"),
+            "THUMBNAIL_DIR": os.path.join(tmp, "thumbnails"),
+            "CACHE_DB_PATH": os.path.join(tmp, "recognition_cache.db"),
+            "LOG_DIR": os.path.join(tmp, "logs"),
+            "GLM_BACKEND": "fake",
+            "CACHE_ENABLED": "false",
+            "GLM_RATE_LIMIT_RPM": "0",
+            **env,
+        }
+        command = [
+            sys.executable, "-m", "benchmarks.suite",
+            "--worker", scenario, "--params", json.dumps(params), "--result", result_path,
+        ]
+        completed = subprocess.run(
+            command, cwd=BACKEND_DIR, env=child_env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+        )
+        if completed.returncode != 0:
+            raise RuntimeError(f"{scenario} {params} 运行失败:\n{completed.stderr.decode(errors='replace')}")
+        with open(result_path, encoding="utf-8") as f:
+            return json.load(f)
+
+
+def _git(*args) -> str:
+    try:
+        return subprocess.run(
+            ["git", *args], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def _print(scenario: str, result: dict):
+    if scenario == "upload":
+        print(
+            f"upload  concurrency={result['concurrency']:<3} glm_batch={result['glm_batch_size']:<3} "
+            f"{result['done']}/{result['files']} 张  {result['seconds']:7.2f}s  "
+            f"{result['per_minute']:8.1f} 张/分钟  {result['tokens_per_invoice']} token/张"
+        )
+    elif scenario == "list":
+        print(f"list    rows={result['rows']}")
+        for name, value in result.items():
+            if isinstance(value, dict):
+                print(f"        {name:<26} p50 {value['p50_ms']:8.2f} ms  p95 {value['p95_ms']:8.2f} ms")
+    else:
+        print(
+            f"export  rows={result['rows']:<8} {result['seconds']:7.2f}s  "
+            f"Python 峰值 {result['peak_python_mb']:7.1f} MB  RSS {result['max_rss_mb']:7.1f} MB"
+        )
+
+
+def _metrics(report: dict) -> dict:
+    """把结果展开为 {指标名: 数值}，用于对比"""
+    flat = {}
+    for item in report["results"].get("upload", []):
+        key = f"upload c={item['concurrency']} b={item.get('glm_batch_size', 1)}"
+        flat[f"{key} 张/分钟"] = item["per_minute"]
+        if item.get("tokens_per_invoice"):
+            flat[f"{key} token/张"] = item["tokens_per_invoice"]
+    for item in report["results"].get("list", []):
+        for name, value in item.items():
+            if isinstance(value, dict):
+                flat[f"{name} rows={item['rows']} p50_ms"] = value["p50_ms"]
+    for item in report["results"].get("export", []):
+        flat[f"export rows={item['rows']} 秒"] = item["seconds"]
+        flat[f"export rows={item['rows']} 峰值MB"] = item["peak_python_mb"]
+    return flat
+
+
+def compare(baseline_path: str, report: dict):
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    old, new = _metrics(baseline), _metrics(report)
+    print(f"\n对比 {baseline.get('commit') or baseline_path} → {report.get('commit') or '当前'}")
+    for name in new:
+        if name in old and old[name]:
+            print(f"  {name:<44} {old[name]:>10} → {new[name]:>10}  ({new[name] / old[name]:.2f}x)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="发票系统基准测试（模拟 GLM 后端）")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--rows", default="10000,100000,1000000", help="列表/汇总场景的数据量")
+    parser.add_argument("--export-rows", default="10000,100000", help="导出场景的数据量")
+    parser.add_argument("--concurrency", default="1,4,8,16", help="上传场景的识别并发数")
+    parser.add_argument("--files", type=int, default=48, help="上传场景的文件数")
+    parser.add_argument("--batch", type=int, default=16, help="每次上传请求的文件数")
+    parser.add_argument("--glm-batch", default="1", help="上传场景的 GLM 批量大小（GLM_BATCH_SIZE），可逗号分隔多个")
+    parser.add_argument("--latency", type=float, default=1.0, help="模拟 GLM 延迟中位数（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="模拟 5xx 比例")
+    parser.add_argument("--repeat", type=int, default=20, help="每个查询的测量次数")
+    parser.add_argument("--output", help="结果文件，默认 benchmarks/results/<commit>.json")
+    parser.add_argument("--compare", help="与之前的结果文件对比")
+    parser.add_argument("--worker", choices=SCENARIOS, help=argparse.SUPPRESS)
+    parser.add_argument("--params", help=argparse.SUPPRESS)
+    parser.add_argument("--result", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(args.worker, json.loads(args.params), args.result)
+        return
+
+    scenarios = [s for s in args.scenarios.split(",") if s]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"未知场景: {', '.join(sorted(unknown))}")
+
+    fake_env = {
+        "FAKE_GLM_LATENCY_MEDIAN": str(args.latency),
+        "FAKE_GLM_ERROR_RATE": str(args.error_rate),
+        "FAKE_GLM_SEED": "0",
+    }
+    runs = []
+    if "upload" in scenarios:
+        for batch_size in _ints(args.glm_batch):
+            for n in _ints(args.concurrency):
+                env = {**fake_env, "RECOGNITION_CONCURRENCY": str(n), "GLM_BATCH_SIZE": str(batch_size)}
+                runs.append(("upload", {"files": args.files, "batch": args.batch}, env))
+    if "list" in scenarios:
+        for rows in _ints(args.rows):
+            runs.append(("list", {"rows": rows, "repeat": args.repeat}, {}))
+    if "export" in scenarios:
+        for rows in _ints(args.export_rows):
+            runs.append(("export", {"rows": rows}, {}))
+
+    commit = _git("rev-parse", "--short", "HEAD")
+    report = {
+        "commit": commit,
+        "dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "settings": {"latency": args.latency, "error_rate": args.error_rate, "files": args.files},
+        "results": {},
+    }
+    for scenario, params, env in runs:
+        result = _spawn(scenario, params, env)
+        report["results"].setdefault(scenario, []).append(result)
+        _print(scenario, result)
+
+    name = commit or datetime.now().strftime("%Y%m%d-%H%M%S")
+    output = args.output or os.path.join(BACKEND_DIR, "benchmarks", "results", f"{name}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n结果已写入 {output}")
+
+    if args.compare:
+        compare(args.compare, report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+import atexit
+import os
+import shutil
+import tempfile
+
+# 配置在导入 app 时读取：测试使用临时目录中的数据库/上传目录，GLM 使用本地替身
+_TMP_DIR = tempfile.mkdtemp(prefix="invoice-tests-")
+# 先于 app 注册，最后执行：日志写线程在退出时还会写入该目录
+atexit.register(shutil.rmtree, _TMP_DIR, ignore_errors=True)
+os.environ.update(
+    DATABASE_URL=f"sqlite:///{_TMP_DIR}/invoices.db",
+    UPLOAD_DIR=os.path.join(_TMP_DIR, "uploads"),
+    LOG_DIR=os.path.join(_TMP_DIR, "logs"),
+    THUMBNAIL_DIR=os.path.join(_TMP_DIR, "thumbnails"),
+    CACHE_ENABLED="false",
+    GLM_BACKEND="fake",
+    FAKE_GLM_LATENCY_MEDIAN="0.05",
+    FAKE_GLM_LATENCY_SIGMA="0",
+    FAKE_GLM_SEED="1",
+    GLM_BATCH_SIZE="1",
+    INVOICE_QR_MODE="off",
+    RECOGNITION_CONCURRENCY="4",
+)
+
+import io  # noqa: E402
+import time  # noqa: E402
+
+import pytest  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from PIL import Image  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def client():
+    """启动应用（含识别 worker 池）的测试客户端"""
+    from app.main import app
+
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+@pytest.fixture(scope="session")
+def database():
+    from app.migrate import upgrade_database
+
+    upgrade_database()
+
+
+@pytest.fixture
+def db(database):
+    from app.database import SessionLocal
+
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+def make_image(seed: int) -> bytes:
+    """生成内容各不相同的小图片；FakeGLMClient 按图片内容生成确定的发票"""
+    buf = io.BytesIO()
+    Image.new("RGB", (32, 32), (seed % 256, seed // 256 % 256, 128)).save(buf, "PNG")
+    return buf.getvalue()
+
+
+EINVOICE_XML = """<?xml version="1.0" encoding="UTF-8"?>
+<EInvoice><Header><EIid>{no}</EIid></Header>
+<EInvoiceData><SellerInformation><SellerIdNum>91110000MA01234567</SellerIdNum>
+<SellerName>北京全聚德烤鸭股份有限公司</SellerName></SellerInformation>
+<BasicInformation><TotalAmWithoutTax>100.00</TotalAmWithoutTax><TotalTaxAm>6.00</TotalTaxAm>
+<TotalTax-includedAmount>106.00</TotalTax-includedAmount></BasicInformation>
+<IssuItemInformation><ItemName>*餐饮服务*餐费</ItemName></IssuItemInformation></EInvoiceData>
+<TaxSupervisionInfo><IssueTime>2026-09-30 12:01:02</IssueTime></TaxSupervisionInfo></EInvoice>"""
+
+
+def einvoice_xml(no: str) -> bytes:
+    """最简的全电发票 XML"""
+    return EINVOICE_XML.format(no=no).encode("utf-8")
+
+
+def wait_for_task(client: TestClient, task_id: str, timeout: float = 30.0) -> dict:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        status = client.get(f"/api/invoices/tasks/{task_id}").json()
+        if status["finished"]:
+            return status
+        time.sleep(0.05)
+    raise TimeoutError(f"识别任务 {task_id} 未在 {timeout} 秒内完成")
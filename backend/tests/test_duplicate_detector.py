@@ -0,0 +1,21 @@
+from conftest import make_image, wait_for_task
+
+from app.models.invoice import Invoice
+
+
+def test_same_invoice_uploaded_twice_concurrently(client, db):
+    image = make_image(1401)
+    response = client.post(
+        "/api/invoices/upload",
+        files=[("files", (f"copy{n}.png", image, "image/png")) for n in range(2)],
+    )
+    assert response.json()["queued"] == 2
+
+    status = wait_for_task(client, response.json()["task_id"])
+    assert status["done"] == 2
+
+    invoice_ids = [invoice_id for job in status["jobs"] for invoice_id in job["invoice_ids"]]
+    invoices = db.query(Invoice).filter(Invoice.id.in_(invoice_ids)).all()
+    assert len(invoices) == 2
+    assert invoices[0].invoice_no == invoices[1].invoice_no
+    assert sorted("疑似重复报销" in (inv.anomaly_reason or "") for inv in invoices) == [False, True]
@@ -0,0 +1,71 @@
+import hashlib
+import os
+import zipfile
+
+import pytest
+from conftest import einvoice_xml as xml
+from sqlalchemy import func, select
+
+from app.models.invoice import Invoice
+from app.models.stored_file import StoredFile
+from app.services import einvoice_import
+from app.services.einvoice_import import import_einvoice_zip
+from app.services.file_store import file_store
+
+def write_zip(path, entries):
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, data in entries:
+            archive.writestr(name, data)
+
+    # 把 encrypted* 条目在中央目录中标记为加密（zipfile 不能写加密条目），读取时抛出 RuntimeError
+    raw = bytearray(path.read_bytes())
+    offset = raw.find(b"PK\x01\x02")
+    while offset != -1:
+        name_length = int.from_bytes(raw[offset + 28 : offset + 30], "little")
+        if raw[offset + 46 : offset + 46 + name_length].startswith(b"encrypted"):
+            raw[offset + 8] |= 0x1
+        offset = raw.find(b"PK\x01\x02", offset + 46)
+    path.write_bytes(bytes(raw))
+
+
+def stored_refs(db, paths) -> int:
+    return db.scalar(select(func.coalesce(func.sum(StoredFile.ref_count), 0)).where(StoredFile.path.in_(paths)))
+
+
+def test_import_skips_unreadable_entries(tmp_path, db):
+    zip_path = tmp_path / "batch.zip"
+    write_zip(
+        zip_path,
+        [
+            ("a.xml", xml("26112000000000240001")),
+            ("encrypted.xml", xml("26112000000000240002")),
+            ("nested.ofd", b"not a zip"),
+            ("b.xml", xml("26112000000000240003")),
+        ],
+    )
+
+    result = import_einvoice_zip(str(zip_path), "张三")
+
+    assert result["imported"] == 2
+    assert sorted(entry.split(":")[0] for entry in result["failed"]) == ["encrypted.xml", "nested.ofd"]
+    invoices = db.query(Invoice).filter(Invoice.invoice_no.in_(["26112000000000240001", "26112000000000240003"])).all()
+    assert len(invoices) == 2
+    assert stored_refs(db, [inv.image_path for inv in invoices]) == 2
+    assert all(os.path.exists(inv.image_path) for inv in invoices)
+
+
+def test_import_failure_leaves_no_refs(tmp_path, db, monkeypatch):
+    zip_path = tmp_path / "batch.zip"
+    write_zip(zip_path, [("c.xml", xml("26112000000000240004"))])
+
+    def fail(*args, **kwargs):
+        raise RuntimeError("rollup unavailable")
+
+    monkeypatch.setattr(einvoice_import, "apply_invoice", fail)
+    with pytest.raises(RuntimeError):
+        import_einvoice_zip(str(zip_path), "张三")
+
+    assert db.query(Invoice).filter(Invoice.invoice_no == "26112000000000240004").count() == 0
+    path = file_store.blob_path(hashlib.sha256(xml("26112000000000240004")).hexdigest(), "xml")
+    assert stored_refs(db, [path]) == 0
+    assert os.listdir(file_store.tmp_dir) == []
@@ -0,0 +1,62 @@
+from app.models.invoice import Invoice
+from app.services.duplicate_detector import duplicate_key
+from app.services.invoice_parser import build_invoice
+
+
+def test_build_invoice_accepts_numeric_invoice_no():
+    result = {
+        "invoice_no": 12345678,
+        "invoice_date": "2026-09-01",
+        "seller_name": "得力集团有限公司",
+        "seller_tax_no": 911100001234567,
+        "amount": 100,
+        "tax_amount": 13,
+        "total_amount": 113,
+        "confidence": 0.95,
+    }
+    seen = []
+    invoice = build_invoice(result, "./uploads/a.png", "张三", is_duplicate=lambda key: seen.append(key) or False)
+
+    assert invoice.invoice_no == "12345678"
+    assert invoice.seller_tax_no == "911100001234567"
+    assert invoice.total_amount == 113
+    assert seen == [("12345678", "911100001234567", 113.0)]
+
+
+def test_duplicate_key_coerces_numbers():
+    assert duplicate_key(12345678, 911100001234567, "113") == ("12345678", "911100001234567", 113.0)
+    assert duplicate_key(None, "x", 1) is None
+    assert duplicate_key(" ", "x", 1) is None
+
+
+def test_build_invoice_qr_only_needs_review():
+    from app.services.invoice_qr import parse_invoice_qr, qr_result
+
+    qr = parse_invoice_qr("01,32,,24442000000012345678,1234.50,20260912,,A1B2,")
+    invoice = build_invoice(qr_result(qr), "./uploads/a.jpg", "张三")
+
+    assert invoice.amount == 1234.5
+    assert invoice.total_amount is None
+    assert invoice.tax_amount is None
+    assert invoice.anomaly_flag != "normal"
+    assert "人工复核" in invoice.anomaly_reason
+
+
+def test_reclassify_keeps_manual_category(client, db):
+    from app.services.invoice_parser import reclassify_invoices
+    from app.services.summary_rollup import apply_invoice
+
+    result = {"invoice_no": "13000001", "seller_name": "得力集团有限公司", "items": ["文具"], "amount": 50, "confidence": 0.95}
+    invoice = build_invoice(result, "./uploads/b.png", "李四")
+    assert invoice.expense_category == "办公费"
+    db.add(invoice)
+    db.flush()
+    apply_invoice(db, invoice)
+    invoice_id = invoice.id
+    db.commit()
+
+    response = client.patch(f"/api/invoices/{invoice_id}", json={"expense_category": "固定资产"})
+    assert response.json()["expense_category"] == "固定资产"
+
+    reclassify_invoices(db)
+    assert db.get(Invoice, invoice_id).expense_category == "固定资产"
@@ -0,0 +1,54 @@
+import zipfile
+
+from conftest import einvoice_xml, make_image, wait_for_task
+
+from app.services.invoice_parser import build_invoice, reclassify_invoices
+from app.services.summary_rollup import apply_invoice, check_rollup
+
+
+def test_rollup_stays_consistent(client, db, tmp_path):
+    # 上传识别
+    response = client.post(
+        "/api/invoices/upload",
+        files=[("files", (f"{n}.png", make_image(3000 + n), "image/png")) for n in range(3)],
+    )
+    status = wait_for_task(client, response.json()["task_id"])
+    invoice_ids = [invoice_id for job in status["jobs"] for invoice_id in job["invoice_ids"]]
+    assert len(invoice_ids) == 3
+    assert check_rollup(db) == []
+
+    # 人工修改科目和异常标记（从旧分组 -1，新分组 +1）
+    client.patch(f"/api/invoices/{invoice_ids[0]}", json={"expense_category": "通讯费"})
+    client.patch(f"/api/invoices/{invoice_ids[1]}", json={"anomaly_flag": "error", "anomaly_reason": "人工标记"})
+    db.rollback()
+    assert check_rollup(db) == []
+
+    # 删除
+    assert client.delete(f"/api/invoices/{invoice_ids[2]}").status_code == 200
+    db.rollback()
+    assert check_rollup(db) == []
+
+    # 重新分类：模拟按旧规则归类的发票
+    invoice = build_invoice(
+        {"invoice_no": "26112000000000260001", "seller_name": "得力集团有限公司", "items": ["文具"], "amount": 30},
+        "./uploads/c.png",
+        "王五",
+    )
+    invoice.expense_category = "其他"
+    db.add(invoice)
+    db.flush()
+    apply_invoice(db, invoice)
+    db.commit()
+    assert reclassify_invoices(db)[1] >= 1
+    assert check_rollup(db) == []
+
+    # 全电发票 ZIP 导入
+    zip_path = tmp_path / "batch.zip"
+    with zipfile.ZipFile(zip_path, "w") as archive:
+        for n in range(3):
+            archive.writestr(f"{n}.xml", einvoice_xml(f"2611200000000026010{n}"))
+    with open(zip_path, "rb") as f:
+        response = client.post("/api/invoices/import", files={"file": ("batch.zip", f, "application/zip")})
+    assert response.json()["imported"] == 3
+    db.rollback()
+    assert check_rollup(db) == []
@@ -0,0 +1,146 @@
+import asyncio
+import hashlib
+from datetime import datetime, timedelta
+
+import pytest
+from conftest import make_image, wait_for_task
+
+from app.config import GLM_JOB_MAX_ATTEMPTS
+from app.models.invoice import Invoice
+from app.models.stored_file import StoredFile
+from app.models.task import RecognitionJob
+from app.services import task_queue as task_queue_module
+from app.services.file_store import file_store
+from app.services.glm_service import GLMUnavailableError, glm_service
+from app.services.task_queue import TaskQueue, task_queue
+
+
+@pytest.fixture
+def queue(db, monkeypatch):
+    """独立的 TaskQueue；应用自带的 worker 池（如已启动）暂停领取，避免抢走测试任务"""
+    monkeypatch.setattr(task_queue, "_claim_next", lambda: None)
+    monkeypatch.setattr(task_queue_module, "POLL_INTERVAL", 0.01)
+    yield TaskQueue(1)
+    # 清掉测试残留的排队任务，不影响其他测试
+    db.query(RecognitionJob).filter(RecognitionJob.status.in_(["queued", "running"])).delete()
+    db.commit()
+
+
+def stored_image(seed: int) -> str:
+    data = make_image(seed)
+    tmp_path = file_store.temp_path()
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    return file_store.add(tmp_path, hashlib.sha256(data).hexdigest(), "png", len(data))
+
+
+def add_job(db, file_path: str, age: int = 0, **values) -> RecognitionJob:
+    job = RecognitionJob(
+        task_id="test-task",
+        filename="a.png",
+        file_path=file_path,
+        created_at=datetime.utcnow() - timedelta(seconds=age),
+        **values,
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    db.expunge(job)
+    return job
+
+
+def reload(db, job: RecognitionJob) -> RecognitionJob:
+    db.expire_all()
+    return db.get(RecognitionJob, job.id)
+
+
+def test_claim_oldest_first_and_requeue(queue, db):
+    path = stored_image(2001)
+    newer = add_job(db, path, age=0)
+    older = add_job(db, path, age=10)
+
+    claimed = queue._claim_next()
+    assert claimed.id == older.id
+    assert (claimed.status, claimed.attempts) == ("running", 1)
+    assert queue._claim_next().id == newer.id
+    assert queue._claim_next() is None
+
+    # 真正发出请求后失败：计入 attempts
+    queue._requeue(claimed, GLMUnavailableError("重试耗尽"))
+    job = reload(db, claimed)
+    assert (job.status, job.attempts, job.started_at) == ("queued", 1, None)
+    assert job.error == "重试耗尽"
+
+    # 被熔断器直接拒绝：不计入 attempts
+    claimed = queue._claim_next()
+    assert claimed.attempts == 2
+    queue._requeue(claimed, GLMUnavailableError("熔断中", rejected=True))
+    assert reload(db, claimed).attempts == 1
+
+
+def test_requeue_gives_up_after_max_attempts(queue, db):
+    job = add_job(db, stored_image(2002), attempts=GLM_JOB_MAX_ATTEMPTS - 1)
+    claimed = queue._claim_next()
+
+    queue._requeue(claimed, GLMUnavailableError("服务不可用"))
+
+    job = reload(db, job)
+    assert job.status == "failed"
+    assert job.error == "服务不可用"
+    invoice = db.get(Invoice, job.invoice_ids[0])
+    assert invoice.anomaly_flag == "error"
+
+
+def test_requeue_interrupted(queue, db):
+    job = add_job(db, stored_image(2003), status="running", started_at=datetime.utcnow(), attempts=1)
+
+    assert queue._requeue_interrupted() >= 1
+
+    job = reload(db, job)
+    assert (job.status, job.started_at, job.attempts) == ("queued", None, 1)
+
+
+def test_finish_multi_page_hands_file_refs_to_invoices(queue, db):
+    path = stored_image(2004)
+    job = add_job(db, path)
+    claimed = queue._claim_next()
+    page = {"invoice_no": "26112000000000250001", "seller_name": "得力集团有限公司", "amount": 10, "confidence": 0.95}
+
+    queue._finish(claimed, [(1, page), (2, None), (3, {**page, "invoice_no": "26112000000000250003"})])
+
+    job = reload(db, job)
+    assert job.status == "done"
+    assert job.error == "第 2 页识别失败"
+    invoices = [db.get(Invoice, invoice_id) for invoice_id in job.invoice_ids]
+    assert [inv.page_no for inv in invoices] == [1, 2, 3]
+    assert invoices[1].anomaly_reason == "识别失败"
+    # 上传时任务持有 1 个引用，完成后 3 页发票各持有 1 个
+    assert db.query(StoredFile).filter(StoredFile.path == path).one().ref_count == 3
+
+
+def test_rejected_job_keeps_its_attempt(queue, db, monkeypatch):
+    job = add_job(db, stored_image(2005))
+    calls = []
+
+    async def rejected(*args, **kwargs):
+        calls.append(1)
+        raise GLMUnavailableError("熔断中", retry_after=1, rejected=True)
+
+    monkeypatch.setattr(glm_service, "recognize_invoice_async", rejected)
+    monkeypatch.setattr(glm_service, "retry_after", lambda: 0.0)
+
+    asyncio.run(queue._run_once())
+
+    job = reload(db, job)
+    assert calls == [1]
+    assert (job.status, job.attempts) == ("queued", 0)
+
+
+def test_upload_recognized_by_workers(client, db):
+    response = client.post(
+        "/api/invoices/upload", files=[("files", ("invoice.png", make_image(2006), "image/png"))]
+    )
+    status = wait_for_task(client, response.json()["task_id"])
+    assert status["done"] == 1
+    invoice = db.get(Invoice, status["jobs"][0]["invoice_ids"][0])
+    assert invoice.invoice_no and invoice.total_amount > 0
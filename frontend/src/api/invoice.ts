@@ -4,6 +4,7 @@ import type {
   InvoiceListResponse,
   SummaryResponse,
   UploadResponse,
+  TaskStatusResponse,
   VoucherGenerateResponse
 } from '../types/invoice'
 
@@ -28,6 +29,12 @@ export const invoiceApi = {
     return data
   },
 
+  // 查询识别任务进度
+  async getTask(taskId: string): Promise<TaskStatusResponse> {
+    const { data } = await api.get<TaskStatusResponse>(`/invoices/tasks/${taskId}`)
+    return data
+  },
+
   // 获取发票列表
   async list(params: {
     page?: number
@@ -46,8 +53,15 @@ export const invoiceApi = {
   },
 
   // 导出 Excel
-  async exportExcel(): Promise<Blob> {
+  async exportExcel(params: {
+    date_from?: string
+    date_to?: string
+    category?: string
+    person?: string
+    anomaly_only?: boolean
+  } = {}): Promise<Blob> {
     const { data } = await api.get('/invoices/export', {
+      params,
       responseType: 'blob'
     })
     return data
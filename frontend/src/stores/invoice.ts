@@ -1,8 +1,12 @@
 import { defineStore } from 'pinia'
 import { ref, computed } from 'vue'
-import type { Invoice, SummaryResponse, CategorySummary } from '../types/invoice'
+import type { Invoice, SummaryResponse, CategorySummary, TaskStatusResponse } from '../types/invoice'
 import { invoiceApi } from '../api/invoice'
 
+// 识别进度轮询：每 2 秒一次，最多 30 分钟
+const TASK_POLL_INTERVAL_MS = 2000
+const TASK_POLL_MAX_ATTEMPTS = 900
+
 export const useInvoiceStore = defineStore('invoice', () => {
   const invoices = ref<Invoice[]>([])
   const total = ref(0)
@@ -13,6 +17,7 @@ export const useInvoiceStore = defineStore('invoice', () => {
   const selectedIds = ref<string[]>([])
   const currentCategory = ref<string | null>(null)
   const anomalyOnly = ref(false)
+  const currentTask = ref<TaskStatusResponse | null>(null)
 
   // Computed
   const selectedInvoices = computed(() =>
@@ -38,7 +43,7 @@ export const useInvoiceStore = defineStore('invoice', () => {
         anomaly_only: anomalyOnly.value
       })
       invoices.value = response.items
-      total.value = response.total
+      total.value = response.total ?? 0
     } finally {
       loading.value = false
     }
@@ -52,16 +57,36 @@ export const useInvoiceStore = defineStore('invoice', () => {
     loading.value = true
     try {
       const result = await invoiceApi.upload(files, reimbursementPerson)
-      await fetchInvoices()
-      await fetchSummary()
-      return result
+      // 没有文件入队（全部被拒绝或类型不支持）时任务不存在，无需轮询
+      if (result.queued === 0) {
+        throw new Error(result.message)
+      }
+      return await waitForTask(result.task_id)
     } finally {
       loading.value = false
     }
   }
 
+  // 轮询识别进度，期间刷新列表以显示已完成的发票
+  async function waitForTask(taskId: string) {
+    for (let attempt = 0; attempt < TASK_POLL_MAX_ATTEMPTS; attempt++) {
+      const task = await invoiceApi.getTask(taskId)
+      currentTask.value = task
+      await fetchInvoices()
+      await fetchSummary()
+      if (task.finished) {
+        return task
+      }
+      await new Promise(resolve => setTimeout(resolve, TASK_POLL_INTERVAL_MS))
+    }
+    throw new Error('识别仍在后台进行，请稍后刷新列表查看结果')
+  }
+
   async function exportExcel() {
-    const blob = await invoiceApi.exportExcel()
+    const blob = await invoiceApi.exportExcel({
+      category: currentCategory.value || undefined,
+      anomaly_only: anomalyOnly.value
+    })
     const url = URL.createObjectURL(blob)
     const a = document.createElement('a')
     a.href = url
@@ -118,9 +143,11 @@ export const useInvoiceStore = defineStore('invoice', () => {
     selectedTax,
     currentCategory,
     anomalyOnly,
+    currentTask,
     fetchInvoices,
     fetchSummary,
     uploadFiles,
+    waitForTask,
     exportExcel,
     deleteInvoice,
     setCategory,
@@ -14,15 +14,17 @@ export interface Invoice {
   anomaly_flag: string | null
   anomaly_reason: string | null
   image_path: string | null
+  page_no: number | null
   created_at: string
   updated_at: string
 }
 
 export interface InvoiceListResponse {
   items: Invoice[]
-  total: number
+  total: number | null
   page: number
   size: number
+  next_cursor: string | null
 }
 
 export interface CategorySummary {
@@ -44,9 +46,36 @@ export interface UploadResponse {
   task_id: string
   total_count: number
   processed: number
+  queued: number
+  rejected: string[]
   message: string
 }
 
+export interface TaskJobStatus {
+  id: string
+  filename: string | null
+  status: 'queued' | 'running' | 'done' | 'failed'
+  attempts: number
+  error: string | null
+  invoice_ids: string[] | null
+  created_at: string
+  started_at: string | null
+  finished_at: string | null
+}
+
+export interface TaskStatusResponse {
+  task_id: string
+  total: number
+  queued: number
+  running: number
+  done: number
+  failed: number
+  finished: boolean
+  throughput_per_minute: number
+  eta_seconds: number | null
+  jobs: TaskJobStatus[]
+}
+
 export interface VoucherEntry {
   编制日期: string
   凭证类型: string